@@ -0,0 +1,119 @@
+"""CPU cost against bytes saved of response compression, per coding and level.
+
+    python -m benchmarks.compression_bench --rows 200 --iterations 50
+
+Compresses the bodies the service sends most: a GET /messages/ page of
+``--rows`` messages (one whole body, the cacheable case) and an NDJSON
+export of ``--export-rows`` messages fed in EXPORT_BATCH_SIZE chunks (the
+streaming case). Message text is drawn from a small vocabulary, so it
+compresses about as well as chat text does. For each installed coding and
+level it reports the compression ratio, the share of bytes saved and the
+CPU time per input KB; "cached" is the cost of answering from the
+compressed body cache instead.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta
+from uuid import UUID
+
+LEVELS = {"gzip": (1, 3, 5, 6, 9), "zstd": (1, 3, 6, 10, 19), "br": (1, 4, 6, 9, 11)}
+WORDS = ("order", "status", "refund", "thanks", "hello", "please", "shipping", "account", "password", "the",
+         "a", "my", "is", "when", "will", "arrive", "can", "you", "help", "with", "invoice", "today", "sorry")
+
+
+def message_rows(count, seed=0):
+    rng = random.Random(seed)
+    chats = [UUID(int=rng.getrandbits(128)) for _ in range(5)]
+    now = datetime(2025, 9, 7, 12)
+    return [
+        (rng.choice(chats), " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 40))), rng.randint(0, 5),
+         now - timedelta(seconds=index, microseconds=rng.randint(0, 999999)), rng.choice(("user", "ai")),
+         UUID(int=rng.getrandbits(128)))
+        for index in range(count)
+    ]
+
+
+def decompress(encoding, data):
+    if encoding == "gzip":
+        return zlib.decompress(data, 31)
+    from src.app.core.compression import brotli, zstandard
+
+    if encoding == "zstd":
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return brotli.decompress(data)
+
+
+def measure(encoding, level, chunks, iterations):
+    from src.app.core.compression import CODECS
+
+    def compress_body():
+        compress, finish = CODECS[encoding](level)
+        return b"".join([*map(compress, chunks), finish()])
+
+    body = compress_body()  # warm up
+    started = time.process_time()
+    for _ in range(iterations):
+        compress_body()
+    elapsed = time.process_time() - started
+    if decompress(encoding, body) != b"".join(chunks):
+        raise AssertionError(f"{encoding} level {level} does not round-trip")
+    size = sum(map(len, chunks))
+    return {
+        "ratio": round(size / len(body), 2),
+        "saved": round(1 - len(body) / size, 3),
+        "cpu_us_per_kb": round(elapsed * 1e6 / iterations / (size / 1024), 2),
+    }
+
+
+def cached_cost(iterations):
+    """CPU per lookup of a compressed page in the body cache."""
+    from src.app.core.cache import TTLCache
+
+    cache = TTLCache(maxsize=1024, ttl=300)
+    key = ("gzip", 5, "/messages/", b"limit=50", b'"0123456789abcdef"', 12345)
+    cache.set(key, b"x" * 4096)
+    started = time.process_time()
+    for _ in range(iterations):
+        cache.get(key)
+    return round((time.process_time() - started) * 1e6 / iterations, 3)
+
+
+def main(args):
+    from src.app.core.compression import CODECS
+    from src.app.services.export import encode_json, encode_rows
+
+    page = [encode_json(message_rows(args.rows))]
+    rows = message_rows(args.export_rows, seed=1)
+    export = [encode_rows("ndjson", rows[start:start + args.batch_size]).encode()
+              for start in range(0, len(rows), args.batch_size)]
+    results = {}
+    for name, chunks in (("page", page), ("export", export)):
+        results[name] = {"bytes": sum(map(len, chunks))}
+        for encoding in CODECS:
+            for level in LEVELS[encoding]:
+                results[name][f"{encoding}-{level}"] = measure(encoding, level, chunks, args.iterations)
+    results["cached_us_per_response"] = cached_cost(args.iterations * 100)
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200, help="messages in the page body")
+    parser.add_argument("--export-rows", type=int, default=10000, help="messages in the export body")
+    parser.add_argument("--batch-size", type=int, default=1000, help="export rows per streamed chunk")
+    parser.add_argument("--iterations", type=int, default=50, help="compressions per coding and level")
+    return parser.parse_args(argv)
+
+
+def run(argv=None):
+    args = parse_args(argv)
+    print(json.dumps(main(args), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,236 @@
+"""HTTP-level load benchmark for the auth and messages endpoints.
+
+Runs the FastAPI app in-process over httpx's ASGI transport against a
+real database, seeds it, then drives each scenario with a fixed number of
+concurrent clients and reports latency percentiles and throughput as JSON.
+
+    python -m benchmarks.http_bench --output bench.json
+    python -m benchmarks.http_bench --baseline bench.json --threshold 0.15
+
+Uses BENCH_DATABASE_URL (a disposable Postgres database) when set and an
+SQLite file otherwise. Rate limiting is switched off for the run. With
+--baseline, the process exits non-zero if any scenario's p95 latency rose,
+or its throughput fell, by more than the threshold.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+SCENARIOS = ("login", "list_messages", "send_message", "update_message")
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(fraction * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies, errors, elapsed):
+    ordered = sorted(latencies)
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Return human-readable regressions of ``results`` against ``baseline``."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if previous["p95_ms"] and current["p95_ms"] > previous["p95_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+        if previous["throughput_rps"] and current["throughput_rps"] < previous["throughput_rps"] * (1 - threshold):
+            regressions.append(
+                f"{name}: throughput {previous['throughput_rps']} -> {current['throughput_rps']} req/s"
+            )
+        if current["errors"] > previous.get("errors", 0):
+            regressions.append(f"{name}: errors {previous.get('errors', 0)} -> {current['errors']}")
+    return regressions
+
+
+def configure_environment(args):
+    """Must run before the app is imported: settings are read at import time."""
+    url = args.database_url or os.getenv("BENCH_DATABASE_URL")
+    if not url:
+        url = f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='bench-')}/bench.db"
+    os.environ["DATABASE_URL"] = url
+    os.environ["RATE_LIMIT_ENABLED"] = "false"
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+    if args.bcrypt_rounds:
+        os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    return url
+
+
+async def seed(users, messages_per_user, chats_per_user):
+    from src.app.api.dependencies import SessionLocal, engine
+    from src.app.db.base import Base
+    from src.app.db.user import User
+    from src.app.services.message_service import MessageService
+    from src.app.services.password_hasher import password_hasher
+
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+
+    run_id = uuid4().hex[:8]
+    password = "benchmark-password"
+    hashed_password = await password_hasher.hash(password)
+    accounts = []
+    now = datetime.now()
+    async with SessionLocal() as session:
+        for index in range(users):
+            email = f"bench-{run_id}-{index}@example.com"
+            user = User(username=f"bench-{run_id}-{index}", email=email, hashed_password=hashed_password)
+            session.add(user)
+            accounts.append({"user": user, "email": email, "password": password,
+                             "chats": [uuid4() for _ in range(chats_per_user)]})
+        await session.commit()
+
+        service = MessageService(session)
+        for account in accounts:
+            rows = []
+            for index in range(messages_per_user):
+                rows.append({
+                    "message_id": uuid4(),
+                    "chat_id": random.choice(account["chats"]),
+                    "content": f"seeded message {index} " + "lorem ipsum " * random.randint(1, 20),
+                    "rating": random.randint(0, 5),
+                    "sent_at": now - timedelta(minutes=messages_per_user - index),
+                    "role": random.choice(("user", "ai")),
+                    "user_id": account["user"].id,
+                })
+            await service.insert_message_rows(rows)
+            account["message_ids"] = [row["message_id"] for row in rows]
+    return accounts
+
+
+async def run_scenario(name, client, accounts, total, concurrency):
+    latencies, errors = [], 0
+    counter = iter(range(total))
+
+    def build(account):
+        headers = {"Authorization": f"Bearer {account['token']}"}
+        if name == "login":
+            return "POST", "/auth/login", {"json": {"email": account["email"], "password": account["password"]}}
+        if name == "list_messages":
+            return "GET", "/messages/", {"headers": headers}
+        body = {
+            "chat_id": str(random.choice(account["chats"])),
+            "content": "benchmark message",
+            "rating": random.randint(0, 5),
+            "sent_at": datetime.now().isoformat(),
+            "role": "user",
+        }
+        if name == "send_message":
+            return "POST", "/messages/", {"headers": headers, "json": body}
+        message_id = random.choice(account["message_ids"])
+        return "PUT", f"/messages/{message_id}", {"headers": headers, "json": body}
+
+    async def worker():
+        nonlocal errors
+        for _ in counter:
+            method, path, kwargs = build(random.choice(accounts))
+            started = time.perf_counter()
+            response = await client.request(method, path, **kwargs)
+            if response.status_code >= 400:
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def main(args):
+    import httpx
+    from src.app.api.dependencies import engine
+    from src.app.main import app
+
+    try:
+        accounts = await seed(args.users, args.messages, args.chats)
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                for account in accounts:
+                    response = await client.post(
+                        "/auth/login", json={"email": account["email"], "password": account["password"]}
+                    )
+                    response.raise_for_status()
+                    account["token"] = response.json()["access_token"]
+                results = {}
+                for name in args.scenarios:
+                    results[name] = await run_scenario(name, client, accounts, args.requests, args.concurrency)
+    finally:
+        await engine.dispose()
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", help="defaults to BENCH_DATABASE_URL, then a temporary SQLite file")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=200, help="seeded messages per user")
+    parser.add_argument("--chats", type=int, default=5, help="chats per user")
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--bcrypt-rounds", type=int, help="override BCRYPT_ROUNDS for the run")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--output", help="write results JSON here (default: stdout)")
+    parser.add_argument("--baseline", help="results JSON from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed relative regression")
+    return parser.parse_args(argv)
+
+
+def run(argv=None):
+    args = parse_args(argv)
+    database_url = configure_environment(args)
+    results = asyncio.run(main(args))
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "database": database_url.split("://", 1)[0],
+            "python": platform.python_version(),
+            "users": args.users,
+            "messages_per_user": args.messages,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
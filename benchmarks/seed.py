@@ -0,0 +1,230 @@
+"""Bulk-load a synthetic, production-shaped dataset into a migrated Postgres database.
+
+    python -m benchmarks.seed --users 5000 --messages 5000000
+    python -m benchmarks.seed --database-url postgresql://... --months 24 --skew 1.1 --truncate
+
+Activity is skewed the way chat data is: user weights are Pareto
+distributed, so a few users write most messages. Each user's chats are
+skewed the same way. Traffic grows towards the present. Content is drawn
+from a Zipf-distributed vocabulary, so full-text search sees realistic
+term frequencies.
+
+Rows are generated lazily and streamed to COPY in ``--batch-size`` chunks,
+so memory use does not grow with ``--messages``. Before loading, monthly
+partitions are created for the whole range, so nothing lands in
+messages_default. Afterwards, the seeded users' chat summaries and the
+range's rating rollups are built from the loaded rows and the tables are
+analyzed.
+
+Seeded users log in as ``seed-<n>@example.com`` with SEED_PASSWORD.
+Uses SEED_DATABASE_URL, else DATABASE_URL.
+"""
+import argparse
+import asyncio
+import bisect
+import itertools
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from uuid import UUID
+
+SEED_PASSWORD = "seed-password"
+ROLES = ("user", "ai")
+VOCABULARY_SIZE = 5000
+
+
+def pareto_weights(rng: random.Random, count: int, alpha: float):
+    """Cumulative weights for ``count`` items; smaller ``alpha`` means heavier skew."""
+    return list(itertools.accumulate(rng.paretovariate(alpha) for _ in range(count)))
+
+
+def allocate(total: int, cum_weights) -> list:
+    """Split ``total`` into integer shares proportional to the weights, summing exactly to ``total``."""
+    shares, assigned = [], 0
+    for cumulative in cum_weights:
+        target = round(total * cumulative / cum_weights[-1])
+        shares.append(target - assigned)
+        assigned = target
+    return shares
+
+
+def vocabulary(rng: random.Random, size: int = VOCABULARY_SIZE):
+    syllables = [consonant + vowel for consonant in "bcdfghklmnprstvz" for vowel in "aeiou"]
+    words = sorted({"".join(rng.choices(syllables, k=rng.randint(1, 4))) for _ in range(size * 2)})[:size]
+    rng.shuffle(words)
+    # Zipf: the n-th most common word appears with frequency ~ 1/n.
+    return words, list(itertools.accumulate(1 / rank for rank in range(1, len(words) + 1)))
+
+
+def random_uuid(rng: random.Random) -> UUID:
+    return UUID(int=rng.getrandbits(128), version=4)
+
+
+class Dataset:
+    """Deterministic generator of users and their messages."""
+
+    def __init__(self, users: int, messages: int, chats_per_user: float, months: int, skew: float, seed: int,
+                 end: datetime = None):
+        self.rng = random.Random(seed)
+        self.users = [random_uuid(self.rng) for _ in range(users)]
+        self.message_counts = allocate(messages, pareto_weights(self.rng, users, skew))
+        self.chats_per_user = chats_per_user
+        self.skew = skew
+        self.end = end or datetime.now().replace(microsecond=0)
+        self.start = self.end - timedelta(days=30 * months)
+        self.words, self.word_weights = vocabulary(self.rng)
+
+    def user_rows(self, hashed_password: str):
+        for index, user_id in enumerate(self.users):
+            yield user_id, f"seed-{index}", f"seed-{index}@example.com", hashed_password
+
+    def sent_at(self) -> datetime:
+        # Density rises linearly towards the present (sqrt of a uniform variate).
+        span = (self.end - self.start).total_seconds()
+        return self.start + timedelta(seconds=span * self.rng.random() ** 0.5)
+
+    def content(self) -> str:
+        return " ".join(self.rng.choices(self.words, cum_weights=self.word_weights,
+                                         k=max(1, int(self.rng.lognormvariate(2.3, 0.7)))))
+
+    def message_rows(self):
+        """``(message_id, chat_id, content, rating, sent_at, role, user_id)`` tuples, one user at a time."""
+        rng = self.rng
+        for user_id, count in zip(self.users, self.message_counts):
+            if not count:
+                continue
+            chats = [random_uuid(rng) for _ in range(max(1, min(count, round(rng.expovariate(1 / self.chats_per_user)))))]
+            chat_weights = pareto_weights(rng, len(chats), self.skew)
+            for _ in range(count):
+                chat_id = chats[bisect.bisect(chat_weights, rng.random() * chat_weights[-1])]
+                yield (random_uuid(rng), chat_id, self.content(), rng.randint(1, 5), self.sent_at(),
+                       rng.choice(ROLES), user_id)
+
+
+async def ensure_partitions(connection, start: datetime, end: datetime) -> list:
+    """Create the monthly partitions covering ``start``..``end``; a no-op if messages is not partitioned."""
+    from sqlalchemy import text
+    from src.app.db.partitions import add_months, create_partition, existing_partitions, month_start
+
+    partitioned = await connection.scalar(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = CAST('messages' AS regclass))"
+    ))
+    if not partitioned:
+        return []
+    existing = set(await existing_partitions(connection))
+    created, month = [], month_start(start)
+    while month <= month_start(end):
+        if month not in existing:
+            await create_partition(connection, month)
+            created.append(month)
+        month = add_months(month, 1)
+    return created
+
+
+REBUILD_SUMMARIES = """
+    INSERT INTO chat_summaries (user_id, chat_id, message_count, rating_sum, last_message_id,
+                                last_message_preview, last_sent_at, version)
+    SELECT last.user_id, last.chat_id, totals.message_count, totals.rating_sum, last.message_id,
+           left(last.content, :preview_length), last.sent_at, 1
+    FROM (
+        SELECT DISTINCT ON (user_id, chat_id) user_id, chat_id, message_id, content, sent_at
+        FROM messages WHERE user_id = ANY(:user_ids)
+        ORDER BY user_id, chat_id, sent_at DESC, message_id DESC
+    ) AS last
+    JOIN (
+        SELECT user_id, chat_id, count(*) AS message_count, sum(rating) AS rating_sum
+        FROM messages WHERE user_id = ANY(:user_ids)
+        GROUP BY user_id, chat_id
+    ) AS totals USING (user_id, chat_id)
+    ON CONFLICT (user_id, chat_id) DO UPDATE SET
+        message_count = excluded.message_count, rating_sum = excluded.rating_sum,
+        last_message_id = excluded.last_message_id, last_message_preview = excluded.last_message_preview,
+        last_sent_at = excluded.last_sent_at, version = chat_summaries.version + 1
+"""
+
+
+async def seed(engine, dataset: Dataset, batch_size: int = 100_000, truncate: bool = False, log=print) -> int:
+    """Load ``dataset`` through ``engine`` and return the number of messages written."""
+    from sqlalchemy import text
+    from src.app.services.message_service import MESSAGE_COLUMNS, PREVIEW_LENGTH
+    from src.app.services.password_hasher import pwd_context
+    from src.app.services.rating_stats import backfill
+
+    started = time.perf_counter()
+    async with engine.begin() as connection:
+        if truncate:
+            await connection.execute(text("TRUNCATE messages, chat_summaries, rating_rollups, users"))
+        created = await ensure_partitions(connection, dataset.start, dataset.end)
+        if created:
+            log(f"created {len(created)} partitions")
+        raw = (await connection.get_raw_connection()).driver_connection
+        # One hash for everyone: bcrypt at full cost per user would dominate the run.
+        await raw.copy_records_to_table(
+            "users", records=dataset.user_rows(pwd_context.hash(SEED_PASSWORD)),
+            columns=["id", "username", "email", "hashed_password"],
+        )
+
+    async with engine.connect() as connection:
+        superuser = await connection.scalar(text("SELECT rolsuper FROM pg_roles WHERE rolname = current_user"))
+
+    written, rows = 0, dataset.message_rows()
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            break
+        async with engine.begin() as connection:
+            if superuser:
+                # Skips the NOTIFY trigger (one notification per row) and FK
+                # checks; the generated rows are consistent by construction.
+                await connection.execute(text("SET LOCAL session_replication_role = replica"))
+            raw = (await connection.get_raw_connection()).driver_connection
+            await raw.copy_records_to_table("messages", records=batch, columns=list(MESSAGE_COLUMNS))
+        written += len(batch)
+        elapsed = time.perf_counter() - started
+        log(f"{written} messages ({written / elapsed:.0f}/s)")
+
+    async with engine.begin() as connection:
+        await connection.execute(text(REBUILD_SUMMARIES),
+                                 {"preview_length": PREVIEW_LENGTH, "user_ids": dataset.users})
+    await backfill(engine, dataset.start, dataset.end)
+    # ANALYZE cannot run inside a transaction block.
+    async with engine.connect() as connection:
+        connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+        await connection.execute(text("ANALYZE users, messages, chat_summaries, rating_rollups"))
+    log(f"seeded {len(dataset.users)} users and {written} messages in {time.perf_counter() - started:.1f}s")
+    return written
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-load a synthetic dataset with COPY.")
+    parser.add_argument("--database-url", help="defaults to SEED_DATABASE_URL, then DATABASE_URL")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--chats-per-user", type=float, default=8, help="mean chats per user")
+    parser.add_argument("--months", type=int, default=12, help="history spans this many months back from now")
+    parser.add_argument("--skew", type=float, default=1.2, help="Pareto shape; lower is more skewed")
+    parser.add_argument("--batch-size", type=int, default=100_000, help="rows per COPY (bounds memory)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--truncate", action="store_true", help="empty users, messages, chat_summaries and rating_rollups first")
+    return parser.parse_args(argv)
+
+
+async def main(args):
+    from src.app.core.config import make_async_url
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = args.database_url or os.getenv("SEED_DATABASE_URL") or os.getenv("DATABASE_URL")
+    if not url:
+        sys.exit("Set --database-url, SEED_DATABASE_URL or DATABASE_URL")
+    engine = create_async_engine(make_async_url(url))
+    try:
+        dataset = Dataset(args.users, args.messages, args.chats_per_user, args.months, args.skew, args.seed)
+        return await seed(engine, dataset, args.batch_size, args.truncate)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,131 @@
+"""CPU cost per row of encoding a GET /messages/ page, ORM path vs fast path.
+
+    python -m benchmarks.serialization_bench --rows 200 --iterations 200
+
+"orm" is the previous path: hydrate Message objects, validate them into
+MessageRead, then let FastAPI serialize the response model and render it
+with the stdlib encoder. "fast" selects bare column tuples and encodes them
+with orjson (MessageService.get_messages_page). Both read the same page
+from an SQLite file, so the driver's share is included in both numbers.
+CPU time is process time, which also covers aiosqlite's worker thread.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+
+async def seed(session_factory, rows):
+    from src.app.db.message import Message
+    from src.app.db.user import User
+
+    user = User(username="bench", email="bench@example.com", hashed_password="x")
+    now = datetime.now()
+    async with session_factory() as session:
+        session.add(user)
+        await session.flush()
+        chats = [uuid4() for _ in range(5)]
+        session.add_all(
+            Message(
+                message_id=uuid4(),
+                chat_id=random.choice(chats),
+                content=f"seeded message {index} " + "lorem ipsum " * random.randint(1, 20),
+                rating=random.randint(0, 5),
+                sent_at=now - timedelta(seconds=index, microseconds=random.randint(0, 999999)),
+                role=random.choice(("user", "ai")),
+                user_id=user.id,
+            )
+            for index in range(rows)
+        )
+        await session.commit()
+    return user.id
+
+
+async def orm_page(session, user_id, limit):
+    from typing import List
+
+    from fastapi.responses import JSONResponse
+    from pydantic import TypeAdapter
+    from sqlalchemy import select
+    from src.app.db.message import Message
+    from src.app.schemas.messages import MessageRead
+    from src.app.services.message_service import MessageService
+
+    message_list_adapter = TypeAdapter(List[MessageRead])
+
+    query = MessageService._page_query(select(Message), user_id, limit, None, None)
+    result = await session.execute(query)
+    messages = message_list_adapter.validate_python(result.scalars().all(), from_attributes=True)
+    # What FastAPI does with response_model=List[MessageRead].
+    content = message_list_adapter.dump_python(messages, mode="json", by_alias=True)
+    return JSONResponse(content).body
+
+
+async def fast_page(session, user_id, limit):
+    from src.app.core.cache import MemoryCacheBackend
+    from src.app.services.message_service import MessageService
+
+    # A fresh cache each time: this measures the miss path.
+    page = await MessageService(session, cache=MemoryCacheBackend()).get_messages_page(user_id, limit=limit)
+    return page.body
+
+
+async def measure(page, session_factory, user_id, rows, iterations):
+    async with session_factory() as session:
+        body = await page(session, user_id, rows)  # warm up
+        started_cpu, started_wall = time.process_time(), time.perf_counter()
+        for _ in range(iterations):
+            await page(session, user_id, rows)
+            # Each iteration starts from an empty identity map, as a request would.
+            session.expunge_all()
+        cpu, wall = time.process_time() - started_cpu, time.perf_counter() - started_wall
+    per_row = 1e6 / (rows * iterations)
+    return body, {"cpu_us_per_row": round(cpu * per_row, 3), "wall_us_per_row": round(wall * per_row, 3)}
+
+
+async def main(args):
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from src.app.db.base import Base
+    # create_all only knows the models that have been imported.
+    from src.app.db import chat_summary, message, user  # noqa: F401
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='bench-')}/serialization.db")
+    try:
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        user_id = await seed(session_factory, args.rows)
+        orm_body, orm = await measure(orm_page, session_factory, user_id, args.rows, args.iterations)
+        fast_body, fast = await measure(fast_page, session_factory, user_id, args.rows, args.iterations)
+    finally:
+        await engine.dispose()
+    if orm_body != fast_body:
+        raise AssertionError("fast path output differs from the ORM path")
+    return {
+        "orm": orm,
+        "fast": fast,
+        "cpu_reduction": round(1 - fast["cpu_us_per_row"] / orm["cpu_us_per_row"], 3),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200, help="rows per page")
+    parser.add_argument("--iterations", type=int, default=200, help="pages encoded per path")
+    return parser.parse_args(argv)
+
+
+def run(argv=None):
+    args = parse_args(argv)
+    results = asyncio.run(main(args))
+    print(json.dumps({"rows": args.rows, "iterations": args.iterations, "results": results}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
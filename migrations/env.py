@@ -7,6 +7,8 @@ from alembic import context
 from src.app.db.base import Base
 from src.app.db.user import User  
 from src.app.db.message import Message  
+from src.app.db.chat_summary import ChatSummary
+from src.app.db.rating_rollup import RatingRollup
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
@@ -0,0 +1,28 @@
+"""chat summary version
+
+Revision ID: 05f13e44de53
+Revises: c0b54f541316
+Create Date: 2026-10-18 13:20:44.871302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '05f13e44de53'
+down_revision: Union[str, Sequence[str], None] = 'c0b54f541316'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chat_summaries', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('chat_summaries', 'version')
@@ -0,0 +1,50 @@
+"""message notify
+
+Revision ID: 3f2a9c7d1e84
+Revises: 05f13e44de53
+Create Date: 2026-10-18 14:02:17.530918
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f2a9c7d1e84'
+down_revision: Union[str, Sequence[str], None] = '05f13e44de53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Only keys go into the payload (NOTIFY caps it at 8000 bytes); listeners
+    # fetch the row. The notification is delivered on commit, so listeners
+    # never see rolled-back writes. Row triggers on the partitioned parent
+    # are cloned onto every partition, including ones created later.
+    op.execute("""
+        CREATE FUNCTION notify_message_event() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('message_events', json_build_object(
+                'op', TG_OP,
+                'user_id', NEW.user_id,
+                'chat_id', NEW.chat_id,
+                'message_id', NEW.message_id,
+                'sent_at', NEW.sent_at
+            )::text);
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER messages_notify
+        AFTER INSERT OR UPDATE ON messages
+        FOR EACH ROW EXECUTE FUNCTION notify_message_event()
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER messages_notify ON messages")
+    op.execute("DROP FUNCTION notify_message_event()")
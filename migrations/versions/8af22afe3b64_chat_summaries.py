@@ -0,0 +1,64 @@
+"""chat summaries
+
+Revision ID: 8af22afe3b64
+Revises: edd4317a9ed6
+Create Date: 2026-10-18 11:02:17.540913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8af22afe3b64'
+down_revision: Union[str, Sequence[str], None] = 'edd4317a9ed6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_messages_chat_id_sent_at_message_id',
+        'messages',
+        ['chat_id', 'sent_at', 'message_id'],
+        unique=False,
+    )
+    op.create_table('chat_summaries',
+    sa.Column('user_id', sa.Uuid(), nullable=False),
+    sa.Column('chat_id', sa.Uuid(), nullable=False),
+    sa.Column('message_count', sa.Integer(), nullable=False),
+    sa.Column('rating_sum', sa.Integer(), nullable=False),
+    sa.Column('last_message_id', sa.Uuid(), nullable=False),
+    sa.Column('last_message_preview', sa.String(), nullable=False),
+    sa.Column('last_sent_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'chat_id')
+    )
+    op.create_index(
+        'ix_chat_summaries_user_id_last_sent_at',
+        'chat_summaries',
+        ['user_id', 'last_sent_at', 'chat_id'],
+        unique=False,
+    )
+    # Backfill from existing history: one row per chat, carrying its newest message.
+    op.execute("""
+        INSERT INTO chat_summaries
+            (user_id, chat_id, message_count, rating_sum, last_message_id, last_message_preview, last_sent_at)
+        SELECT DISTINCT ON (user_id, chat_id)
+            user_id, chat_id,
+            count(*) OVER chat, sum(rating) OVER chat,
+            message_id, left(content, 120), sent_at
+        FROM messages
+        WINDOW chat AS (PARTITION BY user_id, chat_id)
+        ORDER BY user_id, chat_id, sent_at DESC, message_id DESC
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_chat_summaries_user_id_last_sent_at', table_name='chat_summaries')
+    op.drop_table('chat_summaries')
+    op.drop_index('ix_messages_chat_id_sent_at_message_id', table_name='messages')
@@ -0,0 +1,72 @@
+"""message notify moves
+
+Revision ID: 9d41e6b2a7c3
+Revises: 3f2a9c7d1e84
+Create Date: 2026-10-18 14:51:09.204117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d41e6b2a7c3'
+down_revision: Union[str, Sequence[str], None] = '3f2a9c7d1e84'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # An UPDATE that moves a row to another partition (an edit changes
+    # sent_at) runs as DELETE + INSERT and fires no AFTER UPDATE trigger.
+    # Remember the deleted key for the rest of the transaction so the
+    # INSERT that immediately follows it is reported as the update it is.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION notify_message_event() RETURNS trigger AS $$
+        DECLARE
+            operation text := TG_OP;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                PERFORM set_config('messages.last_deleted', OLD.message_id::text, true);
+                RETURN NULL;
+            END IF;
+            IF TG_OP = 'INSERT' AND current_setting('messages.last_deleted', true) = NEW.message_id::text THEN
+                operation := 'UPDATE';
+            END IF;
+            PERFORM pg_notify('message_events', json_build_object(
+                'op', operation,
+                'user_id', NEW.user_id,
+                'chat_id', NEW.chat_id,
+                'message_id', NEW.message_id,
+                'sent_at', NEW.sent_at
+            )::text);
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER messages_notify_delete
+        AFTER DELETE ON messages
+        FOR EACH ROW EXECUTE FUNCTION notify_message_event()
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER messages_notify_delete ON messages")
+    op.execute("""
+        CREATE OR REPLACE FUNCTION notify_message_event() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('message_events', json_build_object(
+                'op', TG_OP,
+                'user_id', NEW.user_id,
+                'chat_id', NEW.chat_id,
+                'message_id', NEW.message_id,
+                'sent_at', NEW.sent_at
+            )::text);
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
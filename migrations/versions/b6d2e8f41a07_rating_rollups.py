@@ -0,0 +1,48 @@
+"""rating rollups
+
+Revision ID: b6d2e8f41a07
+Revises: 9d41e6b2a7c3
+Create Date: 2026-10-18 16:20:44.318052
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6d2e8f41a07'
+down_revision: Union[str, Sequence[str], None] = '9d41e6b2a7c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('rating_rollups',
+    sa.Column('user_id', sa.Uuid(), nullable=False),
+    sa.Column('granularity', sa.String(), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(), nullable=False),
+    sa.Column('chat_id', sa.Uuid(), nullable=False),
+    sa.Column('role', sa.String(), nullable=False),
+    sa.Column('rating', sa.Integer(), nullable=False),
+    sa.Column('message_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'granularity', 'bucket_start', 'chat_id', 'role', 'rating',
+                            postgresql_include=['message_count'])
+    )
+    # Backfill from existing history; python -m src.app.services.rating_stats
+    # recounts any range later, one day at a time.
+    for granularity in ('hour', 'day'):
+        op.execute(f"""
+            INSERT INTO rating_rollups (user_id, granularity, bucket_start, chat_id, role, rating, message_count)
+            SELECT user_id, '{granularity}', date_trunc('{granularity}', sent_at), chat_id, role, rating, count(*)
+            FROM messages
+            GROUP BY user_id, date_trunc('{granularity}', sent_at), chat_id, role, rating
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('rating_rollups')
@@ -0,0 +1,101 @@
+"""partition messages
+
+Revision ID: c0b54f541316
+Revises: c8c48ce4214d
+Create Date: 2026-10-18 12:37:55.208114
+
+Rebuilds messages as a table range-partitioned by month on sent_at, with a
+default partition catching anything outside the created ranges. Rows are
+copied inside the migration's transaction, so on a large table schedule a
+maintenance window. Afterwards run `python -m src.app.db.partitions` from
+cron to keep future months created and apply retention.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c0b54f541316'
+down_revision: Union[str, Sequence[str], None] = 'c8c48ce4214d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = "message_id, chat_id, content, rating, sent_at, role, user_id"
+INDEXES = (
+    'messages_pkey',
+    'ix_messages_user_id_sent_at_message_id',
+    'ix_messages_chat_id_sent_at_message_id',
+    'ix_messages_user_id_search_vector',
+)
+# Keep in step with PARTITION_PREMAKE_MONTHS' default.
+PREMAKE_MONTHS = 3
+
+
+def create_messages_table(partitioned: bool) -> None:
+    primary_key = "message_id, sent_at" if partitioned else "message_id"
+    op.execute(f"""
+        CREATE TABLE messages (
+            message_id UUID NOT NULL,
+            chat_id UUID NOT NULL,
+            content VARCHAR NOT NULL,
+            rating INTEGER NOT NULL,
+            sent_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            role VARCHAR NOT NULL,
+            user_id UUID NOT NULL REFERENCES users (id),
+            search_vector tsvector GENERATED ALWAYS AS (to_tsvector('simple', content)) STORED,
+            CONSTRAINT messages_pkey PRIMARY KEY ({primary_key})
+        ){" PARTITION BY RANGE (sent_at)" if partitioned else ""}
+    """)
+
+
+def create_indexes() -> None:
+    op.create_index('ix_messages_user_id_sent_at_message_id', 'messages', ['user_id', 'sent_at', 'message_id'])
+    op.create_index('ix_messages_chat_id_sent_at_message_id', 'messages', ['chat_id', 'sent_at', 'message_id'])
+    op.create_index('ix_messages_user_id_search_vector', 'messages', ['user_id', 'search_vector'],
+                    postgresql_using='gin')
+
+
+def move_old_table_aside() -> None:
+    op.execute("ALTER TABLE messages RENAME TO messages_old")
+    for index in INDEXES:
+        op.execute(f"ALTER INDEX {index} RENAME TO {index}_old")
+    op.execute("ALTER TABLE messages_old RENAME CONSTRAINT messages_user_id_fkey TO messages_old_user_id_fkey")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    move_old_table_aside()
+    create_messages_table(partitioned=True)
+    op.execute("CREATE TABLE messages_default PARTITION OF messages DEFAULT")
+    # One partition per month from the oldest message until PREMAKE_MONTHS ahead.
+    op.execute(f"""
+        DO $$
+        DECLARE
+            month date;
+            last_month date := date_trunc('month', now()) + interval '{PREMAKE_MONTHS} months';
+        BEGIN
+            SELECT date_trunc('month', coalesce(min(sent_at), now())) INTO month FROM messages_old;
+            WHILE month <= last_month LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF messages FOR VALUES FROM (%L) TO (%L)',
+                    'messages_p' || to_char(month, 'YYYYMM'), month, month + interval '1 month'
+                );
+                month := month + interval '1 month';
+            END LOOP;
+        END
+        $$
+    """)
+    op.execute(f"INSERT INTO messages ({COLUMNS}) SELECT {COLUMNS} FROM messages_old")
+    op.execute("DROP TABLE messages_old")
+    # Built after the copy, which is much faster than maintaining them row by row.
+    create_indexes()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    move_old_table_aside()
+    create_messages_table(partitioned=False)
+    op.execute(f"INSERT INTO messages ({COLUMNS}) SELECT {COLUMNS} FROM messages_old")
+    op.execute("DROP TABLE messages_old CASCADE")
+    create_indexes()
@@ -0,0 +1,44 @@
+"""message search
+
+Revision ID: c8c48ce4214d
+Revises: 8af22afe3b64
+Create Date: 2026-10-18 11:48:03.114529
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8c48ce4214d'
+down_revision: Union[str, Sequence[str], None] = '8af22afe3b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Generated and stored, so it is always in sync with content and never
+    # recomputed at query time. 'simple' matches src/app/services/search.py.
+    op.execute("""
+        ALTER TABLE messages
+        ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('simple', content)) STORED
+    """)
+    # btree_gin lets user_id share the GIN index, so a search only touches
+    # the caller's matching rows.
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gin")
+    op.create_index(
+        'ix_messages_user_id_search_vector',
+        'messages',
+        ['user_id', 'search_vector'],
+        unique=False,
+        postgresql_using='gin',
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_messages_user_id_search_vector', table_name='messages')
+    op.drop_column('messages', 'search_vector')
@@ -0,0 +1,32 @@
+"""messages keyset index
+
+Revision ID: edd4317a9ed6
+Revises: 25bda6b30ae0
+Create Date: 2026-10-18 10:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'edd4317a9ed6'
+down_revision: Union[str, Sequence[str], None] = '25bda6b30ae0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_messages_user_id_sent_at_message_id',
+        'messages',
+        ['user_id', 'sent_at', 'message_id'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_messages_user_id_sent_at_message_id', table_name='messages')
@@ -1,36 +1,110 @@
-import os
-from dotenv import load_dotenv
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session
-from fastapi import Depends, HTTPException, Request
+from contextlib import asynccontextmanager
+from uuid import UUID
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from fastapi import Depends, HTTPException, Request, WebSocket
+from src.app.core.config import (
+    ASYNC_DATABASE_URL,
+    DATABASE_REPLICA_URLS,
+    MESSAGES_STREAM_ENABLED,
+    MESSAGES_STREAM_LISTEN_URL,
+    WRITE_BEHIND_ENABLED,
+)
+from src.app.core.cache import cache
+from src.app.core.principal_cache import cache_principal, get_principal
 from src.app.services.auth_service import AuthService
-from src.app.db.user import User 
-from sqlalchemy.orm import sessionmaker
+from src.app.core.instrumentation import instrument_engine
+from src.app.core.metrics import gauge_lines, histogram_lines, registry
+from src.app.db.pool import build_engine, pool_metric_lines
+from src.app.db.replicas import ReplicaSet, primary_pin_key
+from src.app.db.user import User
+from src.app.schemas.user import UserRead
+from src.app.services.message_stream import MessageStreamHub, is_postgres_url, listen_dsn
+from src.app.services.write_pipeline import MessageWritePipeline
 
 
-load_dotenv()
+engine = build_engine(ASYNC_DATABASE_URL)
+instrument_engine(engine)
 
-DB_USER = os.getenv("POSTGRES_USER")
-DB_PASSWORD = os.getenv("POSTGRES_PASSWORD")
-DB_HOST = os.getenv("POSTGRES_HOST", "localhost")
-DB_PORT = os.getenv("POSTGRES_PORT", "15432")
-DB_NAME = os.getenv("POSTGRES_DB")
+# expire_on_commit=False keeps loaded attributes usable after commit without
+# triggering an implicit (and, under asyncio, illegal) lazy refresh.
+SessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
 
-DATABASE_URL = f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# Read-only endpoints use these when healthy; the lag checker is run by the app lifespan.
+replicas = None
+if DATABASE_REPLICA_URLS:
+    replicas = ReplicaSet(engine, [build_engine(url, name=f"replica-{index}")
+                                   for index, url in enumerate(DATABASE_REPLICA_URLS)])
+    for replica_engine in replicas.engines:
+        instrument_engine(replica_engine)
 
-engine = create_engine(DATABASE_URL)
+# Group-commit writer for POST /messages/; started and drained by the app lifespan.
+write_pipeline = MessageWritePipeline(SessionLocal) if WRITE_BEHIND_ENABLED else None
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# One LISTEN connection per worker for /messages/stream; started and stopped by the app lifespan.
+message_hub = (
+    MessageStreamHub(listen_dsn(MESSAGES_STREAM_LISTEN_URL), SessionLocal)
+    if MESSAGES_STREAM_ENABLED and is_postgres_url(MESSAGES_STREAM_LISTEN_URL) else None
+)
 
-def get_db():
-	db = SessionLocal()
-	try:
+
+def _collect_db_metrics():
+    lines = pool_metric_lines([engine, *(replicas.engines if replicas is not None else ())])
+    if replicas is not None:
+        lines += replicas.metric_lines()
+    if write_pipeline is not None:
+        lines += histogram_lines("write_pipeline_group_size", "Rows committed per group commit.",
+                                 [({}, write_pipeline.group_size)])
+        lines += histogram_lines("write_pipeline_flush_seconds", "Group commit flush latency.",
+                                 [({}, write_pipeline.flush_latency)])
+        lines += gauge_lines("write_pipeline_rejected_total", "Sends rejected because the write queue was full.",
+                             [({}, write_pipeline.rejected)], kind="counter")
+    if message_hub is not None:
+        lines += message_hub.metric_lines()
+    return lines
+
+
+registry.register_collector(_collect_db_metrics)
+
+async def get_db():
+	async with SessionLocal() as db:
 		yield db
-	finally:
-		db.close()
 
 
-def get_current_user(request: Request, db: Session = Depends(get_db)):
+async def read_engine(user_id=None):
+    """Engine for a read: a healthy replica, unless ``user_id`` wrote within READ_YOUR_WRITES_SECONDS."""
+    if replicas is None:
+        return engine
+    if user_id is not None and await cache.exists(primary_pin_key(user_id)):
+        return engine
+    return replicas.choose() or engine
+
+
+@asynccontextmanager
+async def read_session(user_id=None):
+    """Like ``SessionLocal()`` but on ``read_engine``; for reads that outlive request dependencies."""
+    async with SessionLocal(bind=await read_engine(user_id)) as db:
+        yield db
+
+
+def token_payload(request: Request):
+    """Verified JWT claims of the request, decoded at most once (the rate limiter usually has)."""
+    payload = getattr(request.state, "token_payload", None)
+    if payload is None:
+        scheme, _, token = (request.headers.get("authorization") or "").partition(" ")
+        payload = AuthService.decode_token(token) if scheme.lower() == "bearer" and token else None
+        request.state.token_payload = payload
+    return payload
+
+
+async def get_read_db(request: Request):
+    """Session for read-only endpoints; see ``read_engine``."""
+    payload = token_payload(request)
+    async with read_session(payload.get("sub") if payload else None) as db:
+        yield db
+
+
+async def get_current_user(request: Request, db: AsyncSession = Depends(get_read_db)):
     authorization = request.headers.get("authorization")
     if not authorization:
         raise HTTPException(status_code=401, detail="Nedozvoljen pristup")
@@ -38,9 +112,48 @@ def get_current_user(request: Request, db: Session = Depends(get_db)):
         token = authorization.split(" ")[1]
     except Exception:
         raise HTTPException(status_code=401, detail="Nedozvoljen pristup")
-    user_id = AuthService.verify_token(token)
-    user = db.query(User).filter_by(id=user_id).first()
-    if not user:
-        raise HTTPException(status_code=401, detail="Korisnik nije pronađen")
-    request.state.user = user  # For per-user rate limiting
+    # The rate limiter has usually verified the token already.
+    payload = getattr(request.state, "token_payload", None) or AuthService.decode_token(token)
+    user = await load_principal(payload, db)
+    request.state.user = user
+    return user
+
+
+async def get_websocket_user(websocket: WebSocket, token=None):
+    """Authenticate a WebSocket from its Authorization header or, since
+    browsers cannot set headers on one, a ``token`` query parameter.
+
+    Opens a session only on a principal cache miss, and closes it again
+    right away: the socket may stay open for hours.
+    """
+    scheme, _, header_token = (websocket.headers.get("authorization") or "").partition(" ")
+    token = header_token if scheme.lower() == "bearer" and header_token else token
+    if not token:
+        raise HTTPException(status_code=401, detail="Nedozvoljen pristup")
+    async with SessionLocal() as db:
+        return await load_principal(AuthService.decode_token(token), db)
+
+
+async def load_principal(payload, db: AsyncSession):
+    user_id = payload.get("sub") if payload else None
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Nedozvoljen pristup")
+    # Cache hits skip the user lookup, and with it the session checkout.
+    user = get_principal(user_id)
+    if user is None:
+        try:
+            user_uuid = UUID(user_id)
+        except ValueError:
+            raise HTTPException(status_code=401, detail="Nedozvoljen pristup")
+        result = await db.execute(select(User).filter_by(id=user_uuid))
+        db_user = result.scalars().first()
+        if db_user is None and db.bind is not engine:
+            # Registered moments ago: the replica may not have the row yet.
+            async with SessionLocal() as primary:
+                result = await primary.execute(select(User).filter_by(id=user_uuid))
+                db_user = result.scalars().first()
+        if not db_user:
+            raise HTTPException(status_code=401, detail="Korisnik nije pronađen")
+        user = UserRead.model_validate(db_user)
+        cache_principal(user_id, user, expires_at=payload.get("exp"))
     return user
@@ -0,0 +1,29 @@
+import hmac
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+
+from src.app.api.dependencies import engine, replicas, write_pipeline
+from src.app.core.config import DIAGNOSTICS_TOKEN
+from src.app.db.pool import pool_name, pool_stats
+
+def require_diagnostics_token(x_diagnostics_token: Optional[str] = Header(None)):
+    # Closed unless a token is configured: these expose pool internals and per-route traffic.
+    if not DIAGNOSTICS_TOKEN or x_diagnostics_token is None or not hmac.compare_digest(
+            x_diagnostics_token.encode(), DIAGNOSTICS_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+router = APIRouter(dependencies=[Depends(require_diagnostics_token)], include_in_schema=False)
+
+@router.get("/pool")
+async def get_pool_stats():
+    """Per-worker connection pool usage, for sizing pools against worker count."""
+    engines = [engine, *(replicas.engines if replicas is not None else ())]
+    return {pool_name(engine): pool_stats(engine) for engine in engines}
+
+
+@router.get("/write-pipeline")
+async def get_write_pipeline_stats():
+    if write_pipeline is None:
+        raise HTTPException(status_code=404, detail="Write pipeline is disabled")
+    return write_pipeline.stats()
@@ -1,48 +1,294 @@
-from slowapi import Limiter
-from fastapi import Request
-
-
+import asyncio
 from fastapi import HTTPException
-from typing import List
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import List, Literal, Optional
+from uuid import UUID
+from fastapi import APIRouter, Body, Depends, Header, Query, Response, WebSocket, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.app.api.dependencies import get_current_user, get_db
-from src.app.schemas.messages import MessageBase, MessageCreate, MessageRead
+from src.app.api.dependencies import (
+    get_current_user,
+    get_db,
+    get_read_db,
+    get_websocket_user,
+    message_hub,
+    read_session,
+    write_pipeline,
+)
+from src.app.core.config import (
+    MESSAGE_BATCH_MAX_SIZE,
+    MESSAGES_MAX_PAGE_SIZE,
+    MESSAGES_PAGE_SIZE,
+    MESSAGES_SEARCH_MAX_OFFSET,
+    MESSAGES_STATS_MAX_BUCKETS,
+    MESSAGES_STREAM_KEEPALIVE_SECONDS,
+    MESSAGES_STREAM_SEND_TIMEOUT,
+)
+from src.app.core.rate_limit import limiter
+from src.app.core.responses import RawJSONResponse, etag_matches, not_modified
+from src.app.schemas.messages import (
+    ChatSummaryRead,
+    MessageBase,
+    MessageBatchResult,
+    MessageCreate,
+    MessageRead,
+    MessageSearchResult,
+    MessageUpdate,
+    RatingStats,
+)
 from src.app.schemas.user import UserBase
+from src.app.services.export import EXPORT_MEDIA_TYPES, csv_header, encode_rows
 from src.app.services.message_service import MessageService
+from src.app.services.message_stream import CLOSED, RESYNC, RESYNC_EVENT
+from src.app.services.pagination import decode_cursor, encode_cursor
+from src.app.services.rating_stats import BUCKETS, DEFAULT_RANGES, ceil_to, encode_stats, floor_to, naive_utc
+from src.app.services.search import parse_search_query
 
-def user_id_key_func(request: Request):
-    user = getattr(request.state, "user", None)
-    return str(user.id) if user and hasattr(user, "id") else request.client.host
-
-limiter = Limiter(key_func=user_id_key_func)
 router = APIRouter()
 
-@router.post("/")
-@limiter.limit("1/minute")  
-async def create_message(message: MessageCreate, request: Request, db: Session = Depends(get_db), current_user: UserBase = Depends(get_current_user)):
-    message_service = MessageService(db)
-    message_service.send_message(message, current_user.id)
+@router.post("/", dependencies=[Depends(limiter.limit("1/minute", "messages:create"))])
+async def create_message(message: MessageCreate, db: AsyncSession = Depends(get_db), current_user: UserBase = Depends(get_current_user)):
+    if write_pipeline is not None and write_pipeline.running:
+        await write_pipeline.submit(message, current_user.id)
+    else:
+        message_service = MessageService(db)
+        await message_service.send_message(message, current_user.id)
     return {"message": "Message sent successfully"}
 
 
-@router.get("/", response_model=List[MessageRead])
-@limiter.limit("10/minute") 
-async def get_messages(request: Request, db: Session = Depends(get_db), current_user: UserBase = Depends(get_current_user)):
+@router.post("/batch", response_model=MessageBatchResult, dependencies=[Depends(limiter.limit("10/minute", "messages:batch"))])
+async def create_messages_batch(
+    messages: List[MessageCreate] = Body(..., min_length=1, max_length=MESSAGE_BATCH_MAX_SIZE),
+    db: AsyncSession = Depends(get_db),
+    current_user: UserBase = Depends(get_current_user),
+):
+    message_service = MessageService(db)
+    message_ids = await message_service.send_messages(messages, current_user.id)
+    return {"message_ids": message_ids}
+
+
+@router.get("/", response_model=List[MessageRead], dependencies=[Depends(limiter.limit("10/minute", "messages:list"))])
+async def get_messages(
+    limit: int = Query(MESSAGES_PAGE_SIZE, ge=1, le=MESSAGES_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    chat_id: Optional[UUID] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: UserBase = Depends(get_current_user),
+):
+        try:
+            after = decode_cursor(cursor) if cursor else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
         message_service = MessageService(db)
-        messages = message_service.get_messages(current_user.id)
-        if not messages:
+        # Read before the page, so a concurrent write can only make the tag stale, never the body.
+        # The page cache is keyed on it too, so every worker's cache agrees with the database.
+        etag = await message_service.messages_etag(current_user.id, chat_id, "messages", limit, cursor)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        page = await message_service.get_messages_page(current_user.id, limit=limit, after=after, chat_id=chat_id,
+                                                       version=etag)
+        if not page.count:
             raise HTTPException(status_code=404, detail="No messages found" )
-        return messages
-    
-    
-@router.put("/{message_id}", response_model=MessageBase)
-@limiter.limit("3/minute")  
-async def update_message(message_id: str, message: MessageBase, request: Request, db: Session = Depends(get_db), current_user: UserBase = Depends(get_current_user)):
-    
+        headers = {"ETag": etag}
+        if page.next_cursor:
+            headers["X-Next-Cursor"] = page.next_cursor
+        return RawJSONResponse(page.body, headers=headers)
+
+
+@router.get("/search", response_model=List[MessageSearchResult], dependencies=[Depends(limiter.limit("10/minute", "messages:search"))])
+async def search_messages(
+    q: str = Query(..., min_length=1, max_length=256),
+    limit: int = Query(MESSAGES_PAGE_SIZE, ge=1, le=MESSAGES_MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0, le=MESSAGES_SEARCH_MAX_OFFSET),
+    chat_id: Optional[UUID] = None,
+    role: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: UserBase = Depends(get_current_user),
+):
+    tsquery = parse_search_query(q)
+    if tsquery is None:
+        raise HTTPException(status_code=400, detail="Search query has no searchable terms")
+    message_service = MessageService(db)
+    return await message_service.search_messages(
+        current_user.id, tsquery, limit=limit, offset=offset, chat_id=chat_id, role=role, start=start, end=end
+    )
+
+
+@router.get("/stats", response_model=RatingStats, dependencies=[Depends(limiter.limit("10/minute", "messages:stats"))])
+async def rating_stats(
+    bucket: Literal["hour", "day"] = "day",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    chat_id: Optional[UUID] = None,
+    role: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: UserBase = Depends(get_current_user),
+):
+    # Widened to whole buckets; without a start, the bucket's default range up to end.
+    end = ceil_to(naive_utc(end) if end else datetime.now(), bucket)
+    start = floor_to(naive_utc(start), bucket) if start else end - DEFAULT_RANGES[bucket]
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if (end - start) / BUCKETS[bucket] > MESSAGES_STATS_MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Range spans more than {MESSAGES_STATS_MAX_BUCKETS} buckets")
+    message_service = MessageService(db)
+    # Rollups change in the same transactions as chat summaries, so the history tag covers them.
+    etag = await message_service.messages_etag(current_user.id, chat_id, "stats", bucket, start, end, role)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    buckets = await message_service.rating_stats(current_user.id, start, end, bucket, chat_id=chat_id, role=role)
+    return RawJSONResponse(encode_stats(bucket, start, end, buckets), headers={"ETag": etag})
+
+
+@router.get("/chats", response_model=List[ChatSummaryRead], dependencies=[Depends(limiter.limit("10/minute", "messages:chats"))])
+async def list_chats(
+    response: Response,
+    limit: int = Query(MESSAGES_PAGE_SIZE, ge=1, le=MESSAGES_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: UserBase = Depends(get_current_user),
+):
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    message_service = MessageService(db)
+    etag = await message_service.messages_etag(current_user.id, None, "chats", limit, cursor)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    chats = await message_service.list_chats(current_user.id, limit=limit, after=after)
+    response.headers["ETag"] = etag
+    if len(chats) == limit:
+        last = chats[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last.last_sent_at, last.chat_id)
+    return chats
+
+
+@router.get("/chats/{chat_id}", response_model=List[MessageRead], dependencies=[Depends(limiter.limit("10/minute", "messages:chat"))])
+async def get_chat_messages(
+    chat_id: UUID,
+    limit: int = Query(MESSAGES_PAGE_SIZE, ge=1, le=MESSAGES_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: UserBase = Depends(get_current_user),
+):
+    return await get_messages(limit=limit, cursor=cursor, chat_id=chat_id, if_none_match=if_none_match,
+                              db=db, current_user=current_user)
+
+
+@router.get("/export", dependencies=[Depends(limiter.limit("2/minute", "messages:export"))])
+async def export_messages(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    chat_id: Optional[UUID] = None,
+    current_user: UserBase = Depends(get_current_user),
+):
+    async def body():
+        if format == "csv":
+            yield csv_header()
+        # The stream outlives the request's dependencies, so it owns its session.
+        async with read_session(current_user.id) as db:
+            message_service = MessageService(db)
+            async for batch in message_service.iter_message_batches(current_user.id, start=start, end=end, chat_id=chat_id):
+                yield encode_rows(format, batch)
+
+    return StreamingResponse(
+        body(),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="messages.{format}"'},
+    )
+
+
+@router.get("/stream", dependencies=[Depends(limiter.limit("10/minute", "messages:stream"))])
+async def stream_messages_sse(
+    chat_id: Optional[UUID] = None,
+    current_user: UserBase = Depends(get_current_user),
+):
+    """Server-Sent Events alternative to the WebSocket below, same events."""
+    if message_hub is None:
+        raise HTTPException(status_code=501, detail="Message streaming requires PostgreSQL")
+
+    async def body():
+        subscription = message_hub.subscribe(current_user.id, chat_id)
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), MESSAGES_STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle stream.
+                    yield b": keepalive\n\n"
+                    continue
+                yield b"data: " + (RESYNC_EVENT if event is RESYNC or event is CLOSED else event) + b"\n\n"
+                if event is CLOSED:
+                    return
+        finally:
+            message_hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/stream")
+async def stream_messages(websocket: WebSocket, chat_id: Optional[UUID] = None, token: Optional[str] = None):
+    if message_hub is None:
+        await websocket.close(code=status.WS_1011_INTERNAL_ERROR, reason="Message streaming requires PostgreSQL")
+        return
+    try:
+        current_user = await get_websocket_user(websocket, token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    subscription = message_hub.subscribe(current_user.id, chat_id)
+
+    async def forward():
+        while True:
+            event = await subscription.get()
+            # A client that stops reading would otherwise pin this task forever.
+            await asyncio.wait_for(
+                websocket.send_text((RESYNC_EVENT if event is RESYNC or event is CLOSED else event).decode()),
+                MESSAGES_STREAM_SEND_TIMEOUT,
+            )
+            if event is CLOSED:
+                await websocket.close(code=status.WS_1012_SERVICE_RESTART)
+                return
+
+    async def drain():
+        # Only disconnects matter, but reading is how they are noticed.
+        while True:
+            await websocket.receive_text()
+
+    tasks = [asyncio.create_task(forward()), asyncio.create_task(drain())]
+    try:
+        # drain ends with WebSocketDisconnect when the client leaves.
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if isinstance(task.exception(), asyncio.TimeoutError):
+                await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+    finally:
+        for task in tasks:
+            task.cancel()
+        message_hub.unsubscribe(subscription)
+
+
+@router.put("/{message_id}", response_model=MessageBase, dependencies=[Depends(limiter.limit("3/minute", "messages:update"))])
+async def update_message(message_id: UUID, message: MessageUpdate, db: AsyncSession = Depends(get_db), current_user: UserBase = Depends(get_current_user)):
+    # Full MessageBase bodies still work: fields MessageUpdate lacks are ignored.
+    if not message.model_dump(exclude_none=True):
+        raise HTTPException(status_code=400, detail="Nothing to update")
     message_service = MessageService(db)
-    updated_message = message_service.update_message(message_id, message, current_user.id)
+    updated_message = await message_service.update_message(message_id, message, current_user.id)
     if not updated_message:
         raise HTTPException(status_code=404, detail="Message not found")
     return updated_message
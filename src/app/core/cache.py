@@ -0,0 +1,181 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+from urllib.parse import urlparse
+
+from src.app.core.config import CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS, CACHE_URL
+from src.app.core.logging import logger
+from src.app.core.metrics import registry, stats_lines
+from src.app.core.resp import RespClient, RespError
+
+
+class TTLCache:
+    """Thread-safe, size-bounded LRU mapping whose entries expire after a TTL.
+
+    Each entry may carry its own expiry; ``ttl`` is the default. Expired
+    entries are dropped lazily on access, and the least recently used entry
+    is evicted once ``maxsize`` is exceeded.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class CacheBackend:
+    """Async key/value interface shared by the in-process and Redis caches.
+
+    Values are strings (callers store serialized payloads, never ORM
+    objects).
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        value = await self._get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def exists(self, key: str) -> bool:
+        """Presence check for flags; unlike ``get`` it does not count as a hit or miss."""
+        return await self._get(key) is not None
+
+    async def _get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class MemoryCacheBackend(CacheBackend):
+    def __init__(self, maxsize: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL_SECONDS):
+        super().__init__()
+        self._values = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def _get(self, key):
+        return self._values.get(key)
+
+    async def set(self, key, value, ttl=None):
+        self._values.set(key, value, ttl)
+
+    async def delete(self, key):
+        self._values.delete(key)
+
+    def stats(self):
+        values = self._values.stats()
+        return {**super().stats(), "size": values["size"], "maxsize": values["maxsize"],
+                "evictions": values["evictions"]}
+
+
+class RedisCacheBackend(CacheBackend):
+    """Cache stored in any server speaking the Redis protocol.
+
+    Size bounding and LRU eviction are delegated to the server
+    (``maxmemory`` / ``maxmemory-policy allkeys-lru``); TTLs are set per key.
+    """
+
+    def __init__(self, client: RespClient, ttl: float = CACHE_TTL_SECONDS, prefix: str = "app:"):
+        super().__init__()
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    async def _execute(self, *args, default=None):
+        # A cache outage must degrade to "miss", never fail the request.
+        try:
+            return await self.client.execute(*args)
+        except (OSError, RespError, asyncio.TimeoutError) as exc:
+            logger.warning(f"Cache command {args[0]} failed: {exc}")
+            return default
+
+    async def _get(self, key):
+        value = await self._execute("GET", self.prefix + key)
+        return value.decode() if value is not None else None
+
+    async def set(self, key, value, ttl=None):
+        ttl_ms = int((self.ttl if ttl is None else ttl) * 1000)
+        await self._execute("SET", self.prefix + key, value, "PX", max(ttl_ms, 1))
+
+    async def delete(self, key):
+        await self._execute("DEL", self.prefix + key)
+
+
+def client_from_url(url: str) -> RespClient:
+    parsed = urlparse(url)
+    db = int(parsed.path.lstrip("/") or 0)
+    return RespClient(host=parsed.hostname or "localhost", port=parsed.port or 6379,
+                      db=db, password=parsed.password)
+
+
+def build_cache_backend(url: str = CACHE_URL) -> CacheBackend:
+    """Create a backend from a ``memory://`` or ``redis://host:port/db`` URL."""
+    if url.startswith("redis://"):
+        return RedisCacheBackend(client_from_url(url))
+    if url.startswith("memory://"):
+        return MemoryCacheBackend()
+    raise ValueError(f"Unsupported cache URL: {url}")
+
+
+cache = build_cache_backend()
+
+registry.register_collector(lambda: stats_lines("app_message_cache", "Message read cache", cache.stats()))
@@ -0,0 +1,274 @@
+"""Negotiated response compression.
+
+gzip always; zstd and brotli when the ``zstandard`` / ``brotli`` modules
+are installed. The client's ``Accept-Encoding`` picks among them (highest
+``q`` wins, ties go to the first in CODECS). Bodies under
+``COMPRESSION_MIN_SIZE`` and responses that are already encoded, not
+text-like, or Server-Sent Events pass through untouched.
+
+Streaming bodies (exports) are compressed chunk by chunk as they are
+produced. Whole bodies tagged with an ETag are compressed once: the result
+is kept under the ETag, which already names the user and the data version
+(see MessageService.messages_etag), so the next identical response reuses
+the bytes. Compressed responses get a weak ETag, as their bytes differ from
+the identity encoding; If-None-Match compares weakly, so 304s still work.
+"""
+import asyncio
+import zlib
+from typing import Dict, Optional
+
+from src.app.core.cache import TTLCache
+from src.app.core.config import (
+    COMPRESSION_BROTLI_LEVEL,
+    COMPRESSION_CACHE_MAX_BYTES,
+    COMPRESSION_CACHE_MAX_ENTRIES,
+    COMPRESSION_CACHE_TTL_SECONDS,
+    COMPRESSION_GZIP_LEVEL,
+    COMPRESSION_MIN_SIZE,
+    COMPRESSION_ZSTD_LEVEL,
+)
+from src.app.core.metrics import registry, stats_lines
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+COMPRESSION_BYTES = registry.counter(
+    "http_compression_bytes_total", "Response body bytes before and after compression.", ("encoding", "stage")
+)
+
+# Text-like types worth compressing; text/event-stream is excluded below.
+COMPRESSIBLE_TYPES = {"application/json", "application/x-ndjson", "application/javascript", "image/svg+xml"}
+# Chunks at least this large are compressed off the event loop (zlib, zstd and brotli release the GIL).
+OFFLOAD_BYTES = 64 * 1024
+
+
+def _gzip(level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip header and trailer
+    return compressor.compress, compressor.flush
+
+
+def _zstd(level):
+    compressor = zstandard.ZstdCompressor(level=level).compressobj()
+    return compressor.compress, compressor.flush
+
+
+def _brotli(level):
+    compressor = brotli.Compressor(quality=level)
+    return compressor.process, compressor.finish
+
+
+# Content codings in order of preference; each factory takes a level and
+# returns ``(compress, finish)`` for one body.
+CODECS = {
+    name: factory
+    for name, factory, available in (
+        ("zstd", _zstd, zstandard is not None),
+        ("br", _brotli, brotli is not None),
+        ("gzip", _gzip, True),
+    )
+    if available
+}
+DEFAULT_LEVELS = {"zstd": COMPRESSION_ZSTD_LEVEL, "br": COMPRESSION_BROTLI_LEVEL, "gzip": COMPRESSION_GZIP_LEVEL}
+
+# Compressed whole bodies keyed by (encoding, level, path, query, ETag, length).
+compressed_bodies = TTLCache(maxsize=COMPRESSION_CACHE_MAX_ENTRIES, ttl=COMPRESSION_CACHE_TTL_SECONDS)
+
+registry.register_collector(
+    lambda: stats_lines("app_compression_cache", "Compressed response body cache", compressed_bodies.stats()))
+
+
+def compress(encoding: str, level: int, data: bytes) -> bytes:
+    """``data`` as one complete body in ``encoding``."""
+    compress_chunk, finish = CODECS[encoding](level)
+    return compress_chunk(data) + finish()
+
+
+def negotiate(accept_encoding: Optional[str], encodings=CODECS) -> Optional[str]:
+    """The coding in ``encodings`` an ``Accept-Encoding`` header prefers, or None for identity."""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, *params = part.split(";")
+        weight = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        if name.strip():
+            weights[name.strip().lower()] = weight
+    wildcard = weights.get("*", 0.0)
+    best, best_weight = None, 0.0
+    for encoding in encodings:
+        weight = weights.get(encoding, wildcard)
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def compressible(headers) -> bool:
+    """Whether a response with these (lower-cased) headers should be compressed."""
+    if b"content-encoding" in headers:
+        return False
+    media_type = headers.get(b"content-type", b"").split(b";")[0].strip().decode("latin-1").lower()
+    if media_type == "text/event-stream":
+        # Events must reach the client as they happen, not when a compressor block fills.
+        return False
+    return media_type.startswith("text/") or media_type in COMPRESSIBLE_TYPES
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _add_vary(headers: list) -> None:
+    for index, (name, value) in enumerate(headers):
+        if name.lower() == b"vary":
+            if b"accept-encoding" not in value.lower():
+                headers[index] = (name, value + b", Accept-Encoding")
+            return
+    headers.append((b"vary", b"Accept-Encoding"))
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing response bodies in the coding the client prefers.
+
+    ``levels`` maps codings to levels (default: the COMPRESSION_*_LEVEL
+    settings); only codings in it, and installed, are offered. ``cache``
+    holds compressed whole bodies that carry an ETag.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE, levels: Optional[Dict[str, int]] = None,
+                 cache: Optional[TTLCache] = compressed_bodies):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.levels = {encoding: level for encoding, level in (levels or DEFAULT_LEVELS).items()
+                       if encoding in CODECS}
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            return await self.app(scope, receive, send)
+        encoding = negotiate(_header(scope, b"accept-encoding"), self.levels)
+        responder = _Responder(self, scope, send, encoding)
+        await self.app(scope, receive, responder.send)
+
+
+class _Responder:
+    """Rewrites one response's messages; see CompressionMiddleware."""
+
+    def __init__(self, middleware, scope, send, encoding):
+        self.middleware = middleware
+        self.scope = scope
+        self.downstream = send
+        self.encoding = encoding
+        self.start = None
+        self.headers = None
+        self.buffer = b""
+        self.passthrough = False
+        self.compressor = None
+
+    async def send(self, message):
+        if self.passthrough:
+            return await self.downstream(message)
+        if message["type"] == "http.response.start":
+            self.start = message
+            self.headers = list(message.get("headers", ()))
+            status = message["status"]
+            if status < 200 or status in (204, 206, 304) or not compressible(dict(self.headers)):
+                self.passthrough = True
+                return await self.downstream(message)
+            _add_vary(self.headers)
+            if self.encoding is None:
+                self.passthrough = True
+                return await self.downstream(self._start())
+            return
+        if message["type"] != "http.response.body":
+            return await self.downstream(message)
+
+        body, more_body = message.get("body", b""), message.get("more_body", False)
+        if self.compressor is not None:
+            chunk = await self._compress(body)
+            if not more_body:
+                chunk += self.compressor[1]()
+            return await self._send_compressed(chunk, more_body)
+
+        self.buffer += body
+        if more_body and len(self.buffer) < self.middleware.minimum_size:
+            return
+        if len(self.buffer) < self.middleware.minimum_size:
+            # Ended before reaching the threshold: not worth it.
+            await self.downstream(self._start())
+            return await self.downstream({"type": "http.response.body", "body": self.buffer})
+        if not more_body:
+            return await self._send_whole()
+
+        # A stream: compress what arrived so far and every chunk that follows.
+        level = self.middleware.levels[self.encoding]
+        self.compressor = CODECS[self.encoding](level)
+        self._set_encoding(length=None)
+        await self.downstream(self._start())
+        data, self.buffer = self.buffer, b""
+        await self._send_compressed(await self._compress(data), more_body=True)
+
+    async def _send_whole(self):
+        level = self.middleware.levels[self.encoding]
+        etag = dict(self.headers).get(b"etag")
+        key = None
+        if etag is not None and self.middleware.cache is not None:
+            key = (self.encoding, level, self.scope["path"], self.scope["query_string"], etag, len(self.buffer))
+        compressed = self.middleware.cache.get(key) if key is not None else None
+        if compressed is None:
+            if len(self.buffer) >= OFFLOAD_BYTES:
+                compressed = await asyncio.to_thread(compress, self.encoding, level, self.buffer)
+            else:
+                compressed = compress(self.encoding, level, self.buffer)
+            if key is not None and len(compressed) <= COMPRESSION_CACHE_MAX_BYTES:
+                self.middleware.cache.set(key, compressed)
+        COMPRESSION_BYTES.inc(self.encoding, "in", amount=len(self.buffer))
+        COMPRESSION_BYTES.inc(self.encoding, "out", amount=len(compressed))
+        self._set_encoding(length=len(compressed))
+        await self.downstream(self._start())
+        await self.downstream({"type": "http.response.body", "body": compressed})
+
+    async def _compress(self, data: bytes) -> bytes:
+        COMPRESSION_BYTES.inc(self.encoding, "in", amount=len(data))
+        if len(data) >= OFFLOAD_BYTES:
+            return await asyncio.to_thread(self.compressor[0], data)
+        return self.compressor[0](data)
+
+    async def _send_compressed(self, chunk: bytes, more_body: bool):
+        COMPRESSION_BYTES.inc(self.encoding, "out", amount=len(chunk))
+        # The compressor may hold small chunks back; an empty write would be a no-op.
+        if chunk or not more_body:
+            await self.downstream({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    def _set_encoding(self, length: Optional[int]):
+        headers = []
+        for name, value in self.headers:
+            lowered = name.lower()
+            if lowered == b"content-length":
+                continue
+            if lowered == b"etag" and not value.startswith(b"W/"):
+                value = b"W/" + value
+            headers.append((name, value))
+        headers.append((b"content-encoding", self.encoding.encode("latin-1")))
+        if length is not None:
+            headers.append((b"content-length", str(length).encode("latin-1")))
+        self.headers = headers
+
+    def _start(self):
+        return {**self.start, "headers": self.headers}
@@ -0,0 +1,139 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def env_flag(name: str, default: str = "false") -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+DB_USER = os.getenv("POSTGRES_USER")
+DB_PASSWORD = os.getenv("POSTGRES_PASSWORD")
+DB_HOST = os.getenv("POSTGRES_HOST", "localhost")
+DB_PORT = os.getenv("POSTGRES_PORT", "15432")
+DB_NAME = os.getenv("POSTGRES_DB")
+
+DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}",
+)
+
+
+def make_async_url(url: str) -> str:
+    """Point a plain or psycopg2 Postgres URL at the asyncpg driver."""
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+
+ASYNC_DATABASE_URL = make_async_url(DATABASE_URL)
+
+# Comma-separated read replica URLs; read-only endpoints use them (see src/app/db/replicas.py).
+DATABASE_REPLICA_URLS = [
+    make_async_url(url.strip()) for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()
+]
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "2"))
+REPLICA_CHECK_INTERVAL_SECONDS = float(os.getenv("REPLICA_CHECK_INTERVAL_SECONDS", "1"))
+# After a write, the user's reads stay on the primary this long; keep it above REPLICA_MAX_LAG_SECONDS.
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
+RATE_LIMIT_ENABLED = env_flag("RATE_LIMIT_ENABLED", "true")
+# shm:// shares counters between workers on one host; redis://host:port/db across hosts.
+RATE_LIMIT_STORAGE_URL = os.getenv("RATE_LIMIT_STORAGE_URL", "shm://")
+RATE_LIMIT_SHM_SLOTS = int(os.getenv("RATE_LIMIT_SHM_SLOTS", "65536"))
+
+MESSAGES_PAGE_SIZE = int(os.getenv("MESSAGES_PAGE_SIZE", "50"))
+MESSAGES_MAX_PAGE_SIZE = int(os.getenv("MESSAGES_MAX_PAGE_SIZE", "200"))
+# Deep offsets make Postgres rank and skip every earlier match.
+MESSAGES_SEARCH_MAX_OFFSET = int(os.getenv("MESSAGES_SEARCH_MAX_OFFSET", "1000"))
+# Hour or day buckets one GET /messages/stats request may span.
+MESSAGES_STATS_MAX_BUCKETS = int(os.getenv("MESSAGES_STATS_MAX_BUCKETS", "400"))
+
+CACHE_URL = os.getenv("CACHE_URL", "memory://")
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "30"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "300"))
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", "10000"))
+
+MESSAGE_BATCH_MAX_SIZE = int(os.getenv("MESSAGE_BATCH_MAX_SIZE", "1000"))
+MESSAGE_BATCH_COPY_THRESHOLD = int(os.getenv("MESSAGE_BATCH_COPY_THRESHOLD", "500"))
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+# Response compression; see src/app/core/compression.py and benchmarks/compression_bench.py.
+COMPRESSION_ENABLED = env_flag("COMPRESSION_ENABLED", "true")
+# Smaller bodies fit one TCP segment anyway.
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1400"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "5"))
+COMPRESSION_ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+COMPRESSION_BROTLI_LEVEL = int(os.getenv("COMPRESSION_BROTLI_LEVEL", "4"))
+COMPRESSION_CACHE_MAX_ENTRIES = int(os.getenv("COMPRESSION_CACHE_MAX_ENTRIES", "1024"))
+# Larger compressed bodies are not kept; bounds the cache at entries x this.
+COMPRESSION_CACHE_MAX_BYTES = int(os.getenv("COMPRESSION_CACHE_MAX_BYTES", str(64 * 1024)))
+COMPRESSION_CACHE_TTL_SECONDS = float(os.getenv("COMPRESSION_CACHE_TTL_SECONDS", "300"))
+
+# Real-time delivery on /messages/stream; needs Postgres LISTEN/NOTIFY.
+MESSAGES_STREAM_ENABLED = env_flag("MESSAGES_STREAM_ENABLED", "true")
+# LISTEN needs a session-level connection, so point this past a transaction-mode PgBouncer.
+MESSAGES_STREAM_LISTEN_URL = os.getenv("MESSAGES_STREAM_LISTEN_URL", DATABASE_URL)
+# Events buffered per subscriber before it is told to resync instead.
+MESSAGES_STREAM_QUEUE_SIZE = int(os.getenv("MESSAGES_STREAM_QUEUE_SIZE", "256"))
+MESSAGES_STREAM_SEND_TIMEOUT = float(os.getenv("MESSAGES_STREAM_SEND_TIMEOUT", "10"))
+MESSAGES_STREAM_KEEPALIVE_SECONDS = float(os.getenv("MESSAGES_STREAM_KEEPALIVE_SECONDS", "15"))
+
+# Monthly partitions of messages; see src/app/db/partitions.py.
+PARTITION_PREMAKE_MONTHS = int(os.getenv("PARTITION_PREMAKE_MONTHS", "3"))
+PARTITION_RETENTION_MONTHS = int(os.getenv("PARTITION_RETENTION_MONTHS", "0"))
+PARTITION_ARCHIVE_DIR = os.getenv("PARTITION_ARCHIVE_DIR")
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+WRITE_BEHIND_ENABLED = env_flag("WRITE_BEHIND_ENABLED")
+WRITE_BEHIND_MAX_BATCH = int(os.getenv("WRITE_BEHIND_MAX_BATCH", "500"))
+WRITE_BEHIND_MAX_DELAY_MS = float(os.getenv("WRITE_BEHIND_MAX_DELAY_MS", "5"))
+WRITE_BEHIND_MAX_QUEUE = int(os.getenv("WRITE_BEHIND_MAX_QUEUE", "10000"))
+WRITE_BEHIND_ENQUEUE_TIMEOUT_MS = float(os.getenv("WRITE_BEHIND_ENQUEUE_TIMEOUT_MS", "100"))
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = env_flag("DB_POOL_PRE_PING", "true")
+# Transaction-pooling PgBouncer: no client-side pool, no prepared statements.
+DB_PGBOUNCER_MODE = env_flag("DB_PGBOUNCER_MODE")
+# Connections each worker opens at startup, before its first request (capped at DB_POOL_SIZE).
+DB_POOL_WARM_CONNECTIONS = int(os.getenv("DB_POOL_WARM_CONNECTIONS", str(DB_POOL_SIZE)))
+
+# Production server (python -m src.app.serve); see src/app/serve.py.
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "0"))  # 0: one per available CPU
+SERVER_LOOP = os.getenv("SERVER_LOOP", "uvloop")  # uvloop | asyncio
+SERVER_HTTP = os.getenv("SERVER_HTTP", "httptools")  # httptools | h11
+# Keep above the load balancer's idle timeout, or it will reuse connections the server just closed.
+SERVER_KEEPALIVE_SECONDS = int(os.getenv("SERVER_KEEPALIVE_SECONDS", "75"))
+SERVER_BACKLOG = int(os.getenv("SERVER_BACKLOG", "2048"))
+SERVER_GRACEFUL_SHUTDOWN_SECONDS = int(os.getenv("SERVER_GRACEFUL_SHUTDOWN_SECONDS", "30"))
+# Import the app once in the supervisor and fork workers from it.
+SERVER_PRELOAD = env_flag("SERVER_PRELOAD")
+
+# How stale other workers' numbers on a prefork server's /metrics may be.
+METRICS_SNAPSHOT_SECONDS = float(os.getenv("METRICS_SNAPSHOT_SECONDS", "2"))
+
+# Required on /internal/* and /metrics; unset keeps them closed.
+DIAGNOSTICS_TOKEN = os.getenv("DIAGNOSTICS_TOKEN")
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json | text
+LOG_FILE = os.getenv("LOG_FILE", "application.log")  # empty: stderr only
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN")  # e.g. "midnight": rotate by time instead of size
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Per-logger keep probability for INFO and below, e.g. "app.access=0.1,app.auth=0.5".
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
@@ -1,7 +1,7 @@
 from fastapi import Request, HTTPException
 from fastapi.responses import JSONResponse
 from src.app.core.logging import logger
-from slowapi.errors import RateLimitExceeded
+from src.app.core.rate_limit import RateLimitExceeded
 
 async def http_exception_handler(request: Request, exc: HTTPException):
     logger.warning(f"HTTPException: {exc}")
@@ -20,5 +20,17 @@ async def generic_exception_handler(request: Request, exc: Exception):
 async def rate_limit_handler(request: Request, exc: RateLimitExceeded):
     return JSONResponse(
         status_code=429,
-        content={"detail": "Rate limit exceeded. Please try again later."}
-    )
\ No newline at end of file
+        content={"detail": "Rate limit exceeded. Please try again later."},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+async def not_implemented_handler(request: Request, exc: Exception):
+    return JSONResponse(status_code=501, content={"detail": str(exc)})
+
+async def overloaded_handler(request: Request, exc: Exception):
+    logger.warning(f"{type(exc).__name__}: {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server is busy. Please try again later."},
+        headers={"Retry-After": "1"},
+    )
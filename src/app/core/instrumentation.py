@@ -0,0 +1,126 @@
+import re
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.routing import Match
+
+from src.app.core.metrics import registry
+
+HTTP_REQUESTS = registry.counter(
+    "http_requests_total", "HTTP requests by route template and status.", ("method", "route", "status")
+)
+HTTP_LATENCY = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route")
+)
+HTTP_IN_FLIGHT = registry.gauge(
+    "http_requests_in_flight", "HTTP requests currently being served.", ("method", "route")
+)
+REQUEST_QUERIES = registry.histogram(
+    "http_request_db_queries", "Database statements executed per HTTP request.", ("method", "route"),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55),
+)
+DB_QUERY_LATENCY = registry.histogram(
+    "db_query_duration_seconds", "Database statement latency by statement fingerprint.", ("statement",)
+)
+DB_QUERY_ROWS = registry.counter(
+    "db_query_rows_total", "Rows affected or returned by statement fingerprint.", ("statement",)
+)
+
+# Per-request statement counter; a one-element list so SQLAlchemy's event
+# hooks (running in a child greenlet that shares this context) can mutate it.
+_request_queries: ContextVar[Optional[list]] = ContextVar("request_queries", default=None)
+
+_PLACEHOLDER = re.compile(r"\$\d+|%\(\w+\)s|(?<![:\w]):\w+|\?")
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN \((?:\?, )*\?\)", re.IGNORECASE)
+_VALUES_ROWS = re.compile(r"(\((?:\?, )*\?\))(?:, \((?:\?, )*\?\))+")
+
+
+@lru_cache(maxsize=2048)
+def statement_fingerprint(statement: str) -> str:
+    """Collapse a SQL statement to its shape so metrics don't explode in cardinality."""
+    text = " ".join(statement.split())
+    text = _PLACEHOLDER.sub("?", text)
+    text = _LITERAL.sub("?", text)
+    text = _IN_LIST.sub("IN (?)", text)
+    text = _VALUES_ROWS.sub(r"\1", text)
+    return text[:240]
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Record per-statement latency and row counts, and count statements per request."""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+        fingerprint = statement_fingerprint(statement)
+        DB_QUERY_LATENCY.observe(fingerprint, value=elapsed)
+        rowcount = getattr(cursor, "rowcount", -1)
+        if rowcount and rowcount > 0:
+            DB_QUERY_ROWS.inc(fingerprint, amount=rowcount)
+        counter = _request_queries.get()
+        if counter is not None:
+            counter[0] += 1
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(exception_context):
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("query_start_time"):
+            connection.info["query_start_time"].pop()
+        counter = _request_queries.get()
+        if counter is not None:
+            counter[0] += 1
+
+
+def route_template(scope) -> str:
+    """The matched route's path template (e.g. ``/messages/{message_id}``)."""
+    app = scope.get("app")
+    for route in getattr(getattr(app, "router", None), "routes", ()):
+        match, _ = route.matches(scope)
+        if match != Match.NONE:
+            return route.path
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording count, latency, in-flight requests and
+    database statements per request, labelled by route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        route = route_template(scope)
+        status = 500
+        queries = [0]
+        token = _request_queries.set(queries)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(method, route)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_LATENCY.observe(method, route, value=time.perf_counter() - started)
+            HTTP_REQUESTS.inc(method, route, str(status))
+            REQUEST_QUERIES.observe(method, route, value=queries[0])
+            HTTP_IN_FLIGHT.dec(method, route)
+            _request_queries.reset(token)
@@ -0,0 +1,44 @@
+"""Worker lifecycle: how long startup took, and draining before shutdown.
+
+``drain()`` runs as soon as a worker is told to stop, before the server
+waits for open connections to finish (see src/app/serve.py). Hooks
+registered with ``on_drain`` end responses that would otherwise never
+finish on their own, such as message streams.
+"""
+import time
+from typing import Callable, List
+
+from src.app.core.metrics import registry
+
+STARTUP_SECONDS = registry.gauge(
+    "app_startup_seconds", "Seconds from worker process start (or fork) until it was ready to serve."
+)
+
+started_at = time.perf_counter()
+draining = False
+_drain_hooks: List[Callable[[], None]] = []
+
+
+def reset_start_time() -> None:
+    """Measure startup from now; called in a freshly forked worker."""
+    global started_at
+    started_at = time.perf_counter()
+
+
+def mark_ready() -> float:
+    elapsed = time.perf_counter() - started_at
+    STARTUP_SECONDS.set(value=elapsed)
+    return elapsed
+
+
+def on_drain(hook: Callable[[], None]) -> None:
+    _drain_hooks.append(hook)
+
+
+def drain() -> None:
+    global draining
+    if draining:
+        return
+    draining = True
+    for hook in _drain_hooks:
+        hook()
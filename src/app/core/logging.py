@@ -1,14 +1,253 @@
-import logging
+"""Application logging.
 
+Loggers never touch a file or stream on the request path: the root logger
+has a single QueueHandler that resolves the message, stamps the request ID
+and enqueues the record; a QueueListener thread does the formatting and
+I/O. Records at INFO and below can be sampled per logger so chatty hot
+routes stay cheap.
+"""
+import atexit
+import copy
+import json
 import logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)-8s - %(message)s',
-    datefmt='%d-%m-%Y %H:%M:%S',
-    handlers=[
-        logging.FileHandler("application.log"),  
-        logging.StreamHandler()  
-    ]
+import logging.handlers
+import os
+import queue
+import random
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from src.app.core.config import (
+    LOG_BACKUP_COUNT,
+    LOG_FILE,
+    LOG_FORMAT,
+    LOG_LEVEL,
+    LOG_MAX_BYTES,
+    LOG_QUEUE_SIZE,
+    LOG_ROTATE_WHEN,
+    LOG_SAMPLE_RATES,
 )
 
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# LogRecord attributes that are not user-supplied ``extra`` fields.
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id", "sample_rate"}
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """Parse ``"app.access=0.1,app.auth=0.5"`` into ``{logger prefix: keep probability}``."""
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, rate = item.partition("=")
+        rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of INFO-and-below records from the configured loggers.
+
+    The most specific configured prefix of the logger name wins. Warnings
+    and errors are never sampled. Kept records carry ``sample_rate`` so
+    counts can be scaled back up downstream.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._resolved: Dict[str, float] = {}
+
+    def rate_for(self, name: str) -> float:
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate, matched = 1.0, -1
+            for prefix, prefix_rate in self.rates.items():
+                if (name == prefix or name.startswith(prefix + ".")) and len(prefix) > matched:
+                    rate, matched = prefix_rate, len(prefix)
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record):
+        if record.levelno > logging.INFO:
+            return True
+        rate = self.rate_for(record.name)
+        if rate >= 1.0:
+            return True
+        if random.random() < rate:
+            record.sample_rate = rate
+            return True
+        return False
+
+
+class RequestContextFilter(logging.Filter):
+    """Copy the current request ID onto the record while still in the request's context."""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks and keeps structured fields intact.
+
+    Unlike the stock ``prepare``, the message and traceback are resolved
+    into separate fields instead of being pre-formatted into one string.
+    When the queue is full the record is dropped and counted.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message, request ID and any extras."""
+
+    def format(self, record):
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        if hasattr(record, "sample_rate"):
+            entry["sample_rate"] = record.sample_rate
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def build_formatter(log_format: str = LOG_FORMAT) -> logging.Formatter:
+    if log_format == "json":
+        return JsonFormatter()
+    return logging.Formatter('%(asctime)s - %(levelname)-8s - %(message)s', datefmt='%d-%m-%Y %H:%M:%S')
+
+
+def build_handlers(log_file: Optional[str] = LOG_FILE, log_format: str = LOG_FORMAT) -> list:
+    """The handlers the listener thread writes to: stderr, plus a rotating file if configured.
+
+    ``LOG_ROTATE_WHEN`` (e.g. ``midnight``) selects time-based rotation;
+    otherwise the file rotates at ``LOG_MAX_BYTES``.
+    """
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        if LOG_ROTATE_WHEN:
+            handlers.append(logging.handlers.TimedRotatingFileHandler(
+                log_file, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+            ))
+        else:
+            handlers.append(logging.handlers.RotatingFileHandler(
+                log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+            ))
+    formatter = build_formatter(log_format)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def configure_logging(target: logging.Logger, handlers: list, level=LOG_LEVEL,
+                      sample_rates: Optional[Dict[str, float]] = None,
+                      queue_size: int = LOG_QUEUE_SIZE) -> logging.handlers.QueueListener:
+    """Route ``target``'s records through a queue to ``handlers``; returns the started listener."""
+    log_queue = queue.Queue(maxsize=queue_size)
+    queue_handler = AsyncQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_rates or {}))
+    queue_handler.addFilter(RequestContextFilter())
+    target.handlers[:] = [queue_handler]
+    target.setLevel(level)
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+class RequestContextMiddleware:
+    """ASGI middleware that assigns each request an ID and logs one timed access line.
+
+    The ID comes from an incoming ``X-Request-ID`` header or is generated,
+    is visible to every log record emitted while serving the request, and
+    is echoed back in the response.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:128]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", ()), (b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            access_logger.info("%s %s %s", scope["method"], scope["path"], status, extra={
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+            })
+            request_id_var.reset(token)
+
+
 logger = logging.getLogger("app")
+access_logger = logger.getChild("access")
+
+
+
+def _start_listener() -> logging.handlers.QueueListener:
+    return configure_logging(logging.getLogger(), build_handlers(), sample_rates=parse_sample_rates(LOG_SAMPLE_RATES))
+
+
+def stop_listener() -> None:
+    """Write out every queued record and stop the listener thread; for exits that skip atexit."""
+    _listener.stop()
+
+
+def _restart_listener_after_fork() -> None:
+    # The listener thread does not survive fork() and may have held the
+    # queue's lock at that moment, so a forked worker gets a fresh queue,
+    # handlers and thread.
+    global _listener
+    _listener = _start_listener()
+
+
+_listener = _start_listener()
+atexit.register(stop_listener)
+os.register_at_fork(after_in_child=_restart_listener_after_fork)
@@ -0,0 +1,309 @@
+import asyncio
+import bisect
+import os
+import threading
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus semantics) with count and sum."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def cumulative(self):
+        """Yield ``(upper_bound, cumulative_count)`` pairs, ending with +Inf."""
+        running = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            running += count
+            yield bound, running
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": {("+Inf" if bound == float("inf") else bound): total for bound, total in self.cumulative()},
+        }
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, labelvalues, extra=()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    pairs += [f'{name}="{_escape(value)}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _histogram_samples(name, labelnames, labelvalues, histogram):
+    lines = []
+    for bound, total in histogram.cumulative():
+        labels = _format_labels(labelnames, labelvalues, [("le", _format_value(bound))])
+        lines.append(f"{name}_bucket{labels} {total}")
+    labels = _format_labels(labelnames, labelvalues)
+    lines.append(f"{name}_sum{labels} {_format_value(histogram.sum)}")
+    lines.append(f"{name}_count{labels} {histogram.count}")
+    return lines
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labelvalues, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def render(self):
+        lines = self.header()
+        for labelvalues, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labelvalues, amount: float = 1) -> None:
+        self.inc(*labelvalues, amount=-amount)
+
+    def set(self, *labelvalues, value: float) -> None:
+        with self._lock:
+            self._values[labelvalues] = value
+
+
+class LabeledHistogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+
+    def labels(self, *labelvalues) -> Histogram:
+        histogram = self._values.get(labelvalues)
+        if histogram is None:
+            with self._lock:
+                histogram = self._values.setdefault(labelvalues, Histogram(self.buckets))
+        return histogram
+
+    def observe(self, *labelvalues, value: float) -> None:
+        self.labels(*labelvalues).observe(value)
+
+    def render(self):
+        lines = self.header()
+        for labelvalues, histogram in sorted(self._values.items()):
+            lines.extend(_histogram_samples(self.name, self.labelnames, labelvalues, histogram))
+        return lines
+
+
+class MetricsRegistry:
+    """Holds metrics and renders them in the Prometheus text exposition format.
+
+    Collectors are callables returning extra exposition lines; they let
+    components that already keep their own counters (caches, pools) be
+    exported at scrape time without double bookkeeping.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        # Set in prefork workers (see src/app/serve.py): every worker's snapshot lives there.
+        self.shared_directory = None
+        self.worker = None
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()) -> Gauge:
+        return self._metrics.setdefault(name, Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS) -> LabeledHistogram:
+        return self._metrics.setdefault(name, LabeledHistogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+    def share(self, directory: str, worker: str) -> None:
+        self.shared_directory, self.worker = directory, worker
+
+    def write_snapshot(self) -> None:
+        if self.shared_directory is not None:
+            write_snapshot(self.shared_directory, self.worker, self.render())
+
+    async def publish(self, interval: float) -> None:
+        """Keep this worker's snapshot at most ``interval`` seconds old; run as a task."""
+        while True:
+            self.write_snapshot()
+            await asyncio.sleep(interval)
+
+    def render_all(self) -> str:
+        """This process's metrics, or with ``share``, every worker's merged (see ``merge_snapshots``)."""
+        if self.shared_directory is None:
+            return self.render()
+        self.write_snapshot()
+        return merge_snapshots(self.shared_directory)
+
+
+def gauge_lines(name: str, documentation: str, samples, kind: str = "gauge"):
+    """Exposition lines for a metric whose samples are computed at scrape time.
+
+    ``samples`` is an iterable of ``(labels_dict, value)``.
+    """
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}")
+    return lines
+
+
+def stats_lines(prefix: str, documentation: str, stats: dict, counters=("hits", "misses", "evictions")):
+    """Exposition lines for a component's ``stats()`` dict of plain numbers."""
+    lines = []
+    for key, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        if key in counters:
+            lines.extend(gauge_lines(f"{prefix}_{key}_total", f"{documentation} ({key})", [({}, value)], kind="counter"))
+        else:
+            lines.extend(gauge_lines(f"{prefix}_{key}", f"{documentation} ({key})", [({}, value)]))
+    return lines
+
+
+def histogram_lines(name: str, documentation: str, samples):
+    """Exposition lines for standalone Histograms; ``samples`` is ``(labels_dict, histogram)`` pairs."""
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} histogram"]
+    for labels, histogram in samples:
+        lines.extend(_histogram_samples(name, labels.keys(), labels.values(), histogram))
+    return lines
+
+
+# Prefork workers each write their exposition to ``<worker>.prom`` in a
+# shared directory; whichever worker is scraped merges them all. Counters and
+# histograms are summed. Gauges describe one process, so each keeps a
+# ``worker`` label instead. A dead worker's file is folded into RETIRED,
+# keeping only its counters and histograms, so totals never go backwards.
+SNAPSHOT_SUFFIX = ".prom"
+RETIRED = "retired"
+
+
+def write_snapshot(directory: str, worker: str, text: str) -> None:
+    path = os.path.join(directory, worker + SNAPSHOT_SUFFIX)
+    partial = f"{path}.{os.getpid()}.tmp"
+    with open(partial, "w") as snapshot:
+        snapshot.write(text)
+    os.replace(partial, path)  # readers never see half a file
+
+
+def _parse_value(value: str):
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def merge_expositions(texts, cumulative_only=False) -> str:
+    """Merge ``(worker, exposition text)`` pairs into one exposition.
+
+    Samples of counter and histogram families are summed across workers;
+    other samples get a ``worker`` label, or are dropped with ``cumulative_only``.
+    """
+    families = {}  # name -> [help, type, {sample key: value}], in first-seen order
+    for worker, text in texts:
+        family = None
+        for line in text.splitlines():
+            if line.startswith("# HELP "):
+                name = line.split(" ", 3)[2]
+                family = families.setdefault(name, [line, None, {}])
+            elif line.startswith("# TYPE "):
+                family[1] = line
+            elif line and family is not None:
+                key, _, value = line.rpartition(" ")
+                if family[1].endswith((" counter", " histogram")):
+                    samples = family[2]
+                    samples[key] = samples.get(key, 0) + _parse_value(value)
+                elif not cumulative_only:
+                    label = f'worker="{_escape(worker)}"'
+                    key = key[:-1] + "," + label + "}" if key.endswith("}") else key + "{" + label + "}"
+                    family[2][key] = _parse_value(value)
+    lines = []
+    for help_line, type_line, samples in families.values():
+        if samples or not cumulative_only:
+            lines += [help_line, type_line]
+            lines += [f"{key} {_format_value(value)}" for key, value in samples.items()]
+    return "\n".join(lines) + "\n"
+
+
+def _read_snapshots(directory: str):
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(SNAPSHOT_SUFFIX):
+            try:
+                with open(os.path.join(directory, filename)) as snapshot:
+                    yield filename[:-len(SNAPSHOT_SUFFIX)], snapshot.read()
+            except FileNotFoundError:  # retired meanwhile
+                continue
+
+
+def merge_snapshots(directory: str) -> str:
+    return merge_expositions(_read_snapshots(directory))
+
+
+def retire_snapshot(directory: str, worker: str) -> None:
+    """Fold an exited worker's counters and histograms into the retired totals; drop its gauges."""
+    path = os.path.join(directory, worker + SNAPSHOT_SUFFIX)
+    retired = os.path.join(directory, RETIRED + SNAPSHOT_SUFFIX)
+    texts = []
+    for source in (retired, path):
+        try:
+            with open(source) as snapshot:
+                texts.append((RETIRED, snapshot.read()))
+        except FileNotFoundError:
+            pass
+    if texts:
+        write_snapshot(directory, RETIRED, merge_expositions(texts, cumulative_only=True))
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,39 @@
+import time
+from typing import Optional
+
+from sqlalchemy import event
+
+from src.app.core.cache import TTLCache
+from src.app.core.config import PRINCIPAL_CACHE_MAX_ENTRIES, PRINCIPAL_CACHE_TTL_SECONDS
+from src.app.core.metrics import registry, stats_lines
+from src.app.db.user import User
+from src.app.schemas.user import UserRead
+
+# Authenticated users keyed by the token's ``sub`` claim. Entries never
+# outlive the token that produced them, so a cached principal can't be
+# served for an expired token even if the TTL is long.
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_MAX_ENTRIES, ttl=PRINCIPAL_CACHE_TTL_SECONDS)
+
+registry.register_collector(lambda: stats_lines("app_principal_cache", "Authenticated principal cache", principal_cache.stats()))
+
+
+def get_principal(user_id: str) -> Optional[UserRead]:
+    return principal_cache.get(user_id)
+
+
+def cache_principal(user_id: str, principal: UserRead, expires_at: Optional[float] = None) -> None:
+    ttl = PRINCIPAL_CACHE_TTL_SECONDS
+    if expires_at is not None:
+        ttl = min(ttl, expires_at - time.time())
+    if ttl > 0:
+        principal_cache.set(user_id, principal, ttl)
+
+
+def invalidate_principal(user_id) -> None:
+    principal_cache.delete(str(user_id))
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_changed_user(mapper, connection, target):
+    invalidate_principal(target.id)
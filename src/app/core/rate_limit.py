@@ -0,0 +1,229 @@
+import asyncio
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+from typing import Optional, Tuple
+from urllib.parse import urlparse
+
+from fastapi import Request
+
+from src.app.core.cache import client_from_url
+from src.app.core.config import RATE_LIMIT_ENABLED, RATE_LIMIT_SHM_SLOTS, RATE_LIMIT_STORAGE_URL
+from src.app.core.logging import logger
+from src.app.core.metrics import registry
+from src.app.core.resp import RespClient, RespError
+from src.app.services.auth_service import AuthService
+
+RATE_LIMITED = registry.counter("rate_limit_rejected_total", "Requests rejected by the rate limiter.", ("scope",))
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+_LIMIT = re.compile(r"^\s*(\d+)\s*/\s*(\d+)?\s*(second|minute|hour|day)s?\s*$")
+
+
+class RateLimitExceeded(Exception):
+    """Raised before the endpoint runs; ``retry_after`` is in whole seconds."""
+
+    def __init__(self, scope: str, retry_after: int):
+        super().__init__(f"Rate limit exceeded for {scope}")
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+def parse_limit(spec: str) -> Tuple[int, float]:
+    """Parse ``"10/minute"`` or ``"100/5 minutes"`` into ``(count, period_seconds)``."""
+    match = _LIMIT.match(spec)
+    if not match:
+        raise ValueError(f"Invalid rate limit: {spec!r}")
+    count, multiplier, unit = match.groups()
+    return int(count), int(multiplier or 1) * _PERIODS[unit]
+
+
+def sliding_window_retry_after(current: int, previous: int, elapsed: float, limit: int, period: float) -> float:
+    """Seconds until one more hit fits, or 0 if it fits now.
+
+    The sliding-window counter estimates the hits in the last ``period`` as
+    the current fixed window's count plus the previous window's count
+    weighted by how much of it still overlaps the sliding window.
+    """
+    fraction = elapsed / period
+    if previous * (1 - fraction) + current + 1 <= limit:
+        return 0.0
+    if current + 1 <= limit:
+        # Fits later in this window, once enough of the previous one has slid out.
+        return (1 - (limit - current - 1) / previous - fraction) * period
+    # Only once this window has become the previous one and decayed enough.
+    return (2 - fraction - (limit - 1) / current) * period
+
+
+class RateLimitStorage:
+    """Counts hits per key in fixed windows shared by every worker.
+
+    ``acquire`` records the hit only if it is allowed, so clients retrying
+    while throttled do not extend their own penalty.
+    """
+
+    async def acquire(self, key: str, limit: int, period: float, now: Optional[float] = None) -> float:
+        raise NotImplementedError
+
+
+class SharedMemoryStorage(RateLimitStorage):
+    """Fixed-size hash table in a memory-mapped file shared by all workers on a host.
+
+    Each slot holds ``(key hash, window number, hits in window, hits in the
+    previous window)``. Updates are serialised with ``flock`` on the file.
+    Lookups probe a few neighbouring slots; when all of them hold live
+    windows, the stalest is overwritten, which can only make the limiter
+    more lenient for the evicted key.
+    """
+
+    SLOT = struct.Struct("<QqII")
+    PROBES = 8
+
+    def __init__(self, path: str, slots: int = RATE_LIMIT_SHM_SLOTS):
+        self.path = path
+        self.slots = slots
+        size = slots * self.SLOT.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+        # flock is per open file description, so threads of one process need their own lock.
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        # Never 0: a zero hash marks an empty slot.
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+
+    def _acquire(self, key: str, limit: int, period: float, now: float) -> float:
+        key_hash = self._hash(key)
+        window, elapsed = divmod(now, period)
+        window = int(window)
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                victim, victim_window = None, None
+                for probe in range(self.PROBES):
+                    offset = ((key_hash + probe) % self.slots) * self.SLOT.size
+                    slot_hash, slot_window, current, previous = self.SLOT.unpack_from(self._map, offset)
+                    if slot_hash == key_hash:
+                        break
+                    if victim is None or slot_window < victim_window:
+                        victim, victim_window = offset, slot_window
+                else:
+                    offset, current, previous, slot_window = victim, 0, 0, window
+                if slot_window == window - 1:
+                    current, previous = 0, current
+                elif slot_window != window:
+                    current, previous = 0, 0
+                retry_after = sliding_window_retry_after(current, previous, elapsed, limit, period)
+                if not retry_after:
+                    current += 1
+                self.SLOT.pack_into(self._map, offset, key_hash, window, current, previous)
+                return retry_after
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    async def acquire(self, key, limit, period, now=None):
+        return self._acquire(key, limit, period, time.time() if now is None else now)
+
+
+class RedisStorage(RateLimitStorage):
+    """Window counters kept in a Redis-protocol server, shared across hosts.
+
+    If the server is unreachable the limiter fails open: throttling is a
+    protection, not a reason to turn every request into an error.
+    """
+
+    def __init__(self, client: RespClient, prefix: str = "ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+
+    async def acquire(self, key, limit, period, now=None):
+        now = time.time() if now is None else now
+        window, elapsed = divmod(now, period)
+        window = int(window)
+        current_key = f"{self.prefix}{key}:{window}"
+        try:
+            current = await self.client.execute("INCR", current_key)
+            if current == 1:
+                await self.client.execute("PEXPIRE", current_key, int(period * 2000))
+            previous = int(await self.client.execute("GET", f"{self.prefix}{key}:{window - 1}") or 0)
+            retry_after = sliding_window_retry_after(current - 1, previous, elapsed, limit, period)
+            if retry_after:
+                await self.client.execute("DECR", current_key)
+            return retry_after
+        except (OSError, RespError, asyncio.TimeoutError) as exc:
+            logger.warning(f"Rate limit storage unavailable, allowing request: {exc}")
+            return 0.0
+
+
+def build_storage(url: str = RATE_LIMIT_STORAGE_URL) -> RateLimitStorage:
+    """Create storage from ``shm://[/path]`` or ``redis://host:port/db``."""
+    if url.startswith("redis://"):
+        return RedisStorage(client_from_url(url))
+    if url.startswith("shm://"):
+        path = urlparse(url).path
+        if not path:
+            directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+            path = os.path.join(directory, "messages-backend-rate-limit")
+        return SharedMemoryStorage(path)
+    raise ValueError(f"Unsupported rate limit storage URL: {url}")
+
+
+def rate_limit_key(request: Request) -> str:
+    """Key on the verified JWT subject when present, else on the client IP.
+
+    Only the token signature is checked here; no session is opened. The
+    claims are kept on ``request.state`` so ``get_current_user`` does not
+    decode the token a second time.
+    """
+    authorization = request.headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() == "bearer" and token:
+        payload = AuthService.decode_token(token)
+        request.state.token_payload = payload
+        if payload and payload.get("sub"):
+            return f"user:{payload['sub']}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+class RateLimiter:
+    def __init__(self, storage: Optional[RateLimitStorage] = None, enabled: bool = RATE_LIMIT_ENABLED):
+        self.enabled = enabled
+        self._storage = storage
+
+    @property
+    def storage(self) -> RateLimitStorage:
+        # Built lazily so importing the app never touches shared memory or the network.
+        if self._storage is None:
+            self._storage = build_storage()
+        return self._storage
+
+    def limit(self, spec: str, scope: str):
+        """Route dependency enforcing ``spec`` (e.g. ``"10/minute"``) per client for ``scope``.
+
+        Attach it with ``dependencies=[Depends(...)]`` on the route so it
+        runs before ``get_db`` and ``get_current_user``.
+        """
+        count, period = parse_limit(spec)
+
+        async def dependency(request: Request):
+            if not self.enabled:
+                return
+            retry_after = await self.storage.acquire(f"{scope}:{rate_limit_key(request)}", count, period)
+            if retry_after:
+                RATE_LIMITED.inc(scope)
+                raise RateLimitExceeded(scope, max(1, math.ceil(retry_after)))
+
+        return dependency
+
+
+limiter = RateLimiter()
@@ -0,0 +1,105 @@
+import asyncio
+from typing import Any, Optional
+
+
+class RespError(Exception):
+    """Error reply (``-ERR ...``) returned by a Redis-protocol server."""
+
+
+def encode_command(*args) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, bytes):
+            data = arg
+        else:
+            data = str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader) -> Any:
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Connection closed by server")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"+":
+        return payload.decode()
+    if kind == b"-":
+        raise RespError(payload.decode())
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        length = int(payload)
+        if length == -1:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if kind == b"*":
+        length = int(payload)
+        if length == -1:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+    raise RespError(f"Unexpected reply type: {line!r}")
+
+
+class RespClient:
+    """Minimal asyncio client for servers speaking the Redis protocol (RESP2).
+
+    Commands are serialised over a single connection, which is (re)opened
+    lazily; that is plenty for the handful of small cache and rate-limit
+    commands issued per request.
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 6379, db: int = 0,
+                 password: Optional[str] = None, timeout: float = 1.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout
+        )
+        if self.password:
+            await self._roundtrip("AUTH", self.password)
+        if self.db:
+            await self._roundtrip("SELECT", self.db)
+
+    async def _roundtrip(self, *args):
+        self._writer.write(encode_command(*args))
+        await self._writer.drain()
+        return await asyncio.wait_for(read_reply(self._reader), self.timeout)
+
+    async def execute(self, *args):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            try:
+                if self._writer is None or self._writer.is_closing():
+                    await self._connect()
+                return await self._roundtrip(*args)
+            except RespError:
+                raise
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+                await self._close()
+                raise
+
+    async def _close(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except OSError:
+                pass
+        self._reader = self._writer = None
+
+    async def close(self):
+        if self._lock is None:
+            return await self._close()
+        async with self._lock:
+            await self._close()
@@ -0,0 +1,28 @@
+from typing import Optional
+
+from fastapi.responses import Response
+
+
+class RawJSONResponse(Response):
+    """A response whose body is already-encoded JSON.
+
+    Returning a Response from an endpoint makes FastAPI skip
+    ``response_model`` validation and its own encoding, so the model only
+    documents the shape; the encoder must produce exactly that shape.
+    """
+
+    media_type = "application/json"
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an ``If-None-Match`` header matches ``etag`` (weak comparison, as RFC 9110 requires)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag.removeprefix("W/") for tag in candidates)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
@@ -0,0 +1,23 @@
+from uuid import UUID
+from datetime import datetime
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import ForeignKey, Index
+from .base import Base
+
+class ChatSummary(Base):
+    """Per-chat aggregates, maintained in the same transaction as every message write."""
+    __tablename__ = 'chat_summaries'
+    __table_args__ = (
+        # The chat list is a backwards walk of this index.
+        Index('ix_chat_summaries_user_id_last_sent_at', 'user_id', 'last_sent_at', 'chat_id'),
+    )
+
+    user_id: Mapped[UUID] = mapped_column(ForeignKey('users.id'), primary_key=True)
+    chat_id: Mapped[UUID] = mapped_column(primary_key=True)
+    message_count: Mapped[int]
+    rating_sum: Mapped[int]
+    last_message_id: Mapped[UUID]
+    last_message_preview: Mapped[str]
+    last_sent_at: Mapped[datetime]
+    # Bumped by every write to the chat; the source of ETags for history reads.
+    version: Mapped[int] = mapped_column(default=1)
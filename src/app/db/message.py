@@ -1,17 +1,26 @@
 from uuid import UUID, uuid4
 from datetime import datetime
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import ForeignKey, Integer
+from sqlalchemy import ForeignKey, Index, Integer
 from .base import Base
 
 class Message(Base):
+    # In Postgres this is range-partitioned by month on sent_at (see the
+    # partition_messages migration and src/app/db/partitions.py), which is
+    # why sent_at is part of the primary key.
     __tablename__ = 'messages'
+    __table_args__ = (
+        # Keyset pagination of a user's history walks this index backwards.
+        Index('ix_messages_user_id_sent_at_message_id', 'user_id', 'sent_at', 'message_id'),
+        # Same, scoped to one chat.
+        Index('ix_messages_chat_id_sent_at_message_id', 'chat_id', 'sent_at', 'message_id'),
+    )
 
     message_id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
     chat_id: Mapped[UUID]
     content: Mapped[str]
     rating: Mapped[int]
-    sent_at: Mapped[datetime]
+    sent_at: Mapped[datetime] = mapped_column(primary_key=True)
     role: Mapped[str]
     user_id: Mapped[UUID] = mapped_column(ForeignKey('users.id'))
 
@@ -0,0 +1,197 @@
+"""Monthly range partitions of ``messages`` on ``sent_at``.
+
+    python -m src.app.db.partitions            # pre-create, then apply retention
+    python -m src.app.db.partitions --dry-run  # only print the plan
+
+Pre-creates ``PARTITION_PREMAKE_MONTHS`` months ahead so writes never land
+in the default partition. Partitions entirely older than
+``PARTITION_RETENTION_MONTHS`` (0 keeps everything) are detached; with
+``PARTITION_ARCHIVE_DIR`` set they are then written there as gzipped CSV
+and dropped, otherwise they are left as standalone tables. Chat summaries
+and rating rollups are not rewritten, so they keep counting archived
+messages.
+
+Run it from cron (daily is plenty) on one host.
+"""
+import argparse
+import asyncio
+import gzip
+import os
+import re
+import sys
+from datetime import date, datetime
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from src.app.core.config import (
+    ASYNC_DATABASE_URL,
+    PARTITION_ARCHIVE_DIR,
+    PARTITION_PREMAKE_MONTHS,
+    PARTITION_RETENTION_MONTHS,
+)
+from src.app.core.logging import logger
+
+PARENT = "messages"
+DEFAULT_PARTITION = "messages_default"
+# Columns a partition is filled with; search_vector is generated.
+COLUMNS = ("message_id", "chat_id", "content", "rating", "sent_at", "role", "user_id")
+
+_NAME = re.compile(r"^messages_p(\d{4})(\d{2})$")
+
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"messages_p{month:%Y%m}"
+
+
+def parse_partition_name(name: str) -> Optional[date]:
+    match = _NAME.match(name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def plan_maintenance(existing: Iterable[date], today: date, premake: int = PARTITION_PREMAKE_MONTHS,
+                     retention: int = PARTITION_RETENTION_MONTHS) -> Tuple[List[date], List[date]]:
+    """Return ``(months to create, months to retire)``.
+
+    Months from the current one through ``premake`` ahead must exist. With
+    a retention of N months, a partition is retired once every row in it is
+    older than the first day of the month N months back.
+    """
+    existing = set(existing)
+    current = month_start(today)
+    to_create = [add_months(current, offset) for offset in range(premake + 1)
+                 if add_months(current, offset) not in existing]
+    to_retire = []
+    if retention > 0:
+        cutoff = add_months(current, -retention)
+        to_retire = sorted(month for month in existing if add_months(month, 1) <= cutoff)
+    return to_create, to_retire
+
+
+async def existing_partitions(connection) -> List[date]:
+    result = await connection.execute(text(
+        "SELECT child.relname FROM pg_inherits"
+        " JOIN pg_class child ON child.oid = pg_inherits.inhrelid"
+        " WHERE pg_inherits.inhparent = CAST(:parent AS regclass)"
+    ), {"parent": PARENT})
+    return sorted(month for month in map(parse_partition_name, result.scalars()) if month is not None)
+
+
+async def create_partition(connection, month: date) -> None:
+    """Create ``month``'s partition, moving any rows the default partition caught for it."""
+    name, start, end = partition_name(month), month, add_months(month, 1)
+    bounds = {"start": start, "end": end}
+    in_default = await connection.scalar(text(
+        f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE sent_at >= :start AND sent_at < :end)"
+    ), bounds)
+    if not in_default:
+        await connection.execute(text(
+            f"CREATE TABLE {name} PARTITION OF {PARENT} FOR VALUES FROM ('{start}') TO ('{end}')"
+        ))
+        return
+    # A new partition may not overlap rows already in the default one, so
+    # build it detached, move the rows over, then attach it.
+    columns = ", ".join(COLUMNS)
+    await connection.execute(text(
+        f"CREATE TABLE {name} (LIKE {PARENT} INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING CONSTRAINTS)"
+    ))
+    await connection.execute(text(
+        f"INSERT INTO {name} ({columns}) SELECT {columns} FROM {DEFAULT_PARTITION}"
+        " WHERE sent_at >= :start AND sent_at < :end"
+    ), bounds)
+    await connection.execute(text(
+        f"DELETE FROM {DEFAULT_PARTITION} WHERE sent_at >= :start AND sent_at < :end"
+    ), bounds)
+    await connection.execute(text(
+        f"ALTER TABLE {PARENT} ATTACH PARTITION {name} FOR VALUES FROM ('{start}') TO ('{end}')"
+    ))
+
+
+async def archive_partition(connection, name: str, archive_dir: str) -> str:
+    """Stream a detached partition to ``<archive_dir>/<name>.csv.gz`` with COPY."""
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{name}.csv.gz")
+    raw_connection = await connection.get_raw_connection()
+    with gzip.open(path + ".partial", "wb") as archive:
+        async def write(chunk):
+            archive.write(chunk)
+        await raw_connection.driver_connection.copy_from_table(
+            name, columns=list(COLUMNS), output=write, format="csv", header=True
+        )
+    os.replace(path + ".partial", path)
+    return path
+
+
+async def retire_partition(connection, month: date, archive_dir: Optional[str]) -> None:
+    name = partition_name(month)
+    # Pages that contained these rows change, so their cached ETags must too.
+    await connection.execute(text(
+        f"UPDATE chat_summaries SET version = version + 1"
+        f" WHERE (user_id, chat_id) IN (SELECT DISTINCT user_id, chat_id FROM {name})"
+    ))
+    await connection.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+    if archive_dir:
+        path = await archive_partition(connection, name, archive_dir)
+        await connection.execute(text(f"DROP TABLE {name}"))
+        logger.info(f"Archived partition {name} to {path}")
+    else:
+        logger.info(f"Detached partition {name}")
+
+
+async def maintain(engine, today: Optional[date] = None, premake: int = PARTITION_PREMAKE_MONTHS,
+                   retention: int = PARTITION_RETENTION_MONTHS, archive_dir: Optional[str] = PARTITION_ARCHIVE_DIR,
+                   dry_run: bool = False):
+    today = today or datetime.now().date()
+    async with engine.connect() as connection:
+        to_create, to_retire = plan_maintenance(await existing_partitions(connection), today, premake, retention)
+    if dry_run:
+        return to_create, to_retire
+    # One transaction per partition keeps locks on the parent short.
+    for month in to_create:
+        async with engine.begin() as connection:
+            await create_partition(connection, month)
+        logger.info(f"Created partition {partition_name(month)}")
+    for month in to_retire:
+        async with engine.begin() as connection:
+            await retire_partition(connection, month, archive_dir)
+    return to_create, to_retire
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain monthly partitions of the messages table.")
+    parser.add_argument("--premake", type=int, default=PARTITION_PREMAKE_MONTHS, help="months to create ahead")
+    parser.add_argument("--retention", type=int, default=PARTITION_RETENTION_MONTHS,
+                        help="months of history to keep attached (0 keeps everything)")
+    parser.add_argument("--archive-dir", default=PARTITION_ARCHIVE_DIR,
+                        help="archive retired partitions here as .csv.gz and drop them")
+    parser.add_argument("--dry-run", action="store_true")
+    return parser.parse_args(argv)
+
+
+async def main(args):
+    from src.app.db.pool import build_engine
+
+    engine = build_engine(ASYNC_DATABASE_URL, name="partitions")
+    try:
+        to_create, to_retire = await maintain(engine, premake=args.premake, retention=args.retention,
+                                              archive_dir=args.archive_dir, dry_run=args.dry_run)
+    finally:
+        await engine.dispose()
+    action = "archive" if args.archive_dir else "detach"
+    for month in to_create:
+        print(f"create {partition_name(month)}")
+    for month in to_retire:
+        print(f"{action} {partition_name(month)}")
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,184 @@
+import asyncio
+import time
+import uuid
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+
+from src.app.core.config import (
+    DB_MAX_OVERFLOW,
+    DB_PGBOUNCER_MODE,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+)
+from src.app.core.logging import logger
+from src.app.core.metrics import Histogram, gauge_lines, histogram_lines
+
+
+class PoolMetrics:
+    """Checkout/checkin counters and checkout wait times for one engine's pool."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.checkout_wait = Histogram()
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.timeouts = 0
+        self.peak_in_use = 0
+        self.peak_overflow = 0
+
+
+# Keyed by pool logging name; survives pool.recreate() on engine.dispose().
+pool_metrics: dict[str, PoolMetrics] = {}
+
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that times how long each checkout waits.
+
+    The measured interval covers queueing for a free connection, opening an
+    overflow connection and the pre-ping, i.e. everything a request waits
+    for before it can run its first statement.
+    """
+
+    def connect(self):
+        metrics = pool_metrics.get(self._orig_logging_name)
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except PoolTimeoutError:
+            if metrics is not None:
+                metrics.timeouts += 1
+            raise
+        finally:
+            if metrics is not None:
+                metrics.checkout_wait.observe(time.perf_counter() - started)
+
+
+def _instrument(engine: AsyncEngine, metrics: PoolMetrics) -> None:
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        metrics.connects += 1
+
+    @event.listens_for(sync_engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.checkouts += 1
+        pool = sync_engine.pool
+        if isinstance(pool, AsyncAdaptedQueuePool):
+            metrics.peak_in_use = max(metrics.peak_in_use, pool.checkedout())
+            metrics.peak_overflow = max(metrics.peak_overflow, pool.overflow())
+
+    @event.listens_for(sync_engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        metrics.checkins += 1
+
+
+def build_engine(url: str, name: str = "primary") -> AsyncEngine:
+    """Create an AsyncEngine whose pool is configured from the environment and instrumented."""
+    kwargs = {"pool_logging_name": name}
+    if url.startswith("postgresql+asyncpg") and DB_PGBOUNCER_MODE:
+        # PgBouncer (transaction pooling) does the pooling and can't keep
+        # prepared statements across transactions.
+        kwargs.update(
+            poolclass=NullPool,
+            connect_args={
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+            },
+        )
+    elif ":memory:" not in url:
+        kwargs.update(
+            poolclass=InstrumentedAsyncPool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=DB_POOL_PRE_PING,
+        )
+    engine = create_async_engine(url, **kwargs)
+    metrics = pool_metrics.setdefault(name, PoolMetrics(name))
+    _instrument(engine, metrics)
+    return engine
+
+
+async def warm_pool(engine: AsyncEngine, connections: int, timeout: float = 5) -> int:
+    """Open up to ``connections`` pooled connections now, so early requests don't pay for connecting.
+
+    Returns how many were opened. Failures are logged, not raised: a
+    database that is briefly unreachable at boot should cost the first
+    requests a connect, not the worker its startup.
+    """
+    pool = engine.sync_engine.pool
+    if not isinstance(pool, AsyncAdaptedQueuePool):
+        return 0
+    # Connections beyond pool_size would be closed again on checkin.
+    connections = min(connections, pool.size())
+
+    async def open_one():
+        async with engine.connect() as connection:
+            await connection.exec_driver_sql("SELECT 1")
+
+    # Held concurrently, so each checkout opens a new connection.
+    results = await asyncio.gather(
+        *(asyncio.wait_for(open_one(), timeout) for _ in range(connections)), return_exceptions=True
+    )
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        logger.warning(f"Pool {pool_name(engine)}: {len(errors)} of {connections} warm-up connections failed: "
+                       f"{errors[0]!r}")
+    return connections - len(errors)
+
+
+def pool_name(engine: AsyncEngine) -> str:
+    return engine.sync_engine.pool._orig_logging_name
+
+
+def pool_stats(engine: AsyncEngine) -> dict:
+    pool = engine.sync_engine.pool
+    metrics = pool_metrics[pool_name(engine)]
+    stats = {
+        "pool_class": type(pool).__name__,
+        "checkouts": metrics.checkouts,
+        "checkins": metrics.checkins,
+        "connects": metrics.connects,
+        "timeouts": metrics.timeouts,
+        "checkout_wait_seconds": metrics.checkout_wait.snapshot(),
+    }
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        stats.update(
+            size=pool.size(),
+            max_overflow=pool._max_overflow,
+            in_use=pool.checkedout(),
+            idle=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+            peak_in_use=metrics.peak_in_use,
+            peak_overflow=max(metrics.peak_overflow, 0),
+        )
+    return stats
+
+
+def pool_metric_lines(engines) -> list:
+    """Prometheus exposition of pool_stats() for each engine, labelled by pool name."""
+    stats = {pool_name(engine): pool_stats(engine) for engine in engines}
+    lines = []
+    for key in ("checkouts", "checkins", "connects", "timeouts"):
+        lines.extend(gauge_lines(
+            f"db_pool_{key}_total", f"Connection pool {key}.",
+            [({"pool": name}, values[key]) for name, values in stats.items()], kind="counter",
+        ))
+    for key in ("size", "in_use", "idle", "overflow", "peak_in_use"):
+        samples = [({"pool": name}, values[key]) for name, values in stats.items() if key in values]
+        if samples:
+            lines.extend(gauge_lines(f"db_pool_{key}", f"Connection pool {key}.", samples))
+    lines.extend(histogram_lines(
+        "db_pool_checkout_wait_seconds", "Time spent waiting to check out a pooled connection.",
+        [({"pool": name}, pool_metrics[name].checkout_wait) for name in stats],
+    ))
+    return lines
@@ -0,0 +1,25 @@
+from uuid import UUID
+from datetime import datetime
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import ForeignKey, PrimaryKeyConstraint
+from .base import Base
+
+class RatingRollup(Base):
+    """Message counts per user, hour or day, chat, role and rating, maintained in the same transaction as every message write."""
+    __tablename__ = 'rating_rollups'
+    __table_args__ = (
+        # The stats query is a range scan of one user's buckets of one size;
+        # carrying message_count lets it skip the heap.
+        PrimaryKeyConstraint('user_id', 'granularity', 'bucket_start', 'chat_id', 'role', 'rating',
+                             postgresql_include=['message_count']),
+    )
+
+    user_id: Mapped[UUID] = mapped_column(ForeignKey('users.id'))
+    # "hour" or "day": every message is counted once in each.
+    granularity: Mapped[str]
+    # sent_at truncated to the granularity.
+    bucket_start: Mapped[datetime]
+    chat_id: Mapped[UUID]
+    role: Mapped[str]
+    rating: Mapped[int]
+    message_count: Mapped[int]
@@ -0,0 +1,153 @@
+"""Read replicas: round-robin routing with a lag check that pulls stale ones out.
+
+Replicas start out of rotation and join once their first lag check
+passes. A background task re-measures every replica each
+``REPLICA_CHECK_INTERVAL_SECONDS``; one that lags more than
+``REPLICA_MAX_LAG_SECONDS``, or cannot be queried, is skipped until it
+recovers. With no healthy replica, reads go to the primary.
+
+Lag is measured against the primary, not taken from the replica's own
+view: each check records the primary's WAL position, and a replica's lag
+is the time since the primary was last at or behind the position the
+replica has replayed. A replica whose WAL receiver is stuck believes it
+has replayed everything it received, so only the primary can tell it is
+behind; an idle primary, on the other hand, does not make a caught-up
+replica look stale.
+
+Read-your-writes is handled outside this module: writers pin the user to
+the primary for ``READ_YOUR_WRITES_SECONDS`` through the shared cache
+(see ``primary_pin_key``), and read dependencies check the pin first.
+"""
+import asyncio
+from collections import deque
+from typing import List, Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.app.core.config import REPLICA_CHECK_INTERVAL_SECONDS, REPLICA_MAX_LAG_SECONDS
+from src.app.core.logging import logger
+from src.app.core.metrics import gauge_lines
+from src.app.db.pool import pool_name
+
+# WAL positions as byte offsets. A server that is not in recovery (the
+# primary itself listed as a replica) has by definition replayed all of it.
+PRIMARY_POSITION_QUERY = text("SELECT pg_current_wal_lsn() - '0/0'::pg_lsn")
+REPLAYED_POSITION_QUERY = text("""
+    SELECT CASE WHEN pg_is_in_recovery() THEN pg_last_wal_replay_lsn() ELSE pg_current_wal_lsn() END
+        - '0/0'::pg_lsn
+""")
+
+
+def primary_pin_key(user_id) -> str:
+    return f"primary:{user_id}"
+
+
+class Replica:
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self.name = pool_name(engine)
+        self.lag: Optional[float] = None
+        self.healthy = False
+        self.checked = False
+
+
+class ReplicaSet:
+    def __init__(self, primary: AsyncEngine, engines: Sequence[AsyncEngine],
+                 max_lag: float = REPLICA_MAX_LAG_SECONDS, interval: float = REPLICA_CHECK_INTERVAL_SECONDS):
+        self.primary = primary
+        self.replicas = [Replica(engine) for engine in engines]
+        self.max_lag = max_lag
+        self.interval = interval
+        # (loop time, primary WAL position) per check, oldest first.
+        self.positions = deque()
+        self._next = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def engines(self) -> List[AsyncEngine]:
+        return [replica.engine for replica in self.replicas]
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def choose(self) -> Optional[AsyncEngine]:
+        """The next healthy replica's engine, round-robin, or None if there is none."""
+        for _ in range(len(self.replicas)):
+            replica = self.replicas[self._next % len(self.replicas)]
+            self._next += 1
+            if replica.healthy:
+                return replica.engine
+        return None
+
+    async def primary_position(self) -> int:
+        async with self.primary.connect() as connection:
+            return int(await connection.scalar(PRIMARY_POSITION_QUERY))
+
+    async def replayed_position(self, replica: Replica) -> Optional[int]:
+        async with replica.engine.connect() as connection:
+            position = await connection.scalar(REPLAYED_POSITION_QUERY)
+        return int(position) if position is not None else None
+
+    def lag_behind(self, replayed: Optional[int], now: float) -> Optional[float]:
+        """Seconds since the primary was last seen at or behind ``replayed``, or None if it never was."""
+        if replayed is not None:
+            for taken, position in reversed(self.positions):
+                if position <= replayed:
+                    return now - taken
+        return None
+
+    async def measure(self, replica: Replica) -> Optional[float]:
+        replayed = await self.replayed_position(replica)
+        return self.lag_behind(replayed, asyncio.get_running_loop().time())
+
+    async def sample_primary(self) -> None:
+        """Record the primary's current WAL position and drop samples no lag decision needs."""
+        now = asyncio.get_running_loop().time()
+        try:
+            position = await asyncio.wait_for(self.primary_position(), max(self.interval, 1))
+        except Exception as exc:
+            # Replicas are then measured against older samples and age out.
+            logger.warning(f"Primary WAL position unavailable for replica lag checks: {str(exc) or type(exc).__name__}")
+        else:
+            self.positions.append((now, position))
+        # A replica behind every kept sample has an unknown lag, so keep one sample past the limit.
+        while len(self.positions) > 1 and self.positions[1][0] < now - self.max_lag:
+            self.positions.popleft()
+
+    async def check(self) -> None:
+        """Re-measure every replica and update which ones are in rotation."""
+        await self.sample_primary()
+        for replica in self.replicas:
+            try:
+                replica.lag = await asyncio.wait_for(self.measure(replica), max(self.interval, 1))
+                healthy = replica.lag is not None and replica.lag <= self.max_lag
+                reason = f"lag {replica.lag}s" if replica.lag is not None else "behind every primary WAL sample"
+            except Exception as exc:
+                replica.lag, healthy, reason = None, False, str(exc) or type(exc).__name__
+            if healthy != replica.healthy or not replica.checked:
+                log = logger.info if healthy else logger.warning
+                log(f"Replica {replica.name} {'in' if healthy else 'out of'} read rotation: {reason}")
+            replica.healthy, replica.checked = healthy, True
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="replica-lag-check")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await self.check()
+            await asyncio.sleep(self.interval)
+
+    def metric_lines(self):
+        return gauge_lines("db_replica_lag_seconds", "Replication lag at the last check (-1: unknown).",
+                           [({"replica": replica.name}, -1 if replica.lag is None else replica.lag)
+                            for replica in self.replicas]) + \
+            gauge_lines("db_replica_healthy", "Whether the replica is in the read rotation.",
+                        [({"replica": replica.name}, int(replica.healthy)) for replica in self.replicas])
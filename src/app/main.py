@@ -1,19 +1,68 @@
-from fastapi import FastAPI, HTTPException
-from src.app.api.v1 import auth_router, messages_router
-from slowapi.middleware import SlowAPIMiddleware
-from src.app.core.exception_handlers import rate_limit_handler, http_exception_handler, generic_exception_handler
-from slowapi.errors import RateLimitExceeded
-from src.app.api.v1.messages_router import limiter
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+from src.app.api.v1 import auth_router, diagnostics_router, messages_router
+from src.app.core.exception_handlers import rate_limit_handler, http_exception_handler, generic_exception_handler, not_implemented_handler, overloaded_handler
+from src.app.api.dependencies import engine, message_hub, replicas, write_pipeline
+from src.app.api.v1.diagnostics_router import require_diagnostics_token
+from src.app.core import lifecycle
+from src.app.core.compression import CompressionMiddleware
+from src.app.core.config import COMPRESSION_ENABLED, DB_POOL_WARM_CONNECTIONS, METRICS_SNAPSHOT_SECONDS
+from src.app.core.instrumentation import MetricsMiddleware
+from src.app.core.logging import RequestContextMiddleware, logger
+from src.app.core.rate_limit import RateLimitExceeded
+from src.app.core.metrics import registry
+from src.app.db.pool import warm_pool
+from src.app.services.password_hasher import HasherOverloaded
+from src.app.services.search import SearchUnavailable
+from src.app.services.write_pipeline import WritePipelineOverloaded
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if write_pipeline is not None:
+        write_pipeline.start()
+    if message_hub is not None:
+        message_hub.start()
+    if replicas is not None:
+        replicas.start()
+    snapshots = None
+    if registry.shared_directory is not None:
+        # Let whichever worker is scraped report this one's metrics too.
+        snapshots = asyncio.create_task(registry.publish(METRICS_SNAPSHOT_SECONDS), name="metrics-snapshots")
+    # Pay for connecting and building the schema before the first request, not during it.
+    warmed = await warm_pool(engine, DB_POOL_WARM_CONNECTIONS)
+    app.openapi()
+    if message_hub is not None:
+        lifecycle.on_drain(message_hub.close_subscriptions)
+    logger.info(f"Worker ready in {lifecycle.mark_ready():.3f}s ({warmed} database connections warmed)")
+    yield
+    if replicas is not None:
+        await replicas.stop()
+    if message_hub is not None:
+        await message_hub.stop()
+    if write_pipeline is not None:
+        # Flush every queued message before the worker exits.
+        await write_pipeline.stop()
+    if snapshots is not None:
+        snapshots.cancel()
+        await asyncio.gather(snapshots, return_exceptions=True)
+        registry.write_snapshot()
 
 
 app = FastAPI(
     title="Python Messages Backend",
     description="Backend service for user authentication and message handling.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
-# Add SlowAPI middleware
-app.add_middleware(SlowAPIMiddleware)
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+app.add_middleware(RequestContextMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 
 app.openapi_schema = None
@@ -36,17 +85,26 @@ def custom_openapi():
     return app.openapi_schema
 
 app.openapi = custom_openapi
-app.state.limiter = limiter
 
 # Register exception handlers
 app.add_exception_handler(HTTPException, http_exception_handler)
 app.add_exception_handler(Exception, generic_exception_handler)
 app.add_exception_handler(RateLimitExceeded, rate_limit_handler)
+app.add_exception_handler(HasherOverloaded, overloaded_handler)
+app.add_exception_handler(WritePipelineOverloaded, overloaded_handler)
+app.add_exception_handler(SearchUnavailable, not_implemented_handler)
 
 
 app.include_router(messages_router.router, prefix="/messages", tags=["messages"])
 app.include_router(auth_router.router, prefix="/auth", tags=["auth"])
+app.include_router(diagnostics_router.router, prefix="/internal", tags=["internal"])
+
+
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(require_diagnostics_token)])
+async def metrics():
+    return PlainTextResponse(registry.render_all(), media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run("src.main:app", host="0.0.0.0", port=8080, reload=True)
\ No newline at end of file
+    from src.app.serve import main
+
+    main()
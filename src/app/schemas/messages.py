@@ -1,7 +1,7 @@
 from pydantic import BaseModel, Field
 from uuid import UUID
 from datetime import datetime
-from typing import Optional
+from typing import Dict, List, Literal, Optional
 
 from sqlalchemy import Integer
 
@@ -20,10 +20,40 @@ class MessageCreate(MessageBase):
 
 class MessageUpdate(BaseModel):
     content: Optional[str] = None
-    rating: Optional[bool] = None
+    rating: Optional[int] = None
     role: Optional[str] = None
 class MessageRead(MessageBase):
     message_id: UUID = Field(..., alias="message_id")
-    
 
 
+class MessageSearchResult(MessageRead):
+    rank: float
+
+
+class MessageBatchResult(BaseModel):
+    message_ids: List[UUID]
+
+
+class ChatSummaryRead(BaseModel):
+    chat_id: UUID
+    message_count: int
+    last_message_preview: str
+    last_sent_at: datetime
+    average_rating: Optional[float] = None
+
+
+class RatingStatsBucket(BaseModel):
+    chat_id: UUID
+    role: str
+    bucket_start: datetime
+    message_count: int
+    average_rating: float
+    # Messages per rating value.
+    ratings: Dict[int, int]
+
+
+class RatingStats(BaseModel):
+    bucket: Literal["hour", "day"]
+    start: datetime
+    end: datetime
+    buckets: List[RatingStatsBucket]
@@ -11,6 +11,13 @@ class UserBase(BaseModel):
 class UserCreate(UserBase):
     pass
 
+class UserRead(BaseModel):
+    id: UUID
+    username: str
+    email: EmailStr
+    class Config:
+        from_attributes = True
+
 class UserUpdate(BaseModel):
     username: Optional[str] = None
     email: Optional[EmailStr] = None
@@ -0,0 +1,250 @@
+"""Production server: uvicorn workers on uvloop and httptools under a small prefork supervisor.
+
+    python -m src.app.serve                  # SERVER_WORKERS workers (default: one per CPU)
+    python -m src.app.serve --workers 1      # a single process, no supervisor
+    python -m src.app.serve --preload        # import the app once, then fork the workers
+
+The supervisor binds the listening socket, forks the workers and restarts
+any that die. On SIGTERM or SIGINT it passes the signal on and waits:
+each worker stops accepting, ends its message streams, lets in-flight
+requests finish (up to ``SERVER_GRACEFUL_SHUTDOWN_SECONDS``) and runs the
+app's shutdown, which flushes the write pipeline.
+
+Metrics are shared: each worker keeps a snapshot in a directory the
+supervisor creates, and ``/metrics`` on any worker serves all of them
+merged (see src/app/core/metrics.py). The supervisor refuses to start
+several workers with read replicas and a ``memory://`` cache, because the
+read-your-writes pin would then be visible only to the worker that wrote.
+
+With ``--preload`` the imports and module-level setup happen once, in the
+supervisor, and are shared with the workers copy-on-write. Nothing there
+connects anywhere: engines are lazy, and right after fork every worker
+drops the pools it inherited and restarts the log listener, so each
+connection is opened by the process that uses it.
+"""
+import argparse
+import math
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+from typing import Dict
+
+import uvicorn
+
+from src.app.core import lifecycle
+from src.app.core.config import (
+    CACHE_URL,
+    DATABASE_REPLICA_URLS,
+    SERVER_BACKLOG,
+    SERVER_GRACEFUL_SHUTDOWN_SECONDS,
+    SERVER_HOST,
+    SERVER_HTTP,
+    SERVER_KEEPALIVE_SECONDS,
+    SERVER_LOOP,
+    SERVER_PORT,
+    SERVER_PRELOAD,
+    SERVER_WORKERS,
+)
+from src.app.core.logging import logger, stop_listener
+from src.app.core.metrics import registry, retire_snapshot
+
+APP = "src.app.main:app"
+# A worker that dies sooner than this after being forked is crash-looping;
+# wait a little before replacing it instead of forking as fast as it dies.
+MIN_WORKER_LIFETIME = 5.0
+RESPAWN_DELAY = 1.0
+CGROUP_CPU_MAX = "/sys/fs/cgroup/cpu.max"
+
+
+def available_cpus() -> int:
+    """CPUs this process may use: its affinity mask, capped by a cgroup v2 CPU quota."""
+    try:
+        count = len(os.sched_getaffinity(0))
+    except AttributeError:
+        count = os.cpu_count() or 1
+    try:
+        with open(CGROUP_CPU_MAX) as cpu_max:
+            quota, period = cpu_max.read().split()
+        if quota != "max":
+            count = min(count, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return max(count, 1)
+
+
+def worker_count(configured: int = SERVER_WORKERS) -> int:
+    return configured if configured > 0 else available_cpus()
+
+
+def build_config(args) -> uvicorn.Config:
+    return uvicorn.Config(
+        APP,
+        host=args.host,
+        port=args.port,
+        loop=args.loop,
+        http=args.http,
+        backlog=args.backlog,
+        timeout_keep_alive=args.keepalive,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        lifespan="on",
+        # Logging is configured by src.app.core.logging, access lines included.
+        log_config=None,
+        access_log=False,
+    )
+
+
+class Server(uvicorn.Server):
+    """uvicorn.Server that ends long-lived responses before it waits for connections to close."""
+
+    async def shutdown(self, sockets=None):
+        lifecycle.drain()
+        await super().shutdown(sockets=sockets)
+
+
+def after_fork(metrics_directory: str) -> None:
+    lifecycle.reset_start_time()
+    registry.share(metrics_directory, str(os.getpid()))
+    dependencies = sys.modules.get("src.app.api.dependencies")
+    if dependencies is None:
+        # Not preloaded: the worker imports the app, and creates its engines, itself.
+        return
+    engines = [dependencies.engine, *(dependencies.replicas.engines if dependencies.replicas is not None else ())]
+    for engine in engines:
+        # A fresh pool for this process; close=False leaves the parent's connections alone.
+        engine.sync_engine.dispose(close=False)
+
+
+def _exit_worker(sig, frame):
+    raise SystemExit(0)
+
+
+class Supervisor:
+    def __init__(self, config: uvicorn.Config, sock: socket.socket, workers: int, metrics_directory: str):
+        self.config = config
+        self.sock = sock
+        self.target = workers
+        self.metrics_directory = metrics_directory
+        self.workers: Dict[int, float] = {}
+        self.stopping = False
+
+    def spawn(self) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                # uvicorn installs its own handlers while serving and re-raises
+                # the signal after draining; both then end up here as SystemExit.
+                for sig in (signal.SIGTERM, signal.SIGINT):
+                    signal.signal(sig, _exit_worker)
+                signal.signal(signal.SIGALRM, signal.SIG_DFL)
+                after_fork(self.metrics_directory)
+                Server(self.config).run(sockets=[self.sock])
+            except SystemExit as exc:
+                code = exc.code if isinstance(exc.code, int) else 0
+            except BaseException:
+                logger.exception(f"Worker {os.getpid()} failed")
+                code = 1
+            finally:
+                # Never return into the supervisor's frames; flush logs ourselves since atexit won't run.
+                stop_listener()
+                os._exit(code)
+        self.workers[pid] = time.monotonic()
+
+    def handle_signal(self, sig, frame) -> None:
+        if not self.stopping:
+            self.stopping = True
+            logger.info(f"Supervisor got {signal.Signals(sig).name}, draining {len(self.workers)} workers")
+            # Workers get their graceful timeout plus time for the app's own shutdown.
+            signal.alarm(self.config.timeout_graceful_shutdown + 15)
+        # A second SIGINT makes uvicorn skip the graceful wait.
+        self.signal_workers(sig)
+
+    def kill_workers(self, sig, frame) -> None:
+        logger.error(f"Workers {sorted(self.workers)} did not exit in time, killing them")
+        self.signal_workers(signal.SIGKILL)
+
+    def signal_workers(self, sig) -> None:
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> int:
+        signal.signal(signal.SIGTERM, self.handle_signal)
+        signal.signal(signal.SIGINT, self.handle_signal)
+        signal.signal(signal.SIGALRM, self.kill_workers)
+        for _ in range(self.target):
+            self.spawn()
+        logger.info(f"Supervisor {os.getpid()} started {self.target} workers on {self.config.host}:{self.config.port}")
+        failed = False
+        while self.workers:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            started = self.workers.pop(pid, None)
+            if started is None:
+                continue
+            retire_snapshot(self.metrics_directory, str(pid))
+            if self.stopping:
+                failed |= not os.WIFEXITED(status) or os.WEXITSTATUS(status) != 0
+                continue
+            logger.warning(f"Worker {pid} exited unexpectedly (status {status}), starting a new one")
+            if time.monotonic() - started < MIN_WORKER_LIFETIME:
+                time.sleep(RESPAWN_DELAY)
+            if not self.stopping:
+                self.spawn()
+        signal.alarm(0)
+        return 1 if failed else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the API with multiple uvicorn workers.")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS, help="0: one per available CPU")
+    parser.add_argument("--loop", default=SERVER_LOOP, choices=("uvloop", "asyncio"))
+    parser.add_argument("--http", default=SERVER_HTTP, choices=("httptools", "h11"))
+    parser.add_argument("--keepalive", type=int, default=SERVER_KEEPALIVE_SECONDS,
+                        help="seconds an idle keep-alive connection is held open")
+    parser.add_argument("--backlog", type=int, default=SERVER_BACKLOG, help="listen queue length")
+    parser.add_argument("--graceful-timeout", type=int, default=SERVER_GRACEFUL_SHUTDOWN_SECONDS,
+                        help="seconds in-flight requests get to finish on shutdown")
+    parser.add_argument("--preload", action=argparse.BooleanOptionalAction, default=SERVER_PRELOAD,
+                        help="import the app in the supervisor before forking workers")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    config = build_config(args)
+    workers = worker_count(args.workers)
+    if workers == 1:
+        Server(config).run()
+        return 0
+    if DATABASE_REPLICA_URLS and CACHE_URL.startswith("memory://"):
+        logger.error(f"Refusing to start {workers} workers with read replicas and CACHE_URL={CACHE_URL}: "
+                     "a writer's read-your-writes pin would only reach its own worker. "
+                     "Use a redis:// CACHE_URL, or --workers 1.")
+        return 2
+    if args.preload:
+        started = time.perf_counter()
+        config.load()
+        logger.info(f"Preloaded {APP} in {time.perf_counter() - started:.3f}s")
+    metrics_directory = tempfile.mkdtemp(prefix="messages-backend-metrics-",
+                                         dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+    sock = config.bind_socket()
+    try:
+        return Supervisor(config, sock, workers, metrics_directory).run()
+    finally:
+        sock.close()
+        shutil.rmtree(metrics_directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
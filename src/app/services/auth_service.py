@@ -1,15 +1,15 @@
 import os
 from dotenv import load_dotenv
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.app.db.user import User
-from passlib.context import CryptContext
-from jose import jwt
+from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from src.app.core.logging import logger
 from src.app.schemas.user import LoginSchema, UserCreate
+from src.app.services.password_hasher import password_hasher
 load_dotenv()
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 SECRET_KEY = os.getenv("SECRET_KEY")  # Change to env var in production
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
@@ -17,31 +17,39 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60
 class AuthService:
 
     @staticmethod
-    def register(user:UserCreate , db: Session):
-        print("test")
-        existing = db.query(User).filter(
+    async def register(user:UserCreate , db: AsyncSession):
+        result = await db.execute(select(User).filter(
             User.email == user.email
-        ).first()
+        ))
+        existing = result.scalars().first()
         if existing:
             return None
-        hashed_password = pwd_context.hash(user.password)
+        hashed_password = await password_hasher.hash(user.password)
         db_user = User(
             username=user.username,
             email=user.email,
             hashed_password=hashed_password
         )
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
         return db_user
 
     @staticmethod
-    def login(user: LoginSchema, db: Session):
-        db_user = db.query(User).filter(
+    async def login(user: LoginSchema, db: AsyncSession):
+        result = await db.execute(select(User).filter(
             User.email == user.email
-        ).first()
-        if not db_user or not pwd_context.verify(user.password, db_user.hashed_password):
+        ))
+        db_user = result.scalars().first()
+        if not db_user:
             return None
+        valid, new_hash = await password_hasher.verify_and_update(user.password, db_user.hashed_password)
+        if not valid:
+            return None
+        if new_hash:
+            # Stored hash uses a different bcrypt cost than BCRYPT_ROUNDS.
+            db_user.hashed_password = new_hash
+            await db.commit()
         access_token = AuthService.create_access_token({"sub": str(db_user.id)})
         return access_token
 
@@ -53,13 +61,17 @@ class AuthService:
         encoded_jwt = jwt.encode(to_encode, str(SECRET_KEY), algorithm=ALGORITHM)
         return encoded_jwt
 
-    
+
 
     @staticmethod
-    def verify_token(token: str):
+    def decode_token(token: str):
+        """Return the verified claims of ``token``, or None if it is invalid or expired."""
         try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-            user_id = payload.get("sub")
-            return user_id
-        except jwt.PyJWTError:
-            return None
\ No newline at end of file
+            return jwt.decode(token, str(SECRET_KEY), algorithms=[ALGORITHM])
+        except JWTError:
+            return None
+
+    @staticmethod
+    def verify_token(token: str):
+        payload = AuthService.decode_token(token)
+        return payload.get("sub") if payload else None
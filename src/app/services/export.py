@@ -0,0 +1,51 @@
+import csv
+import io
+import json
+from typing import Iterable, Sequence
+
+import orjson
+
+# Same field order as MessageRead, so exports line up with GET /messages/.
+EXPORT_COLUMNS = ("chat_id", "content", "rating", "sent_at", "role", "message_id")
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _plain(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if value is None or isinstance(value, (int, float, str)):
+        return value
+    return str(value)
+
+
+def csv_header() -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(EXPORT_COLUMNS)
+    return buffer.getvalue()
+
+
+def encode_rows(export_format: str, rows: Iterable[Sequence]) -> str:
+    """Encode a batch of rows (in EXPORT_COLUMNS order) as one output chunk."""
+    if export_format == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows([_plain(value) for value in row] for row in rows)
+        return buffer.getvalue()
+    return "".join(
+        json.dumps(dict(zip(EXPORT_COLUMNS, map(_plain, row))), ensure_ascii=False) + "\n"
+        for row in rows
+    )
+
+
+def encode_json(rows: Iterable[Sequence]) -> bytes:
+    """Encode rows (in EXPORT_COLUMNS order) as the JSON array GET /messages/ returns.
+
+    Byte-for-byte what FastAPI renders for ``List[MessageRead]`` (compact
+    separators, unescaped UTF-8, ISO datetimes, UUIDs as strings), without
+    building ORM objects or models. asyncpg returns its own UUID subclass,
+    which orjson does not recognise; ``default=str`` renders it the same way.
+    """
+    return orjson.dumps([dict(zip(EXPORT_COLUMNS, row)) for row in rows], default=str)
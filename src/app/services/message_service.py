@@ -1,43 +1,435 @@
 import datetime
-from functools import lru_cache
+import hashlib
+import uuid
+from collections import Counter
+from typing import List, NamedTuple, Optional
+from sqlalchemy import DateTime, case, func, insert, literal, select, tuple_, union_all, update
+from sqlalchemy.dialects import postgresql, sqlite
+from src.app.core.cache import cache as default_cache
+from src.app.core.config import (
+    DATABASE_REPLICA_URLS,
+    EXPORT_BATCH_SIZE,
+    MESSAGE_BATCH_COPY_THRESHOLD,
+    MESSAGES_PAGE_SIZE,
+    READ_YOUR_WRITES_SECONDS,
+)
+from src.app.db.chat_summary import ChatSummary
 from src.app.db.message import Message
-from src.app.schemas.messages import MessageCreate
+from src.app.db.rating_rollup import RatingRollup
+from src.app.db.replicas import primary_pin_key
+from src.app.schemas.messages import (
+    ChatSummaryRead,
+    MessageCreate,
+    MessageRead,
+    MessageSearchResult,
+    MessageUpdate,
+)
+from src.app.services.export import EXPORT_COLUMNS, encode_json
+from src.app.services.pagination import encode_cursor
+from src.app.services.rating_stats import (
+    BUCKETS,
+    ROLLUP_COLUMNS,
+    ROLLUP_KEY,
+    floor_to,
+    fold_buckets,
+    rollup_keys,
+    stats_query,
+    truncate,
+)
+from src.app.services.search import SearchUnavailable, search_condition, search_rank
+
+MESSAGE_COLUMNS = ("message_id", "chat_id", "content", "rating", "sent_at", "role", "user_id")
+EDITABLE_COLUMNS = ("content", "rating", "role")
+SUMMARY_COLUMNS = ("user_id", "chat_id", "message_count", "rating_sum", "last_message_id", "last_message_preview",
+                   "last_sent_at", "version")
+# Postgres caps a statement at 32767 bind parameters.
+MAX_BIND_PARAMETERS = 32767
+INSERT_CHUNK_SIZE = MAX_BIND_PARAMETERS // len(MESSAGE_COLUMNS)
+ROLLUP_CHUNK_SIZE = MAX_BIND_PARAMETERS // len(ROLLUP_COLUMNS)
+# Largest batch whose INSERT and summary and rollup upserts still fit one statement.
+WRITE_TOGETHER_MAX_ROWS = MAX_BIND_PARAMETERS // (
+    len(MESSAGE_COLUMNS) + len(SUMMARY_COLUMNS) + len(BUCKETS) * len(ROLLUP_COLUMNS))
+PREVIEW_LENGTH = 120
+
+_UPSERT_DIALECTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+class MessagePage(NamedTuple):
+    """An encoded page of GET /messages/ plus the cursor of the next one."""
+    body: bytes
+    count: int
+    next_cursor: Optional[str]
 
 
 class MessageService:
-    def __init__(self, db_session):
+    def __init__(self, db_session, cache=None):
         self.db_session = db_session
+        self.cache = cache if cache is not None else default_cache
+
+    async def send_message(self, message_data: MessageCreate, user_id):
+        """Insert one message and return its id; one statement on Postgres."""
+        row = self.message_row(message_data, user_id)
+        await self.insert_message_rows([row])
+        return row["message_id"]
+
+    async def send_messages(self, messages: List[MessageCreate], user_id):
+        """Insert a batch of messages in one transaction and return their ids.
+
+        Small batches go out as multi-row INSERTs; from
+        MESSAGE_BATCH_COPY_THRESHOLD rows up, asyncpg's COPY protocol is used.
+        """
+        rows = [self.message_row(message_data, user_id) for message_data in messages]
+        await self.insert_message_rows(rows)
+        return [row["message_id"] for row in rows]
+
+    async def insert_message_rows(self, rows):
+        """Bulk insert prepared rows (possibly for many users) and commit once.
+
+        Unless COPY is used, the INSERTs and the chat summary and rating
+        rollup upserts go out together (see _execute_together) while they
+        fit one statement's bind parameter limit.
+        """
+        if not rows:
+            return
+        connection = await self.db_session.connection()
+        statements = await self._insert_statements(connection, rows)
+        statements.append(self._chat_summaries_upsert(connection.dialect.name, rows))
+        statements.extend(self._rating_rollups_upserts(connection.dialect.name, rows))
+        await self._execute_together(statements, combine=len(rows) <= WRITE_TOGETHER_MAX_ROWS)
+        await self.db_session.commit()
+        for user_id in {row["user_id"] for row in rows}:
+            await self.after_write(user_id)
+
+    async def get_messages_page(self, user_id, limit=MESSAGES_PAGE_SIZE, after=None, chat_id=None,
+                                version=None) -> MessagePage:
+        """Return one page of a user's messages, newest first, encoded as the response body.
+
+        ``after`` is a decoded ``(sent_at, message_id)`` keyset cursor; only
+        rows strictly older than it are returned. Selects bare column tuples
+        and encodes them in one pass, skipping ORM hydration and model
+        validation. Pages are cached as encoded JSON and served without
+        decoding them at all.
 
-    def send_message(self, message_data:MessageCreate, user_id):
+        Cached pages are keyed on ``version``, the history's messages_etag
+        (looked up when not given). Every write changes it in the database,
+        so no worker, whatever its cache backend, can pair a newer tag with
+        an older page.
+        """
+        if version is None:
+            version = await self.messages_etag(user_id, chat_id)
+        cache_key = self._messages_cache_key(user_id, version, limit, after, chat_id)
+        cached = await self.cache.get(cache_key)
+        if cached is not None:
+            count, next_cursor, body = cached.split("\n", 2)
+            return MessagePage(body.encode(), int(count), next_cursor or None)
 
-        new_message = Message(
-            user_id=user_id,
-            content=message_data.content,
-            sent_at=message_data.sent_at or datetime.datetime.now(),
-            chat_id=message_data.chat_id,
-            rating=message_data.rating,
-            role=message_data.role
-            
+        columns = [getattr(Message, column) for column in EXPORT_COLUMNS]
+        result = await self.db_session.execute(self._page_query(select(*columns), user_id, limit, after, chat_id))
+        rows = result.all()
+        next_cursor = None
+        if len(rows) == limit:
+            last = rows[-1]
+            next_cursor = encode_cursor(last.sent_at, last.message_id)
+        page = MessagePage(encode_json(rows), len(rows), next_cursor)
+        await self.cache.set(cache_key, f"{page.count}\n{next_cursor or ''}\n{page.body.decode()}")
+        return page
+
+    @staticmethod
+    def _page_query(query, user_id, limit, after, chat_id):
+        query = query.filter(Message.user_id == user_id)
+        if chat_id is not None:
+            query = query.filter(Message.chat_id == chat_id)
+        if after is not None:
+            # The plain bound is implied by the row comparison, but only it
+            # lets Postgres skip partitions newer than the cursor.
+            query = query.filter(Message.sent_at <= after[0],
+                                 tuple_(Message.sent_at, Message.message_id) < tuple_(*after))
+        return query.order_by(Message.sent_at.desc(), Message.message_id.desc()).limit(limit)
+
+    async def list_chats(self, user_id, limit=MESSAGES_PAGE_SIZE, after=None):
+        """Return one page of the user's chats, most recently active first.
+
+        Reads only ``chat_summaries`` (one index range scan); ``after`` is a
+        decoded ``(last_sent_at, chat_id)`` keyset cursor.
+        """
+        query = select(ChatSummary).filter(ChatSummary.user_id == user_id)
+        if after is not None:
+            query = query.filter(tuple_(ChatSummary.last_sent_at, ChatSummary.chat_id) < tuple_(*after))
+        query = query.order_by(ChatSummary.last_sent_at.desc(), ChatSummary.chat_id.desc()).limit(limit)
+        result = await self.db_session.execute(query)
+        return [
+            ChatSummaryRead(
+                chat_id=summary.chat_id,
+                message_count=summary.message_count,
+                last_message_preview=summary.last_message_preview,
+                last_sent_at=summary.last_sent_at,
+                average_rating=summary.rating_sum / summary.message_count if summary.message_count else None,
+            )
+            for summary in result.scalars().all()
+        ]
+
+    async def rating_stats(self, user_id, start, end, bucket="day", chat_id=None, role=None) -> List[dict]:
+        """Rating counts and averages per chat, role and hour or day bucket in ``[start, end)``.
+
+        Reads only ``rating_rollups`` of the bucket's granularity: one index
+        range scan whose size follows the number of buckets, not of
+        messages. ``start`` and ``end`` should fall on bucket boundaries.
+        Entries are plain dicts shaped like RatingStatsBucket.
+        """
+        result = await self.db_session.execute(stats_query(user_id, start, end, bucket, chat_id, role))
+        return fold_buckets(result.all())
+
+    async def search_messages(self, user_id, tsquery, limit=MESSAGES_PAGE_SIZE, offset=0, chat_id=None,
+                              role=None, start=None, end=None):
+        """Return one page of the user's messages matching ``tsquery``, best match first.
+
+        Requires Postgres: matching uses the GIN-indexed ``search_vector``
+        column, so only matching rows are read and ranked.
+        """
+        connection = await self.db_session.connection()
+        if connection.dialect.name != "postgresql":
+            raise SearchUnavailable("Full-text search requires PostgreSQL")
+        result = await self.db_session.execute(
+            self.search_query(user_id, tsquery, limit, offset, chat_id, role, start, end)
         )
-        self.db_session.add(new_message)
-        self.db_session.commit()
-        self.db_session.refresh(new_message)
-
-    @lru_cache(maxsize=256)
-    def get_messages(self, user_id):
-        return self.db_session.query(Message).filter(Message.user_id == user_id).all()
-    
-    def update_message(self, message_id, message_data: MessageCreate, user_id):
-        message = self.db_session.query(Message).filter(
-            Message.message_id == message_id,
-            Message.user_id == user_id
-        ).first()
-        if not message:
+        return [
+            MessageSearchResult.model_validate({**MessageRead.model_validate(message).model_dump(), "rank": rank})
+            for message, rank in result.all()
+        ]
+
+    @staticmethod
+    def search_query(user_id, tsquery, limit=MESSAGES_PAGE_SIZE, offset=0, chat_id=None, role=None,
+                     start=None, end=None):
+        rank = search_rank(tsquery).label("rank")
+        query = select(Message, rank).filter(Message.user_id == user_id, search_condition(tsquery))
+        if chat_id is not None:
+            query = query.filter(Message.chat_id == chat_id)
+        if role is not None:
+            query = query.filter(Message.role == role)
+        if start is not None:
+            query = query.filter(Message.sent_at >= start)
+        if end is not None:
+            query = query.filter(Message.sent_at < end)
+        return query.order_by(rank.desc(), Message.sent_at.desc(), Message.message_id.desc()).limit(limit).offset(offset)
+
+    async def iter_message_batches(self, user_id, start=None, end=None, chat_id=None,
+                                   batch_size=EXPORT_BATCH_SIZE):
+        """Yield a user's history oldest first, in batches of plain row tuples.
+
+        Rows come off a server-side cursor, so memory use is bounded by
+        ``batch_size`` no matter how long the history is.
+        """
+        query = select(*(getattr(Message, column) for column in EXPORT_COLUMNS)).filter(Message.user_id == user_id)
+        if chat_id is not None:
+            query = query.filter(Message.chat_id == chat_id)
+        if start is not None:
+            query = query.filter(Message.sent_at >= start)
+        if end is not None:
+            query = query.filter(Message.sent_at < end)
+        query = query.order_by(Message.sent_at, Message.message_id).execution_options(yield_per=batch_size)
+        result = await self.db_session.stream(query)
+        async for batch in result.partitions():
+            yield batch
+
+    async def update_message(self, message_id, message_data: MessageUpdate, user_id):
+        """Apply the fields set in ``message_data`` and return the edited row, or None.
+
+        An edit also makes the message its chat's newest. The summary and
+        rollup updates read the old row through subqueries, so they run
+        before the message UPDATE ... RETURNING; on Postgres all three go
+        out as one statement, whose subqueries see the pre-edit row anyway.
+        """
+        values = message_data.model_dump(include=set(EDITABLE_COLUMNS), exclude_unset=True, exclude_none=True)
+        values["sent_at"] = datetime.datetime.now()
+        match = (Message.message_id == message_id, Message.user_id == user_id)
+        connection = await self.db_session.connection()
+
+        def current(column):
+            return select(column).filter(*match).scalar_subquery()
+
+        is_newer = ChatSummary.last_sent_at <= values["sent_at"]
+        preview = values["content"][:PREVIEW_LENGTH] if "content" in values else \
+            func.substr(current(Message.content), 1, PREVIEW_LENGTH)
+        summary_values = {
+            "last_message_id": case((is_newer, literal(message_id, Message.message_id.type)),
+                                    else_=ChatSummary.last_message_id),
+            "last_message_preview": case((is_newer, preview), else_=ChatSummary.last_message_preview),
+            "last_sent_at": case((is_newer, values["sent_at"]), else_=ChatSummary.last_sent_at),
+            "version": ChatSummary.version + 1,
+        }
+        if "rating" in values:
+            summary_values["rating_sum"] = ChatSummary.rating_sum + values["rating"] - current(Message.rating)
+        summary = update(ChatSummary).filter(
+            ChatSummary.user_id == user_id, ChatSummary.chat_id == current(Message.chat_id)
+        ).values(summary_values)
+        rollups = self._rating_rollup_move(connection.dialect.name, match, values)
+        edit = update(Message).filter(*match).values(values).returning(
+            *(getattr(Message, column) for column in EXPORT_COLUMNS))
+
+        result = await self._execute_together([summary, rollups, edit])
+        message = result.first()
+        await self.db_session.commit()
+        if message is None:
             return None
-        message.content = message_data.content
-        message.rating = message_data.rating
-        message.role = message_data.role
-        message.sent_at = datetime.datetime.now()
-        self.db_session.commit()
-        self.db_session.refresh(message)
-        return message
\ No newline at end of file
+        await self.after_write(user_id)
+        return message
+
+    @staticmethod
+    def message_row(message_data: MessageCreate, user_id):
+        return {
+            "message_id": uuid.uuid4(),
+            "chat_id": message_data.chat_id,
+            "content": message_data.content,
+            "rating": message_data.rating,
+            "sent_at": message_data.sent_at or datetime.datetime.now(),
+            "role": message_data.role,
+            "user_id": user_id,
+        }
+
+    @staticmethod
+    async def _insert_statements(connection, rows):
+        """COPY large asyncpg batches right away; otherwise return the INSERTs to run."""
+        if len(rows) >= MESSAGE_BATCH_COPY_THRESHOLD and connection.dialect.driver == "asyncpg":
+            raw_connection = await connection.get_raw_connection()
+            await raw_connection.driver_connection.copy_records_to_table(
+                Message.__tablename__,
+                records=[tuple(row[column] for column in MESSAGE_COLUMNS) for row in rows],
+                columns=MESSAGE_COLUMNS,
+            )
+            return []
+        return [insert(Message.__table__).values(rows[start:start + INSERT_CHUNK_SIZE])
+                for start in range(0, len(rows), INSERT_CHUNK_SIZE)]
+
+    @staticmethod
+    def _chat_summaries_upsert(dialect_name, rows):
+        """The upsert folding freshly inserted message rows into their chats' summaries."""
+        summaries = {}
+        for row in rows:
+            key = (row["user_id"], row["chat_id"])
+            summary = summaries.get(key)
+            if summary is None:
+                summaries[key] = summary = {
+                    "user_id": row["user_id"], "chat_id": row["chat_id"], "message_count": 0, "rating_sum": 0,
+                    "last_message_id": None, "last_message_preview": None, "last_sent_at": None,
+                    "version": 1,
+                }
+            summary["message_count"] += 1
+            summary["rating_sum"] += row["rating"]
+            if summary["last_sent_at"] is None or (row["sent_at"], row["message_id"]) > (summary["last_sent_at"], summary["last_message_id"]):
+                summary["last_message_id"] = row["message_id"]
+                summary["last_message_preview"] = row["content"][:PREVIEW_LENGTH]
+                summary["last_sent_at"] = row["sent_at"]
+
+        statement = _UPSERT_DIALECTS[dialect_name](ChatSummary).values(list(summaries.values()))
+        excluded = statement.excluded
+        is_newer = excluded.last_sent_at >= ChatSummary.last_sent_at
+        return statement.on_conflict_do_update(
+            index_elements=[ChatSummary.user_id, ChatSummary.chat_id],
+            set_={
+                "message_count": ChatSummary.message_count + excluded.message_count,
+                "rating_sum": ChatSummary.rating_sum + excluded.rating_sum,
+                "last_message_id": case((is_newer, excluded.last_message_id), else_=ChatSummary.last_message_id),
+                "last_message_preview": case((is_newer, excluded.last_message_preview),
+                                             else_=ChatSummary.last_message_preview),
+                "last_sent_at": case((is_newer, excluded.last_sent_at), else_=ChatSummary.last_sent_at),
+                "version": ChatSummary.version + 1,
+            },
+        )
+
+    @staticmethod
+    def _rating_rollups_upserts(dialect_name, rows):
+        """Upserts adding freshly inserted message rows to their rating rollups."""
+        counts = Counter(key for row in rows for key in rollup_keys(row))
+        deltas = [dict(zip(ROLLUP_KEY, key), message_count=count) for key, count in counts.items()]
+        return [MessageService._rating_rollups_upsert(dialect_name, deltas[start:start + ROLLUP_CHUNK_SIZE])
+                for start in range(0, len(deltas), ROLLUP_CHUNK_SIZE)]
+
+    @staticmethod
+    def _rating_rollups_upsert(dialect_name, deltas):
+        """Add ``deltas`` (rows or a SELECT of ROLLUP_COLUMNS) to the rollups' message counts."""
+        statement = _UPSERT_DIALECTS[dialect_name](RatingRollup)
+        if isinstance(deltas, list):
+            statement = statement.values(deltas)
+        else:
+            statement = statement.from_select(ROLLUP_COLUMNS, deltas)
+        return statement.on_conflict_do_update(
+            index_elements=[getattr(RatingRollup, column) for column in ROLLUP_KEY],
+            set_={"message_count": RatingRollup.message_count + statement.excluded.message_count},
+        )
+
+    @staticmethod
+    def _rating_rollup_move(dialect_name, match, values):
+        """Move the edited message from its old rollup keys to its new ones.
+
+        The edit's new sent_at usually changes the keys' buckets. When it
+        keeps a key (same bucket, role and rating), the -1 and +1 for that
+        key are summed into one no-op row.
+        """
+        new_rating = literal(values["rating"]) if "rating" in values else Message.rating
+        new_role = literal(values["role"]) if "role" in values else Message.role
+
+        def delta(*columns):
+            return select(*(column.label(name) for column, name in zip(columns, ROLLUP_COLUMNS))).filter(*match)
+
+        moves = union_all(*(
+            part
+            for unit in BUCKETS
+            for part in (
+                delta(Message.user_id, literal(unit), truncate(dialect_name, unit, Message.sent_at), Message.chat_id,
+                      Message.role, Message.rating, literal(-1)),
+                delta(Message.user_id, literal(unit), literal(floor_to(values["sent_at"], unit), DateTime),
+                      Message.chat_id, new_role, new_rating, literal(1)),
+            )
+        )).subquery()
+        key = [moves.c[column] for column in ROLLUP_KEY]
+        deltas = select(*key, func.sum(moves.c.message_count)).group_by(*key)
+        return MessageService._rating_rollups_upsert(dialect_name, deltas)
+
+    async def _execute_together(self, statements, combine=True):
+        """Run ``statements`` in order and return the result of the last one.
+
+        On Postgres (with ``combine``) the earlier statements are attached
+        to the last as data-modifying CTEs, making the write a single
+        round-trip. All parts then see the same snapshot and none sees
+        another's changes, so callers must only combine statements for
+        which that gives the same outcome as running them in order.
+        """
+        connection = await self.db_session.connection()
+        if combine and len(statements) > 1 and connection.dialect.name == "postgresql":
+            *first, last = statements
+            for index, statement in enumerate(first):
+                last = last.add_cte(statement.cte(f"write_{index}"))
+            statements = [last]
+        result = None
+        for statement in statements:
+            result = await self.db_session.execute(statement)
+        return result
+
+    async def messages_etag(self, user_id, chat_id=None, *variant) -> str:
+        """Entity tag for the user's history (or one chat of it), from chat_summaries only.
+
+        Every write bumps its chat's ``version``; versions only grow, so the
+        per-user ``(chat count, version sum)`` changes whenever any chat
+        does. ``variant`` (page size, cursor, ...) distinguishes responses
+        built from the same data.
+        """
+        if chat_id is None:
+            query = select(func.count(), func.coalesce(func.sum(ChatSummary.version), 0))
+        else:
+            query = select(func.count(), func.coalesce(func.max(ChatSummary.version), 0)).filter(
+                ChatSummary.chat_id == chat_id)
+        result = await self.db_session.execute(query.filter(ChatSummary.user_id == user_id))
+        count, version = result.one()
+        raw = "|".join(str(part) for part in (user_id, chat_id, count, version, *variant))
+        return '"' + hashlib.sha256(raw.encode()).hexdigest()[:32] + '"'
+
+    async def after_write(self, user_id):
+        """With replicas, keep the user's reads on the primary for a while."""
+        if DATABASE_REPLICA_URLS and READ_YOUR_WRITES_SECONDS > 0:
+            await self.cache.set(primary_pin_key(user_id), "1", ttl=READ_YOUR_WRITES_SECONDS)
+
+    @staticmethod
+    def _messages_cache_key(user_id, version, limit, after, chat_id):
+        # Pages of an older version are never asked for again and age out through TTL/LRU eviction.
+        position = f"{after[0].isoformat()}|{after[1]}" if after is not None else "head"
+        return f"messages:json:{user_id}:{version}:{chat_id or 'all'}:{limit}:{position}"
@@ -0,0 +1,265 @@
+"""Real-time fan-out of message writes, fed by Postgres LISTEN/NOTIFY.
+
+A trigger on ``messages`` (see the message_notify migration) sends a small
+NOTIFY for every committed insert and update. Each worker holds exactly one
+LISTEN connection; notifications for users with no subscriber on that
+worker are dropped on arrival. The rest are fetched in one query per burst,
+encoded once per message and offered to every matching subscription.
+
+Subscriptions have bounded queues. A consumer that falls behind loses its
+backlog and gets a single ``resync`` event instead, telling it to refetch
+``GET /messages/``; memory per client stays bounded no matter how slow it
+reads.
+"""
+import asyncio
+import json
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Set
+from uuid import UUID
+
+import asyncpg
+import orjson
+from sqlalchemy import select, tuple_
+from sqlalchemy.engine import make_url
+
+from src.app.core.config import MESSAGES_STREAM_KEEPALIVE_SECONDS, MESSAGES_STREAM_QUEUE_SIZE
+from src.app.core.logging import logger
+from src.app.core.metrics import gauge_lines, registry
+from src.app.db.message import Message
+from src.app.services.export import EXPORT_COLUMNS
+
+CHANNEL = "message_events"
+# Trigger operation -> event name sent to clients.
+EVENTS = {"INSERT": "created", "UPDATE": "updated"}
+
+RESYNC = object()
+# The worker is shutting down: send a final resync and end the stream.
+CLOSED = object()
+
+STREAM_OVERFLOWS = registry.counter(
+    "message_stream_overflows_total", "Subscriber queues that overflowed and were told to resync."
+)
+STREAM_NOTIFICATIONS = registry.counter(
+    "message_stream_notifications_total", "Notifications received, by whether any local subscriber wanted them.",
+    ("delivered",),
+)
+
+
+def listen_dsn(url: str) -> str:
+    """A plain ``postgresql://`` DSN asyncpg can connect with, whatever driver ``url`` names."""
+    return make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+def is_postgres_url(url: str) -> bool:
+    return make_url(url).get_backend_name() == "postgresql"
+
+
+class Subscription:
+    """One client's feed of encoded events, optionally limited to one chat."""
+
+    def __init__(self, user_id, chat_id=None, max_queue: int = MESSAGES_STREAM_QUEUE_SIZE):
+        self.user_id = str(user_id)
+        self.chat_id = str(chat_id) if chat_id is not None else None
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.overflows = 0
+
+    def wants(self, chat_id: str) -> bool:
+        return self.chat_id is None or self.chat_id == chat_id
+
+    def offer(self, event: bytes) -> None:
+        """Queue an event without ever blocking the hub.
+
+        On overflow the backlog is discarded and replaced by one RESYNC
+        marker: the client refetches anyway, so nothing it needs is lost.
+        """
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflows += 1
+            STREAM_OVERFLOWS.inc()
+            self.resync()
+
+    def resync(self) -> None:
+        self._replace_backlog(RESYNC)
+
+    def close(self) -> None:
+        self._replace_backlog(CLOSED)
+
+    def _replace_backlog(self, marker) -> None:
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(marker)
+
+    async def get(self):
+        """The next encoded event, RESYNC or CLOSED."""
+        return await self._queue.get()
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+
+class MessageStreamHub:
+    """Per-worker LISTEN connection multiplexed to all local subscriptions."""
+
+    def __init__(self, dsn: str, session_factory, keepalive: float = MESSAGES_STREAM_KEEPALIVE_SECONDS):
+        self.dsn = dsn
+        self.session_factory = session_factory
+        self.keepalive = keepalive
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+        self._pending: list = []
+        self._wakeup = asyncio.Event()
+        self._listener: Optional[asyncio.Task] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.connected = False
+
+    @property
+    def running(self) -> bool:
+        return self._listener is not None and not self._listener.done()
+
+    def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._listener = asyncio.create_task(self._listen(), name="message-stream-listener")
+        self._dispatcher = asyncio.create_task(self._dispatch(), name="message-stream-dispatcher")
+
+    async def stop(self) -> None:
+        for task in (self._listener, self._dispatcher):
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(*(task for task in (self._listener, self._dispatcher) if task is not None),
+                             return_exceptions=True)
+        self._listener = self._dispatcher = None
+
+    def subscribe(self, user_id, chat_id=None) -> Subscription:
+        subscription = Subscription(user_id, chat_id)
+        self._subscriptions.setdefault(subscription.user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self._subscriptions.get(subscription.user_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.user_id]
+
+    def subscriber_count(self) -> int:
+        return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def close_subscriptions(self) -> None:
+        """Tell every stream on this worker to finish, so shutdown need not wait for clients to leave.
+
+        Clients reconnect (to another worker) and refetch, as on resync.
+        """
+        for subscriptions in self._subscriptions.values():
+            for subscription in subscriptions:
+                subscription.close()
+
+    def _resync_all(self) -> None:
+        for subscriptions in self._subscriptions.values():
+            for subscription in subscriptions:
+                subscription.resync()
+
+    def on_notify(self, connection, pid, channel, payload: str) -> None:
+        """asyncpg listener callback: keep only notifications someone here is waiting for."""
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.warning(f"Ignoring malformed {CHANNEL} payload: {payload[:200]!r}")
+            return
+        if event.get("user_id") not in self._subscriptions:
+            STREAM_NOTIFICATIONS.inc("false")
+            return
+        STREAM_NOTIFICATIONS.inc("true")
+        self._pending.append(event)
+        self._wakeup.set()
+
+    async def _listen(self):
+        """Hold the LISTEN connection, reconnecting with backoff.
+
+        Notifications sent while disconnected are lost, so every
+        subscriber is told to resync once the connection is back.
+        """
+        backoff, first = 0.5, True
+        while True:
+            try:
+                connection = await asyncpg.connect(self.dsn)
+            except (OSError, asyncpg.PostgresError, asyncio.TimeoutError) as exc:
+                logger.warning(f"Message stream cannot connect, retrying in {backoff:.1f}s: {exc}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+                continue
+            backoff = 0.5
+            lost = asyncio.Event()
+            connection.add_termination_listener(lambda _: lost.set())
+            try:
+                await connection.add_listener(CHANNEL, self.on_notify)
+                self.connected = True
+                if not first:
+                    self._resync_all()
+                first = False
+                while not lost.is_set():
+                    try:
+                        await asyncio.wait_for(lost.wait(), self.keepalive)
+                    except asyncio.TimeoutError:
+                        # Detect half-open connections the termination listener never hears about.
+                        await asyncio.wait_for(connection.fetchval("SELECT 1"), self.keepalive)
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError, asyncio.TimeoutError) as exc:
+                logger.warning(f"Message stream connection lost: {exc}")
+            finally:
+                self.connected = False
+                connection.terminate()
+
+    async def _dispatch(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            # Everything that arrived since the last round goes out in one fetch.
+            pending, self._pending = self._pending, []
+            try:
+                await self.deliver(pending)
+            except Exception as exc:
+                logger.error(f"Message stream delivery of {len(pending)} events failed: {exc}", exc_info=True)
+                for user_id in {event["user_id"] for event in pending}:
+                    for subscription in self._subscriptions.get(user_id, ()):
+                        subscription.resync()
+
+    async def deliver(self, events: Iterable[dict]) -> None:
+        """Fetch the rows behind ``events`` and offer each to its subscribers."""
+        wanted = {}
+        for event in events:
+            # Subscribers may have left while the event waited. A message
+            # created and then edited within one burst goes out once, as
+            # created, with its latest content.
+            if event["user_id"] in self._subscriptions:
+                wanted.setdefault(event["message_id"], (event["sent_at"], EVENTS.get(event["op"], "updated")))
+        if not wanted:
+            return
+        keys = [(UUID(message_id), datetime.fromisoformat(sent_at)) for message_id, (sent_at, _) in wanted.items()]
+        columns = [getattr(Message, column) for column in EXPORT_COLUMNS]
+        # The (message_id, sent_at) pairs are the partitioned primary key.
+        query = select(*columns, Message.user_id).filter(tuple_(Message.message_id, Message.sent_at).in_(keys))
+        async with self.session_factory() as session:
+            rows = (await session.execute(query)).all()
+        for row in rows:
+            user_id, chat_id = str(row.user_id), str(row.chat_id)
+            event_name = wanted[str(row.message_id)][1]
+            encoded = None
+            for subscription in self._subscriptions.get(user_id, ()):
+                if subscription.wants(chat_id):
+                    if encoded is None:
+                        encoded = encode_event(event_name, dict(zip(EXPORT_COLUMNS, row)))
+                    subscription.offer(encoded)
+
+    def metric_lines(self):
+        return gauge_lines("message_stream_subscribers", "Open message stream subscriptions on this worker.",
+                           [({}, self.subscriber_count())]) + \
+            gauge_lines("message_stream_connected", "Whether this worker's LISTEN connection is up.",
+                        [({}, int(self.connected))])
+
+
+def encode_event(event: str, message: Optional[dict] = None) -> bytes:
+    """``{"event": ..., "message": {...}}`` with the message shaped like MessageRead."""
+    return orjson.dumps({"event": event, "message": message} if message is not None else {"event": event},
+                        default=str)
+
+
+RESYNC_EVENT = encode_event("resync")
@@ -0,0 +1,20 @@
+import base64
+import json
+from datetime import datetime
+from uuid import UUID
+
+
+def encode_cursor(sent_at: datetime, message_id: UUID) -> str:
+    """Build an opaque keyset cursor pointing just past the given row."""
+    raw = json.dumps([sent_at.isoformat(), str(message_id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    """Inverse of encode_cursor; raises ValueError on anything malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sent_at, message_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(sent_at), UUID(message_id)
+    except (TypeError, ValueError) as exc:
+        raise ValueError("Invalid cursor") from exc
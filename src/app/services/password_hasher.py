@@ -0,0 +1,65 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+from src.app.core.config import BCRYPT_ROUNDS, PASSWORD_HASH_MAX_PENDING, PASSWORD_HASH_WORKERS
+from src.app.core.metrics import gauge_lines, registry
+
+HASH_DURATION = registry.histogram(
+    "password_hash_duration_seconds", "Password hashing time including pool queueing.", ("operation",)
+)
+HASH_REJECTED = registry.counter("password_hash_rejected_total", "Hash requests rejected by the queue limit.")
+
+
+class HasherOverloaded(Exception):
+    """Raised instead of queueing when too many hashes are already pending."""
+
+
+class PasswordHasher:
+    """Runs bcrypt off the event loop on a small, dedicated thread pool.
+
+    bcrypt releases the GIL while hashing, so threads give real parallelism
+    without blocking request handling. At most ``max_pending`` operations
+    may be queued or running; beyond that callers fail fast with
+    HasherOverloaded rather than piling up behind a login burst.
+    """
+
+    def __init__(self, context: CryptContext, max_workers: int = PASSWORD_HASH_WORKERS,
+                 max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        self.context = context
+        self.max_pending = max_pending
+        self.pending = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hash")
+
+    async def _run(self, func, *args):
+        if self.pending >= self.max_pending:
+            HASH_REJECTED.inc()
+            raise HasherOverloaded("Password hashing queue is full")
+        self.pending += 1
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self.pending -= 1
+            HASH_DURATION.observe(func.__name__, value=time.perf_counter() - started)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Verify ``password``; also return a fresh hash if the stored one uses another cost."""
+        return await self._run(self.context.verify_and_update, password, hashed_password)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+password_hasher = PasswordHasher(pwd_context)
+
+registry.register_collector(lambda: gauge_lines(
+    "password_hash_pending", "Password hash operations queued or running.", [({}, password_hasher.pending)]
+))
@@ -0,0 +1,174 @@
+"""Rating analytics served from the ``rating_rollups`` table.
+
+    python -m src.app.services.rating_stats                                  # every hour that has messages
+    python -m src.app.services.rating_stats --start 2025-01-01 --end 2025-02-01
+
+Every message is counted under an ``(hour, chat, role, rating)`` and a
+``(day, chat, role, rating)`` key of its user. Writes adjust those counts
+in the same transaction (see MessageService), so GET /messages/stats reads
+the rollup rows of one granularity, never messages. The command above
+recounts the rollups of whole days from ``messages``, one day per
+transaction: use it after loading messages behind the service's back.
+Like chat summaries, rollups outlive retired partitions; rebuilding a
+range whose partitions are gone would empty it.
+"""
+import argparse
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+import orjson
+from sqlalchemy import DateTime, delete, func, insert, literal, select, text, tuple_, type_coerce, update
+
+from src.app.core.config import ASYNC_DATABASE_URL
+from src.app.core.logging import logger
+from src.app.db.chat_summary import ChatSummary
+from src.app.db.message import Message
+from src.app.db.rating_rollup import RatingRollup
+
+ROLLUP_KEY = ("user_id", "granularity", "bucket_start", "chat_id", "role", "rating")
+ROLLUP_COLUMNS = ROLLUP_KEY + ("message_count",)
+# Bucket sizes GET /messages/stats offers; each is kept as its own rollup granularity.
+BUCKETS = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+# Range GET /messages/stats covers when the client gives no start.
+DEFAULT_RANGES = {"hour": timedelta(days=1), "day": timedelta(days=30)}
+# SQLAlchemy stores SQLite datetimes as text in this layout; truncate within it.
+_SQLITE_FORMATS = {"hour": "%Y-%m-%d %H:00:00.000000", "day": "%Y-%m-%d 00:00:00.000000"}
+
+
+def floor_to(value: datetime, unit: str) -> datetime:
+    value = value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0) if unit == "day" else value
+
+
+def ceil_to(value: datetime, unit: str) -> datetime:
+    floored = floor_to(value, unit)
+    return floored if floored == value else floored + BUCKETS[unit]
+
+
+def naive_utc(value: datetime) -> datetime:
+    """``value`` without a zone, as sent_at is stored; zoned values are converted to UTC first."""
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+
+def truncate(dialect_name: str, unit: str, column):
+    """SQL for ``column`` truncated to the start of its hour or day."""
+    if dialect_name == "sqlite":
+        return type_coerce(func.strftime(_SQLITE_FORMATS[unit], column), DateTime)
+    return func.date_trunc(unit, column)
+
+
+def stats_query(user_id, start, end, bucket="day", chat_id=None, role=None):
+    query = select(RatingRollup.chat_id, RatingRollup.role, RatingRollup.bucket_start, RatingRollup.rating,
+                   RatingRollup.message_count).filter(
+        RatingRollup.user_id == user_id, RatingRollup.granularity == bucket,
+        RatingRollup.bucket_start >= start, RatingRollup.bucket_start < end,
+        # Keys whose messages were all re-rated or moved away are left at zero.
+        RatingRollup.message_count > 0,
+    )
+    if chat_id is not None:
+        query = query.filter(RatingRollup.chat_id == chat_id)
+    if role is not None:
+        query = query.filter(RatingRollup.role == role)
+    return query.order_by(RatingRollup.bucket_start, RatingRollup.chat_id, RatingRollup.role, RatingRollup.rating)
+
+
+def rollup_keys(row) -> list:
+    """The rollup keys, one per granularity, a message row is counted under."""
+    return [(row["user_id"], unit, floor_to(row["sent_at"], unit), row["chat_id"], row["role"], row["rating"])
+            for unit in BUCKETS]
+
+
+def fold_buckets(rows) -> List[dict]:
+    """Turn ``(chat_id, role, bucket_start, rating, count)`` rows into one RatingStatsBucket-shaped dict
+    per chat, role and bucket."""
+    buckets = {}
+    for chat_id, role, bucket_start, rating, count in rows:
+        entry = buckets.get((bucket_start, chat_id, role))
+        if entry is None:
+            buckets[(bucket_start, chat_id, role)] = entry = {
+                "chat_id": chat_id, "role": role, "bucket_start": bucket_start, "message_count": 0,
+                "average_rating": 0, "ratings": {},
+            }
+        entry["message_count"] += count
+        # A running sum until the end.
+        entry["average_rating"] += rating * count
+        entry["ratings"][rating] = count
+    entries = list(buckets.values())
+    for entry in entries:
+        entry["average_rating"] /= entry["message_count"]
+    return entries
+
+
+def encode_stats(bucket: str, start: datetime, end: datetime, buckets: List[dict]) -> bytes:
+    """Encode a RatingStats body without building the models; see encode_json for the conventions."""
+    return orjson.dumps({"bucket": bucket, "start": start, "end": end, "buckets": buckets},
+                        default=str, option=orjson.OPT_NON_STR_KEYS)
+
+
+async def rebuild_rollups(connection, start: datetime, end: datetime) -> int:
+    """Recount the rollups of the whole days ``[start, end)`` from messages; returns the rows written."""
+    dialect_name = connection.dialect.name
+    if dialect_name == "postgresql":
+        # Writers wait until this commits: a delta is either in the recount
+        # (its message was committed) or applied after it, never both.
+        await connection.execute(text("LOCK TABLE rating_rollups IN SHARE ROW EXCLUSIVE MODE"))
+    # Plain tables: the command runs without the rest of the ORM mappings.
+    rollups, messages, summaries = RatingRollup.__table__, Message.__table__.c, ChatSummary.__table__.c
+    in_range = (messages.sent_at >= start, messages.sent_at < end)
+    # Stats responses are tagged with the chats' versions; recounted ones must change.
+    await connection.execute(update(ChatSummary.__table__).filter(
+        tuple_(summaries.user_id, summaries.chat_id).in_(
+            select(messages.user_id, messages.chat_id).filter(*in_range).distinct())
+    ).values(version=summaries.version + 1))
+    await connection.execute(delete(rollups).filter(rollups.c.bucket_start >= start, rollups.c.bucket_start < end))
+    written = 0
+    for unit in BUCKETS:
+        key = (messages.user_id, literal(unit), truncate(dialect_name, unit, messages.sent_at), messages.chat_id,
+               messages.role, messages.rating)
+        counts = select(*key, func.count()).filter(*in_range).group_by(*key)
+        written += (await connection.execute(insert(rollups).from_select(ROLLUP_COLUMNS, counts))).rowcount
+    return written
+
+
+async def backfill(engine, start: Optional[datetime] = None, end: Optional[datetime] = None) -> int:
+    """Rebuild the rollups of the days ``start`` through ``end`` (default: all with messages), one per transaction."""
+    if start is None or end is None:
+        async with engine.connect() as connection:
+            sent_at = Message.__table__.c.sent_at
+            first, last = (await connection.execute(select(func.min(sent_at), func.max(sent_at)))).one()
+        if first is None:
+            return 0
+        start = start or first
+        end = end or last + BUCKETS["hour"]
+    # Day rollups are recounted whole, so the range is widened to whole days.
+    day, end, written = floor_to(start, "day"), ceil_to(end, "day"), 0
+    while day < end:
+        async with engine.begin() as connection:
+            written += await rebuild_rollups(connection, day, day + BUCKETS["day"])
+        day += BUCKETS["day"]
+    logger.info(f"Rebuilt rating rollups for {floor_to(start, 'day'):%Y-%m-%d} to {end:%Y-%m-%d}: {written} rows")
+    return written
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild rating rollups from messages.")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="default: the oldest message")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="exclusive; default: after the newest message")
+    return parser.parse_args(argv)
+
+
+async def main(args):
+    from src.app.db.pool import build_engine
+
+    engine = build_engine(ASYNC_DATABASE_URL, name="rollups")
+    try:
+        written = await backfill(engine, args.start, args.end)
+    finally:
+        await engine.dispose()
+    print(f"wrote {written} rollup rows")
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,70 @@
+import re
+from typing import Optional
+
+from sqlalchemy import func, literal_column
+
+# Must match the text search configuration of the generated column.
+SEARCH_CONFIG = "simple"
+
+# Maintained by the database (see the message_search migration), so it is
+# deliberately not mapped on Message.
+search_vector = literal_column("messages.search_vector")
+
+
+class SearchUnavailable(Exception):
+    """Raised when full-text search is asked of a database without it (anything but PostgreSQL)."""
+
+
+_TOKEN = re.compile(r'(-?)"([^"]*)"?|(\S+)')
+_WORD = re.compile(r"\w+")
+
+
+def _lexemes(text: str) -> list:
+    # Keep only word characters: tsquery operators in user input must never
+    # reach to_tsquery, which raises on malformed syntax.
+    return [word.lower() for word in _WORD.findall(text)]
+
+
+def parse_search_query(q: str) -> Optional[str]:
+    """Translate a search box string into ``to_tsquery`` syntax.
+
+    Supports plain words (all must match), ``"quoted phrases"``,
+    ``-excluded`` words or phrases, ``OR`` between terms and a trailing
+    ``*`` for prefix matches. Returns None when nothing searchable is left.
+    """
+    current, pending_or = [], False
+    for negated, phrase, word in _TOKEN.findall(q):
+        if word == "OR":
+            pending_or = bool(current)
+            continue
+        if word.startswith("-") and len(word) > 1:
+            negated, word = "-", word[1:]
+        prefix = bool(word) and word.endswith("*")
+        lexemes = _lexemes(phrase if phrase else word)
+        if not lexemes:
+            continue
+        if prefix:
+            lexemes[-1] += ":*"
+        term = " <-> ".join(lexemes)
+        if len(lexemes) > 1:
+            term = f"({term})"
+        if negated:
+            term = f"!{term}"
+        if pending_or:
+            current[-1] = f"{current[-1]} | {term}"
+            pending_or = False
+        else:
+            current.append(term)
+    groups = [f"({term})" if " | " in term else term for term in current]
+    if not groups or all(term.startswith("!") for term in groups):
+        return None
+    return " & ".join(groups)
+
+
+def search_condition(tsquery: str):
+    return search_vector.op("@@")(func.to_tsquery(SEARCH_CONFIG, tsquery))
+
+
+def search_rank(tsquery: str):
+    # Cover density: terms that occur close together rank higher.
+    return func.ts_rank_cd(search_vector, func.to_tsquery(SEARCH_CONFIG, tsquery))
@@ -0,0 +1,159 @@
+import asyncio
+import time
+from typing import Optional
+
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from src.app.core.config import (
+    WRITE_BEHIND_ENQUEUE_TIMEOUT_MS,
+    WRITE_BEHIND_MAX_BATCH,
+    WRITE_BEHIND_MAX_DELAY_MS,
+    WRITE_BEHIND_MAX_QUEUE,
+)
+from src.app.core.logging import logger
+from src.app.core.metrics import SIZE_BUCKETS, Histogram
+from src.app.schemas.messages import MessageCreate
+from src.app.services.message_service import MessageService
+
+_STOP = object()
+
+
+def _database_unavailable(exc: Exception) -> bool:
+    """Whether ``exc`` is about the connection or pool, so retrying smaller groups cannot help."""
+    if isinstance(exc, DBAPIError) and exc.connection_invalidated:
+        return True
+    return isinstance(exc, (OperationalError, InterfaceError, PoolTimeoutError, OSError, asyncio.TimeoutError))
+
+
+class WritePipelineOverloaded(Exception):
+    """Raised when the write queue stays full for longer than the enqueue timeout."""
+
+
+class MessageWritePipeline:
+    """Group-commit writer for single-message sends.
+
+    Callers enqueue a row and await a future. A background flusher collects
+    rows until ``max_batch`` is reached or ``max_delay`` has passed since the
+    first one, inserts the whole group in one transaction, and only then
+    resolves the futures, so a request still returns after its row is
+    durable. Many concurrent sends therefore share a single commit (and a
+    single fsync) instead of paying for one each.
+    """
+
+    def __init__(self, session_factory, max_batch: int = WRITE_BEHIND_MAX_BATCH,
+                 max_delay: float = WRITE_BEHIND_MAX_DELAY_MS / 1000,
+                 max_queue: int = WRITE_BEHIND_MAX_QUEUE,
+                 enqueue_timeout: float = WRITE_BEHIND_ENQUEUE_TIMEOUT_MS / 1000):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_queue = max_queue
+        self.enqueue_timeout = enqueue_timeout
+        self.group_size = Histogram(SIZE_BUCKETS)
+        self.flush_latency = Histogram()
+        self.rejected = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run(), name="message-write-pipeline")
+
+    async def stop(self) -> None:
+        """Stop accepting work, flush everything already queued, then return."""
+        if not self.running:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+
+    async def submit(self, message_data: MessageCreate, user_id):
+        """Queue one message and wait until the group containing it is committed."""
+        row = MessageService.message_row(message_data, user_id)
+        future = asyncio.get_running_loop().create_future()
+        try:
+            await asyncio.wait_for(self._queue.put((row, future)), self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise WritePipelineOverloaded("Write queue is full")
+        return await future
+
+    async def _next(self, timeout: float):
+        """Return the next queued item, or None if nothing arrives in ``timeout``."""
+        getter = asyncio.ensure_future(self._queue.get())
+        done, _ = await asyncio.wait({getter}, timeout=timeout)
+        # cancel() fails only if the get completed in the meantime; a
+        # cancelled get leaves its item in the queue.
+        if done or not getter.cancel():
+            return getter.result()
+        return None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    item = await self._next(remaining) if remaining > 0 else None
+                    if item is None:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch):
+        started = time.perf_counter()
+        await self._write(batch)
+        self.group_size.observe(len(batch))
+        self.flush_latency.observe(time.perf_counter() - started)
+
+    async def _write(self, batch):
+        """Insert ``batch`` in one transaction and resolve its futures.
+
+        If the group fails, each half is retried in its own transaction, so
+        a row the database rejects (an out-of-range rating, a NUL byte in the
+        content) fails only its own sender, for about 2·log2(size) extra
+        transactions. Failures of the database rather than the rows fail the
+        whole group at once.
+        """
+        rows = [row for row, _ in batch]
+        try:
+            async with self.session_factory() as session:
+                await MessageService(session).insert_message_rows(rows)
+        except Exception as exc:
+            if len(batch) == 1 or _database_unavailable(exc):
+                logger.error(f"Write pipeline flush of {len(rows)} rows failed: {exc}", exc_info=True)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                return
+        else:
+            for row, future in batch:
+                if not future.done():
+                    future.set_result(row["message_id"])
+            return
+        middle = len(batch) // 2
+        await self._write(batch[:middle])
+        await self._write(batch[middle:])
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "rejected": self.rejected,
+            "group_size": self.group_size.snapshot(),
+            "flush_latency_seconds": self.flush_latency.snapshot(),
+        }
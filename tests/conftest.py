@@ -0,0 +1,124 @@
+import asyncio
+import time
+from contextlib import contextmanager
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import event
+
+from src.app.core.resp import read_reply
+
+
+class RespStandIn:
+    """Tiny in-process server speaking enough of the Redis protocol for tests."""
+
+    def __init__(self):
+        self.data = {}
+        self.server = None
+        self.port = None
+
+    def _live(self, key):
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def handle_command(self, name, args):
+        if name == "PING":
+            return "+PONG"
+        if name in ("SELECT", "AUTH"):
+            return "+OK"
+        if name == "GET":
+            return self._live(args[0])
+        if name == "SET":
+            expires_at = None
+            if len(args) >= 4 and args[2].upper() == b"PX":
+                expires_at = time.monotonic() + int(args[3]) / 1000
+            self.data[args[0]] = (args[1], expires_at)
+            return "+OK"
+        if name == "DEL":
+            return sum(1 for key in args if self.data.pop(key, None) is not None)
+        if name in ("INCR", "DECR"):
+            entry = self._live(args[0])
+            value = int(entry or 0) + (1 if name == "INCR" else -1)
+            expires_at = self.data[args[0]][1] if args[0] in self.data else None
+            self.data[args[0]] = (str(value).encode(), expires_at)
+            return value
+        if name == "PEXPIRE":
+            if self._live(args[0]) is None:
+                return 0
+            self.data[args[0]] = (self.data[args[0]][0], time.monotonic() + int(args[1]) / 1000)
+            return 1
+        return RuntimeError(f"ERR unknown command '{name}'")
+
+    @staticmethod
+    def encode_reply(reply):
+        if reply is None:
+            return b"$-1\r\n"
+        if isinstance(reply, RuntimeError):
+            return b"-%s\r\n" % str(reply).encode()
+        if isinstance(reply, str):
+            return reply.encode() + b"\r\n"
+        if isinstance(reply, int):
+            return b":%d\r\n" % reply
+        if isinstance(reply, bytes):
+            return b"$%d\r\n%s\r\n" % (len(reply), reply)
+        if isinstance(reply, list):
+            return b"*%d\r\n" % len(reply) + b"".join(RespStandIn.encode_reply(r) for r in reply)
+        raise TypeError(reply)
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                command = await read_reply(reader)
+                name, args = command[0].decode().upper(), command[1:]
+                writer.write(self.encode_reply(self.handle_command(name, args)))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+@pytest_asyncio.fixture
+async def resp_server():
+    server = await RespStandIn().start()
+    yield server
+    await server.stop()
+
+
+@pytest.fixture
+def query_budget():
+    """``with query_budget(engine, 2) as statements: ...`` fails if the block runs more than 2 statements.
+
+    Counts every statement sent to the database, so a hot path that
+    quietly gains a round-trip breaks the build.
+    """
+    @contextmanager
+    def budget(engine, limit):
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine.sync_engine, "before_cursor_execute", count)
+        try:
+            yield statements
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", count)
+        assert len(statements) <= limit, \
+            f"{len(statements)} statements, budget {limit}:\n" + "\n".join(statements)
+    return budget
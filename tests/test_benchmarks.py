@@ -0,0 +1,53 @@
+from benchmarks.http_bench import compare, percentile, summarize
+
+
+def test_percentiles_use_nearest_rank():
+    values = [i / 1000 for i in range(1, 101)]
+    summary = summarize(values, errors=2, elapsed=2.0)
+    assert summary["p50_ms"] == 50.0
+    assert summary["p99_ms"] == 99.0
+    assert summary["requests"] == 102
+    assert summary["throughput_rps"] == 50.0
+    assert percentile([], 0.5) == 0.0
+
+
+def test_compare_flags_only_regressions_beyond_threshold():
+    baseline = {"login": {"p95_ms": 100.0, "throughput_rps": 200.0, "errors": 0}}
+    within = {"login": {"p95_ms": 109.0, "throughput_rps": 185.0, "errors": 0}}
+    slower = {"login": {"p95_ms": 130.0, "throughput_rps": 150.0, "errors": 1}}
+    assert compare(within, baseline, threshold=0.1) == []
+    assert len(compare(slower, baseline, threshold=0.1)) == 3
+
+
+def test_serialization_paths_produce_identical_bodies():
+    import asyncio
+    from benchmarks.serialization_bench import main, parse_args
+
+    # main() raises if the two paths disagree.
+    results = asyncio.run(main(parse_args(["--rows", "20", "--iterations", "2"])))
+    assert set(results) == {"orm", "fast", "cpu_reduction"}
+
+
+def test_compression_bench_reports_every_gzip_level():
+    from benchmarks.compression_bench import main, parse_args
+
+    # main() raises if a coding does not round-trip.
+    results = main(parse_args(["--rows", "20", "--export-rows", "50", "--batch-size", "20", "--iterations", "1"]))
+    assert {"gzip-1", "gzip-9"} <= set(results["export"])
+    assert 0 < results["page"]["gzip-5"]["saved"] < 1
+
+
+def test_seed_dataset_is_skewed_and_deterministic():
+    import random
+    from datetime import datetime
+    from benchmarks.seed import Dataset, allocate, pareto_weights
+
+    assert sum(allocate(1001, pareto_weights(random.Random(0), 7, 1.2))) == 1001
+    end = datetime(2025, 6, 1)
+    first, second = (Dataset(50, 5000, 4, 6, 1.1, seed=3, end=end) for _ in range(2))
+    rows = list(first.message_rows())
+    assert rows == list(second.message_rows())
+    assert len(rows) == 5000
+    assert all(first.start <= row[4] <= end for row in rows)
+    # A tenth of the users write well over a tenth of the messages.
+    assert sum(sorted(first.message_counts, reverse=True)[:5]) > 5000 * 0.25
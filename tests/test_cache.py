@@ -0,0 +1,114 @@
+import pytest
+from collections import namedtuple
+from unittest.mock import AsyncMock, MagicMock
+from uuid import uuid4
+from datetime import datetime
+from src.app.core.cache import MemoryCacheBackend, RedisCacheBackend, TTLCache
+from src.app.core.resp import RespClient
+from src.app.schemas.messages import MessageCreate
+from src.app.services.export import EXPORT_COLUMNS, encode_json
+from src.app.services.message_service import MessageService
+from src.app.services.pagination import decode_cursor
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1, ttl=0)
+    assert cache.get("a") is None
+    assert cache.stats()["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_round_trip(resp_server):
+    client = RespClient(port=resp_server.port)
+    backend = RedisCacheBackend(client)
+    try:
+        assert await backend.get("k") is None
+        await backend.set("k", "v")
+        assert await backend.get("k") == "v"
+        assert backend.stats() == {"hits": 1, "misses": 1}
+    finally:
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_delete():
+    backend = MemoryCacheBackend()
+    await backend.set("k", "v")
+    await backend.delete("k")
+    assert await backend.get("k") is None
+    await backend.delete("missing")
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_degrades_to_miss_when_unreachable():
+    backend = RedisCacheBackend(RespClient(port=1, timeout=0.2))
+    assert await backend.get("k") is None
+    await backend.set("k", "v")
+
+
+@pytest.fixture
+def db_session():
+    mock_session = MagicMock()
+    mock_session.commit = AsyncMock()
+    mock_session.refresh = AsyncMock()
+    mock_result = MagicMock()
+    mock_result.all.return_value = [(uuid4(), "test", 1, datetime.now(), "user", uuid4())]
+    mock_session.execute = AsyncMock(return_value=mock_result)
+    connection = MagicMock()
+    connection.dialect.name = "postgresql"
+    mock_session.connection = AsyncMock(return_value=connection)
+    return mock_session
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("use_resp", [False, True])
+async def test_page_is_cached_per_history_version(db_session, resp_server, use_resp):
+    client = RespClient(port=resp_server.port)
+    cache = RedisCacheBackend(client) if use_resp else MemoryCacheBackend()
+    service = MessageService(db_session, cache=cache)
+    try:
+        first = await service.get_messages_page(user_id=1, version='"v1"')
+        second = await service.get_messages_page(user_id=1, version='"v1"')
+        assert first == second
+        assert db_session.execute.await_count == 1
+
+        # A write moves the history (and its ETag) to a new version.
+        await service.send_message(MessageCreate(
+            content="hello", sent_at=datetime.now(), chat_id=uuid4(), rating=1, role="user"
+        ), user_id=1)
+        reads_before = db_session.execute.await_count
+        await service.get_messages_page(user_id=1, version='"v2"')
+        assert db_session.execute.await_count == reads_before + 1
+    finally:
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_encoded_page_is_cached_with_its_cursor(db_session):
+    Row = namedtuple("Row", EXPORT_COLUMNS)
+    rows = [Row(uuid4(), f"m{i}", 1, datetime(2025, 1, 1, 10, i), "user", uuid4()) for i in range(2)]
+    db_session.execute.return_value.all.return_value = rows
+    service = MessageService(db_session, cache=MemoryCacheBackend())
+
+    first = await service.get_messages_page(user_id=1, limit=2, version='"v1"')
+    second = await service.get_messages_page(user_id=1, limit=2, version='"v1"')
+    assert first == second
+    assert db_session.execute.await_count == 1
+    assert first.count == 2
+    assert first.body == encode_json(rows)
+    assert decode_cursor(first.next_cursor) == (rows[-1].sent_at, rows[-1].message_id)
+
+    db_session.execute.return_value.all.return_value = rows[:1]
+    assert (await service.get_messages_page(user_id=1, limit=2, version='"v2"')).next_cursor is None
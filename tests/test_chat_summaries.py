@@ -0,0 +1,111 @@
+import json
+import pytest
+import pytest_asyncio
+from datetime import datetime, timedelta
+from uuid import UUID, uuid4
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from src.app.core.cache import MemoryCacheBackend
+from src.app.db.base import Base
+from src.app.db.user import User
+from src.app.schemas.messages import MessageCreate
+from src.app.services.message_service import MessageService
+
+
+@pytest_asyncio.fixture
+async def session(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/chats.db")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+        yield session
+    await engine.dispose()
+
+
+def message(chat_id, content, rating, sent_at):
+    return MessageCreate(chat_id=chat_id, content=content, rating=rating, sent_at=sent_at, role="user")
+
+
+@pytest.mark.asyncio
+async def test_summaries_follow_sends_batches_and_updates(session):
+    user = User(username="ana", email="ana@example.com", hashed_password="x")
+    session.add(user)
+    await session.commit()
+    service = MessageService(session, cache=MemoryCacheBackend())
+    busy, quiet = uuid4(), uuid4()
+    start = datetime(2025, 1, 1)
+
+    await service.send_message(message(quiet, "hello", 4, start), user.id)
+    await service.send_message(message(busy, "first", 1, start + timedelta(minutes=1)), user.id)
+    await service.send_messages([
+        message(busy, "late", 3, start + timedelta(minutes=3)),
+        message(busy, "early", 5, start + timedelta(minutes=2)),
+    ], user.id)
+
+    chats = await service.list_chats(user.id)
+    assert [chat.chat_id for chat in chats] == [busy, quiet]
+    assert chats[0].message_count == 3
+    assert chats[0].average_rating == 3
+    assert chats[0].last_message_preview == "late"
+    assert chats[0].last_sent_at == start + timedelta(minutes=3)
+
+    [page] = await service.list_chats(user.id, limit=1, after=(chats[0].last_sent_at, chats[0].chat_id))
+    assert page.chat_id == quiet
+
+    [hello] = json.loads((await service.get_messages_page(user.id, chat_id=quiet)).body)
+    await service.update_message(UUID(hello["message_id"]), message(quiet, "edited", 2, start), user.id)
+    chats = await service.list_chats(user.id)
+    assert chats[0].chat_id == quiet
+    assert chats[0].last_message_preview == "edited"
+    assert chats[0].average_rating == 2
+    assert chats[0].message_count == 1
+
+
+@pytest.mark.asyncio
+async def test_etag_changes_only_when_history_does(session):
+    user = User(username="bo", email="bo@example.com", hashed_password="x")
+    session.add(user)
+    await session.commit()
+    service = MessageService(session, cache=MemoryCacheBackend())
+    chat, other = uuid4(), uuid4()
+    start = datetime(2025, 1, 1)
+
+    empty = await service.messages_etag(user.id)
+    await service.send_message(message(chat, "hello", 4, start), user.id)
+    sent = await service.messages_etag(user.id)
+    chat_tag = await service.messages_etag(user.id, chat)
+    assert sent != empty
+    assert await service.messages_etag(user.id) == sent
+    assert await service.messages_etag(user.id, None, 10) != sent
+
+    await service.send_message(message(other, "elsewhere", 1, start), user.id)
+    assert await service.messages_etag(user.id) != sent
+    assert await service.messages_etag(user.id, chat) == chat_tag
+
+    [hello] = json.loads((await service.get_messages_page(user.id, chat_id=chat)).body)
+    await service.update_message(UUID(hello["message_id"]), message(chat, "edited", 4, start), user.id)
+    assert await service.messages_etag(user.id, chat) != chat_tag
+
+
+@pytest.mark.asyncio
+async def test_page_cache_of_another_worker_never_outlives_the_etag(session):
+    user = User(username="cy", email="cy@example.com", hashed_password="x")
+    session.add(user)
+    await session.commit()
+    # Two workers: one database, separate in-process caches.
+    writer = MessageService(session, cache=MemoryCacheBackend())
+    reader = MessageService(session, cache=MemoryCacheBackend())
+    chat = uuid4()
+    await writer.send_message(message(chat, "old", 4, datetime(2025, 1, 1)), user.id)
+
+    async def read():
+        etag = await reader.messages_etag(user.id, None, "messages")
+        page = await reader.get_messages_page(user.id, version=etag)
+        return etag, [entry["content"] for entry in json.loads(page.body)]
+
+    before = await read()
+    assert before[1] == ["old"]
+    [old] = json.loads((await writer.get_messages_page(user.id)).body)
+    await writer.update_message(UUID(old["message_id"]), message(chat, "new", 4, datetime(2025, 1, 1)), user.id)
+    after = await read()
+    assert after[0] != before[0]
+    assert after[1] == ["new"]
@@ -0,0 +1,114 @@
+import zlib
+
+import httpx
+import pytest
+from fastapi import FastAPI, Header
+from fastapi.responses import PlainTextResponse, StreamingResponse
+
+from src.app.core.cache import TTLCache
+from src.app.core.compression import CompressionMiddleware, compress, negotiate
+from src.app.core.responses import RawJSONResponse, etag_matches, not_modified
+
+BODY = b'{"content": "' + b"hello there " * 400 + b'"}'
+
+
+def test_negotiate_honours_weights_wildcards_and_preference_order():
+    encodings = {"zstd": 3, "br": 4, "gzip": 5}
+    assert negotiate("gzip, deflate", encodings) == "gzip"
+    assert negotiate("gzip;q=0.5, br", encodings) == "br"
+    assert negotiate("gzip, br, zstd", encodings) == "zstd"
+    assert negotiate("zstd;q=0, *;q=0.1", encodings) == "br"
+    assert negotiate("GZIP; q=1.0", encodings) == "gzip"
+    assert negotiate("gzip;q=0", encodings) is None
+    assert negotiate("identity, deflate", encodings) is None
+    assert negotiate(None, encodings) is None
+    assert negotiate("br", {"gzip": 5}) is None
+
+
+def make_app(cache=None):
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=1000, levels={"gzip": 5}, cache=cache)
+
+    @app.get("/page")
+    async def page(if_none_match: str = Header(None)):
+        etag = '"v1"'
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        return RawJSONResponse(BODY, headers={"ETag": etag})
+
+    @app.get("/small")
+    async def small():
+        return RawJSONResponse(b'{"ok": true}')
+
+    @app.get("/export")
+    async def export(chunks: int = 3):
+        async def body():
+            for index in range(chunks):
+                yield f'{{"row": {index}, "content": "{"lorem ipsum " * 50}"}}\n'
+
+        return StreamingResponse(body(), media_type="application/x-ndjson")
+
+    @app.get("/events")
+    async def events():
+        return StreamingResponse(iter([b"data: " + BODY + b"\n\n"]), media_type="text/event-stream")
+
+    @app.get("/binary")
+    async def binary():
+        return PlainTextResponse(BODY, media_type="application/octet-stream")
+
+    return app
+
+
+def client(app):
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+@pytest.mark.asyncio
+async def test_whole_bodies_are_compressed_with_a_weak_etag_and_reused_from_cache():
+    cache = TTLCache(maxsize=8, ttl=60)
+    async with client(make_app(cache)) as http:
+        response = await http.get("/page", headers={"Accept-Encoding": "gzip"})
+        again = await http.get("/page", headers={"Accept-Encoding": "gzip"})
+        revalidated = await http.get("/page", headers={"Accept-Encoding": "gzip",
+                                                       "If-None-Match": response.headers["etag"]})
+        identity = await http.get("/page", headers={"Accept-Encoding": "identity"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"] == 'W/"v1"'
+    assert response.content == again.content == BODY
+    assert int(response.headers["content-length"]) < len(BODY) / 10
+    assert (cache.misses, cache.hits) == (1, 1)
+    assert revalidated.status_code == 304
+    assert "content-encoding" not in identity.headers
+    assert identity.headers["etag"] == '"v1"'
+    assert identity.headers["vary"] == "Accept-Encoding"
+    assert identity.content == BODY
+
+
+@pytest.mark.asyncio
+async def test_streams_are_compressed_incrementally():
+    async with client(make_app()) as http:
+        async with http.stream("GET", "/export", params={"chunks": 50},
+                               headers={"Accept-Encoding": "gzip"}) as response:
+            raw = b"".join([chunk async for chunk in response.aiter_raw()])
+        short = await http.get("/export", params={"chunks": 1}, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    lines = zlib.decompress(raw, 31).decode().splitlines()
+    assert len(lines) == 50 and lines[-1].startswith('{"row": 49')
+    # Under the threshold by the end of the stream: sent as is.
+    assert "content-encoding" not in short.headers
+    assert short.text.startswith('{"row": 0')
+
+
+@pytest.mark.asyncio
+async def test_small_event_stream_and_binary_bodies_pass_through():
+    async with client(make_app()) as http:
+        for path in ("/small", "/events", "/binary"):
+            response = await http.get(path, headers={"Accept-Encoding": "gzip"})
+            assert "content-encoding" not in response.headers, path
+    assert response.content == BODY
+
+
+def test_compress_round_trips():
+    assert zlib.decompress(compress("gzip", 1, BODY), 31) == BODY
@@ -0,0 +1,51 @@
+import csv
+import io
+import json
+from datetime import datetime
+from uuid import UUID, uuid4
+from src.app.services.export import EXPORT_COLUMNS, csv_header, encode_rows
+
+
+def make_row(content):
+    return (uuid4(), content, 3, datetime(2025, 9, 7, 12, 34, 56), "user", uuid4())
+
+
+def test_ndjson_chunk_has_one_object_per_line():
+    rows = [make_row("hello"), make_row("čao")]
+    lines = encode_rows("ndjson", rows).splitlines()
+    assert len(lines) == 2
+    first = json.loads(lines[0])
+    assert list(first) == list(EXPORT_COLUMNS)
+    assert first["sent_at"] == "2025-09-07T12:34:56"
+    assert json.loads(lines[1])["content"] == "čao"
+
+
+def test_csv_chunks_concatenate_under_one_header():
+    text = csv_header() + encode_rows("csv", [make_row('quote "me"')]) + encode_rows("csv", [make_row("a,b")])
+    records = list(csv.DictReader(io.StringIO(text)))
+    assert [r["content"] for r in records] == ['quote "me"', "a,b"]
+    assert records[0]["rating"] == "3"
+
+
+def test_json_fast_path_matches_fastapi_rendering():
+    from typing import List
+
+    from fastapi.responses import JSONResponse
+    from pydantic import TypeAdapter
+    from src.app.schemas.messages import MessageRead
+    from src.app.services.export import encode_json
+
+    message_list_adapter = TypeAdapter(List[MessageRead])
+
+    rows = [
+        (uuid4(), 'čao "quoted" \\ </script> \n tab\t 😀', 3, datetime(2025, 9, 7, 12, 34, 56), "user", uuid4()),
+        (uuid4(), "", -1, datetime(2025, 9, 7, 12, 34, 56, 500), "ai", uuid4()),
+        (uuid4(), "x", 0, datetime(2025, 9, 7, 12, 34, 56, 123456), "ai", uuid4()),
+    ]
+    models = [MessageRead.model_validate(dict(zip(EXPORT_COLUMNS, row))) for row in rows]
+    expected = JSONResponse(message_list_adapter.dump_python(models, mode="json", by_alias=True)).body
+    assert encode_json(rows) == expected
+    # What asyncpg hands back for uuid columns.
+    from asyncpg.pgproto.pgproto import UUID as PgUUID
+    assert encode_json([tuple(PgUUID(str(v)) if isinstance(v, UUID) else v for v in row) for row in rows]) == expected
+    assert encode_json([]) == b"[]"
@@ -0,0 +1,105 @@
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from src.app.core.logging import (
+    AsyncQueueHandler,
+    JsonFormatter,
+    RequestContextMiddleware,
+    SamplingFilter,
+    configure_logging,
+    parse_sample_rates,
+    request_id_var,
+)
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def make_record(name="app.test", level=logging.INFO, msg="hello %s", args=("world",), **extra):
+    record = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_parse_sample_rates():
+    assert parse_sample_rates(" app.access=0.1, app=2 ,") == {"app.access": 0.1, "app": 1.0}
+
+
+def test_sampling_uses_most_specific_prefix_and_spares_warnings():
+    sampler = SamplingFilter({"app": 1.0, "app.access": 0.0})
+    assert sampler.filter(make_record("app.auth"))
+    assert not sampler.filter(make_record("app.access"))
+    assert not sampler.filter(make_record("app.access.detail"))
+    assert sampler.filter(make_record("app.accessory"))
+    assert sampler.filter(make_record("app.access", level=logging.WARNING))
+
+
+def test_json_formatter_includes_request_id_extras_and_exception():
+    handler = AsyncQueueHandler(queue.Queue())
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = make_record(request_id="abc", duration_ms=1.5)
+        record.exc_info = sys.exc_info()
+    entry = json.loads(JsonFormatter().format(handler.prepare(record)))
+    assert entry["message"] == "hello world"
+    assert entry["request_id"] == "abc"
+    assert entry["duration_ms"] == 1.5
+    assert "ValueError: boom" in entry["exception"]
+    assert entry["level"] == "INFO"
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = AsyncQueueHandler(queue.Queue(maxsize=1))
+    handler.handle(make_record())
+    handler.handle(make_record())
+    assert handler.dropped == 1
+
+
+def test_records_reach_handlers_through_listener_with_request_id():
+    target = logging.getLogger("test.logging.pipeline")
+    target.propagate = False
+    sink = ListHandler()
+    listener = configure_logging(target, [sink], level=logging.INFO)
+    token = request_id_var.set("req-1")
+    try:
+        target.info("sent %d messages", 3, extra={"user": "u1"})
+    finally:
+        request_id_var.reset(token)
+        listener.stop()
+    [record] = sink.records
+    assert record.getMessage() == "sent 3 messages"
+    assert record.request_id == "req-1"
+    assert record.user == "u1"
+
+
+@pytest.mark.asyncio
+async def test_middleware_propagates_request_id():
+    seen = []
+    app = FastAPI()
+    app.add_middleware(RequestContextMiddleware)
+
+    @app.get("/")
+    async def endpoint():
+        seen.append(request_id_var.get())
+        return {}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        given = await client.get("/", headers={"X-Request-ID": "client-id"})
+        generated = await client.get("/")
+    assert given.headers["x-request-id"] == "client-id"
+    assert seen == ["client-id", generated.headers["x-request-id"]]
+    assert request_id_var.get() is None
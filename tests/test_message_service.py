@@ -1,29 +1,36 @@
+import json
+
 import pytest
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock, MagicMock
 from uuid import uuid4
 from datetime import datetime
+from sqlalchemy.dialects import postgresql
+from src.app.core.cache import MemoryCacheBackend
+from src.app.core.config import MESSAGE_BATCH_COPY_THRESHOLD
 from src.app.services.message_service import MessageService
 from src.app.db.message import Message
-from src.app.schemas.messages import MessageCreate
-from src.app.db.user import User  
+from src.app.schemas.messages import MessageCreate, MessageUpdate
+from src.app.db.user import User
 @pytest.fixture
 def db_session():
     mock_session = MagicMock()
     # Mock add, commit, refresh
     mock_session.add = MagicMock()
-    mock_session.commit = MagicMock()
-    mock_session.refresh = MagicMock()
-    # Mock query chain for get_messages
-    mock_query = MagicMock()
-    mock_query.filter.return_value.all.return_value = [
-        Message(user_id=1, content="test", sent_at=datetime.now(), chat_id=uuid4(), rating=1, role="user")
-    ]
-    mock_query.filter.return_value.first.return_value = Message(user_id=1, content="test", sent_at=datetime.now(), chat_id=uuid4(), rating=1, role="user")
-    mock_session.query.return_value = mock_query
+    mock_session.commit = AsyncMock()
+    mock_session.refresh = AsyncMock()
+    # Mock execute result chain for get_messages_page / update_message
+    mock_result = MagicMock()
+    mock_result.all.return_value = [(uuid4(), "test", 1, datetime.now(), "user", uuid4())]
+    mock_result.scalars.return_value.first.return_value = Message(user_id=1, content="test", sent_at=datetime.now(), chat_id=uuid4(), rating=1, role="user")
+    mock_session.execute = AsyncMock(return_value=mock_result)
+    connection = MagicMock()
+    connection.dialect.name = "postgresql"
+    mock_session.connection = AsyncMock(return_value=connection)
     return mock_session
 
-def test_send_message(db_session):
-    service = MessageService(db_session)
+@pytest.mark.asyncio
+async def test_send_message(db_session):
+    service = MessageService(db_session, cache=MemoryCacheBackend())
     data = MessageCreate(
         content="hello",
         sent_at=datetime.now(),
@@ -31,29 +38,59 @@ def test_send_message(db_session):
         rating=1,
         role="user"
     )
-    service.send_message(data, user_id=1)
-    db_session.add.assert_called()
-    db_session.commit.assert_called()
-    db_session.refresh.assert_called()
+    message_id = await service.send_message(data, user_id=1)
+    # Message insert and chat summary upsert go out as one statement.
+    [statement] = [call.args[0] for call in db_session.execute.await_args_list]
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+    assert sql.startswith("WITH write_0 AS \n(INSERT INTO messages")
+    assert "INSERT INTO chat_summaries" in sql
+    assert message_id is not None
+    db_session.add.assert_not_called()
+    db_session.commit.assert_awaited()
 
-def test_get_messages(db_session):
-    service = MessageService(db_session)
-    result = service.get_messages(user_id=1)
-    assert isinstance(result, list)
-    assert result[0].content == "test"
+@pytest.mark.asyncio
+async def test_get_messages_page(db_session):
+    service = MessageService(db_session, cache=MemoryCacheBackend())
+    page = await service.get_messages_page(user_id=1, version='"v1"')
+    assert page.count == 1
+    assert json.loads(page.body)[0]["content"] == "test"
 
-def test_update_message(db_session):
-    service = MessageService(db_session)
-    data = MessageCreate(
-        content="updated",
-        sent_at=datetime.now(),
-        chat_id=uuid4(),
-        rating=2,
-        role="ai"
-    )
-    updated = service.update_message(message_id=uuid4(), message_data=data, user_id=1)
-    assert updated.content == "updated"
-    assert updated.rating == 2
-    assert updated.role == "ai"
-    db_session.commit.assert_called()
-    db_session.refresh.assert_called()
+@pytest.mark.asyncio
+async def test_update_message(db_session):
+    service = MessageService(db_session, cache=MemoryCacheBackend())
+    row = Message(message_id=uuid4(), content="updated", sent_at=datetime.now(), chat_id=uuid4(), rating=2, role="ai")
+    db_session.execute.return_value.first.return_value = row
+    updated = await service.update_message(message_id=row.message_id, message_data=MessageUpdate(rating=2), user_id=1)
+    assert updated is row
+    [statement] = [call.args[0] for call in db_session.execute.await_args_list]
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+    # Only the fields sent are written, plus the bumped sent_at.
+    assert "UPDATE messages SET rating=%(rating)s, sent_at=%(sent_at)s" in sql
+    assert "content=" not in sql.split("UPDATE messages")[1]
+    assert sql.startswith("WITH write_0 AS \n(UPDATE chat_summaries")
+    assert "RETURNING" in sql
+    db_session.commit.assert_awaited()
+    db_session.refresh.assert_not_awaited()
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("size, expect_copy", [(3, False), (MESSAGE_BATCH_COPY_THRESHOLD, True)])
+async def test_send_messages_bulk_inserts_in_one_transaction(db_session, size, expect_copy):
+    connection = MagicMock()
+    connection.dialect.name = "postgresql"
+    connection.dialect.driver = "asyncpg"
+    connection.execute = AsyncMock()
+    raw_connection = MagicMock()
+    raw_connection.driver_connection.copy_records_to_table = AsyncMock()
+    connection.get_raw_connection = AsyncMock(return_value=raw_connection)
+    db_session.connection = AsyncMock(return_value=connection)
+    service = MessageService(db_session, cache=MemoryCacheBackend())
+    data = [
+        MessageCreate(content=f"m{i}", sent_at=datetime.now(), chat_id=uuid4(), rating=1, role="user")
+        for i in range(size)
+    ]
+    message_ids = await service.send_messages(data, user_id=1)
+    assert len(set(message_ids)) == size
+    copy = raw_connection.driver_connection.copy_records_to_table
+    assert copy.await_count == (1 if expect_copy else 0)
+    assert db_session.execute.await_count == 1
+    db_session.commit.assert_awaited_once()
@@ -0,0 +1,147 @@
+import asyncio
+import importlib.util
+import json
+import os
+import pathlib
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+import pytest_asyncio
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.app.core.cache import MemoryCacheBackend
+from src.app.core.config import make_async_url
+from src.app.db.base import Base
+from src.app.db.user import User
+from src.app.schemas.messages import MessageCreate
+from src.app.services.message_service import MessageService
+from src.app.services.message_stream import CLOSED, RESYNC, MessageStreamHub, Subscription, listen_dsn
+
+# A throwaway Postgres database; its tables are dropped and recreated.
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+MIGRATIONS = [pathlib.Path(__file__).parent.parent / "migrations" / "versions" / name
+              for name in ("3f2a9c7d1e84_message_notify.py", "9d41e6b2a7c3_message_notify_moves.py")]
+
+
+def message(chat_id, content, sent_at=datetime(2025, 1, 1)):
+    return MessageCreate(chat_id=chat_id, content=content, rating=1, sent_at=sent_at, role="user")
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_gets_one_resync_instead_of_a_backlog():
+    subscription = Subscription(uuid4(), max_queue=2)
+    for event in (b"1", b"2", b"3", b"4"):
+        subscription.offer(event)
+    assert subscription.overflows == 1
+    assert await subscription.get() is RESYNC
+    assert await subscription.get() == b"4"
+    assert subscription.qsize() == 0
+
+
+def test_notifications_for_users_without_subscribers_are_dropped():
+    hub = MessageStreamHub("postgresql://unused", session_factory=None)
+    subscription = hub.subscribe(uuid4())
+    hub.on_notify(None, 1, "message_events", json.dumps({"user_id": str(uuid4())}))
+    hub.on_notify(None, 1, "message_events", json.dumps({"user_id": subscription.user_id}))
+    hub.on_notify(None, 1, "message_events", "not json")
+    assert [event["user_id"] for event in hub._pending] == [subscription.user_id]
+    hub.unsubscribe(subscription)
+    assert hub.subscriber_count() == 0
+
+
+@pytest.mark.asyncio
+async def test_deliver_fetches_rows_once_and_filters_by_chat(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/stream.db")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    async with session_factory() as session:
+        user = User(username="cy", email="cy@example.com", hashed_password="x")
+        session.add(user)
+        await session.commit()
+        chat, other = uuid4(), uuid4()
+        [message_id] = await MessageService(session, cache=MemoryCacheBackend()).send_messages(
+            [message(chat, "hi")], user.id)
+
+    hub = MessageStreamHub("postgresql://unused", session_factory)
+    everything, same_chat, other_chat = (hub.subscribe(user.id), hub.subscribe(user.id, chat),
+                                         hub.subscribe(user.id, other))
+    await hub.deliver([{"op": "INSERT", "user_id": str(user.id), "message_id": str(message_id),
+                        "sent_at": "2025-01-01T00:00:00"}])
+    event = await everything.get()
+    assert json.loads(event)["event"] == "created"
+    assert json.loads(event)["message"]["content"] == "hi"
+    assert await same_chat.get() is event
+    assert other_chat.qsize() == 0
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def postgres():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    engine = create_async_engine(make_async_url(TEST_DATABASE_URL))
+    migrations = []
+    for path in MIGRATIONS:
+        spec = importlib.util.spec_from_file_location(path.stem, path)
+        migrations.append(importlib.util.module_from_spec(spec))
+        spec.loader.exec_module(migrations[-1])
+
+    def install(connection):
+        Base.metadata.drop_all(connection)
+        connection.exec_driver_sql("DROP FUNCTION IF EXISTS notify_message_event()")
+        Base.metadata.create_all(connection)
+        with Operations.context(MigrationContext.configure(connection)):
+            for migration in migrations:
+                migration.upgrade()
+
+    async with engine.begin() as connection:
+        await connection.run_sync(install)
+    yield engine
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.drop_all)
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_writes_reach_subscribers_through_listen_notify(postgres):
+    session_factory = async_sessionmaker(postgres, expire_on_commit=False)
+    hub = MessageStreamHub(listen_dsn(TEST_DATABASE_URL), session_factory)
+    hub.start()
+    try:
+        for _ in range(100):
+            if hub.connected:
+                break
+            await asyncio.sleep(0.05)
+        async with session_factory() as session:
+            user = User(username="di", email="di@example.com", hashed_password="x")
+            session.add(user)
+            await session.commit()
+            chat = uuid4()
+            subscription, elsewhere = hub.subscribe(user.id), hub.subscribe(user.id, uuid4())
+            service = MessageService(session, cache=MemoryCacheBackend())
+
+            await service.send_message(message(chat, "live"), user.id)
+            created = json.loads(await asyncio.wait_for(subscription.get(), 5))
+            assert created["event"] == "created"
+            assert created["message"]["content"] == "live"
+
+            await service.update_message(created["message"]["message_id"], message(chat, "edited"), user.id)
+            updated = json.loads(await asyncio.wait_for(subscription.get(), 5))
+            assert updated["event"] == "updated"
+            assert updated["message"]["content"] == "edited"
+            assert elsewhere.qsize() == 0
+    finally:
+        await hub.stop()
+
+
+def test_closing_subscriptions_replaces_their_backlog():
+    hub = MessageStreamHub("postgresql://unused", session_factory=None)
+    subscription = hub.subscribe(uuid4())
+    subscription.offer(b"1")
+    hub.close_subscriptions()
+    assert subscription.qsize() == 1
+    assert asyncio.run(subscription.get()) is CLOSED
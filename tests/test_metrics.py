@@ -0,0 +1,107 @@
+import pytest
+from sqlalchemy import text
+from src.app.core.instrumentation import _request_queries, instrument_engine, statement_fingerprint
+from src.app.core.metrics import MetricsRegistry, gauge_lines, merge_snapshots, retire_snapshot
+from src.app.db.pool import build_engine
+
+
+def test_statement_fingerprint_collapses_parameters_and_lists():
+    assert statement_fingerprint("SELECT * FROM users WHERE id = $1 AND email = 'a@b.c'") == \
+        "SELECT * FROM users WHERE id = ? AND email = ?"
+    assert statement_fingerprint("SELECT 1 FROM t WHERE id IN (?, ?, ?)") == "SELECT ? FROM t WHERE id IN (?)"
+    assert statement_fingerprint("INSERT INTO t (a, b) VALUES (%(a_0)s, %(b_0)s), (%(a_1)s, %(b_1)s)") == \
+        "INSERT INTO t (a, b) VALUES (?, ?)"
+
+
+def test_registry_renders_prometheus_text_format():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests.", ("route",))
+    latency = registry.histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1))
+    requests.inc("/a")
+    requests.inc("/a", amount=2)
+    latency.observe("/a", value=0.5)
+    registry.register_collector(lambda: gauge_lines("queued", "Queued.", [({}, 4)]))
+
+    lines = registry.render().splitlines()
+    assert "# TYPE requests_total counter" in lines
+    assert 'requests_total{route="/a"} 3' in lines
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 0' in lines
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 1' in lines
+    assert 'latency_seconds_count{route="/a"} 1' in lines
+    assert "queued 4" in lines
+
+
+def test_worker_snapshots_merge_counters_and_label_gauges(tmp_path):
+    def worker(name, requests, seconds, in_flight):
+        registry = MetricsRegistry()
+        registry.counter("requests_total", "Requests.", ("route",)).inc("/a b", amount=requests)
+        registry.histogram("latency_seconds", "Latency.", buckets=(1,)).observe(value=seconds)
+        registry.gauge("in_flight", "In flight.").set(value=in_flight)
+        registry.share(str(tmp_path), name)
+        return registry
+
+    first, second = worker("101", 2, 0.5, 1), worker("102", 3, 2.0, 4)
+    first.write_snapshot()
+    lines = second.render_all().splitlines()
+    assert lines.count("# TYPE requests_total counter") == 1
+    assert 'requests_total{route="/a b"} 5' in lines
+    assert 'latency_seconds_bucket{le="1"} 1' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 2' in lines
+    assert "latency_seconds_sum 2.5" in lines
+    assert 'in_flight{worker="101"} 1' in lines and 'in_flight{worker="102"} 4' in lines
+
+    # An exited worker's totals stay; its gauges go.
+    retire_snapshot(str(tmp_path), "101")
+    retire_snapshot(str(tmp_path), "102")
+    worker("103", 1, 0.1, 0).write_snapshot()
+    lines = merge_snapshots(str(tmp_path)).splitlines()
+    assert 'requests_total{route="/a b"} 6' in lines
+    assert "latency_seconds_count 3" in lines
+    assert [line for line in lines if line.startswith("in_flight")] == ['in_flight{worker="103"} 0']
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["103.prom", "retired.prom"]
+
+
+@pytest.mark.asyncio
+async def test_instrumented_engine_counts_statements_per_request(tmp_path):
+    engine = build_engine(f"sqlite+aiosqlite:///{tmp_path}/metrics.db", name="test-metrics")
+    instrument_engine(engine)
+    queries = [0]
+    token = _request_queries.set(queries)
+    try:
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+            await connection.execute(text("SELECT 2"))
+        assert queries[0] == 2
+    finally:
+        _request_queries.reset(token)
+        await engine.dispose()
+
+
+def test_diagnostics_are_closed_without_a_configured_token(monkeypatch):
+    from fastapi import HTTPException
+    from src.app.api.v1 import diagnostics_router
+
+    monkeypatch.setattr(diagnostics_router, "DIAGNOSTICS_TOKEN", None)
+    with pytest.raises(HTTPException):
+        diagnostics_router.require_diagnostics_token(None)
+    with pytest.raises(HTTPException):
+        diagnostics_router.require_diagnostics_token("")
+
+    monkeypatch.setattr(diagnostics_router, "DIAGNOSTICS_TOKEN", "s3cret")
+    diagnostics_router.require_diagnostics_token("s3cret")
+    for wrong in (None, "s3cre", "s3cret ", "ß3cret"):
+        with pytest.raises(HTTPException):
+            diagnostics_router.require_diagnostics_token(wrong)
+
+
+@pytest.mark.asyncio
+async def test_pool_diagnostics_cover_every_replica(monkeypatch):
+    from src.app.api.v1 import diagnostics_router
+    from src.app.db.replicas import ReplicaSet
+
+    replica = build_engine("sqlite+aiosqlite://", name="replica-0")
+    monkeypatch.setattr(diagnostics_router, "replicas", ReplicaSet(diagnostics_router.engine, [replica]))
+    stats = await diagnostics_router.get_pool_stats()
+    assert list(stats) == ["primary", "replica-0"]
+    assert stats["replica-0"]["checkouts"] == 0
+    await replica.dispose()
@@ -0,0 +1,18 @@
+import pytest
+from uuid import uuid4
+from datetime import datetime
+from src.app.services.pagination import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    sent_at = datetime(2025, 9, 7, 12, 34, 56, 123456)
+    message_id = uuid4()
+    cursor = encode_cursor(sent_at, message_id)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (sent_at, message_id)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", "W10", "WyJ4IiwieSJd"])
+def test_decode_cursor_rejects_garbage(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
@@ -0,0 +1,47 @@
+from datetime import date, datetime
+from unittest.mock import AsyncMock, MagicMock
+from uuid import uuid4
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from src.app.core.cache import MemoryCacheBackend
+# Registers the User mapper that Message refers to.
+from src.app.db import user  # noqa: F401
+from src.app.db.partitions import add_months, parse_partition_name, partition_name, plan_maintenance
+from src.app.services.message_service import MessageService
+
+
+def test_month_arithmetic_and_names():
+    assert add_months(date(2025, 11, 1), 3) == date(2026, 2, 1)
+    assert add_months(date(2025, 1, 1), -1) == date(2024, 12, 1)
+    assert partition_name(date(2025, 3, 1)) == "messages_p202503"
+    assert parse_partition_name("messages_p202503") == date(2025, 3, 1)
+    assert parse_partition_name("messages_default") is None
+
+
+def test_plan_creates_missing_future_months():
+    existing = [date(2025, 5, 1), date(2025, 6, 1)]
+    to_create, to_retire = plan_maintenance(existing, date(2025, 6, 17), premake=2, retention=0)
+    assert to_create == [date(2025, 7, 1), date(2025, 8, 1)]
+    assert to_retire == []
+
+
+def test_plan_retires_only_partitions_fully_past_retention():
+    existing = [date(2024, 12, 1), date(2025, 1, 1), date(2025, 2, 1), date(2025, 3, 1)]
+    _, to_retire = plan_maintenance(existing, date(2025, 4, 10), premake=0, retention=2)
+    # Keep February and March (two months back from April); January is entirely older.
+    assert to_retire == [date(2024, 12, 1), date(2025, 1, 1)]
+
+
+@pytest.mark.asyncio
+async def test_keyset_page_carries_a_prunable_time_bound():
+    session = MagicMock()
+    result = MagicMock()
+    result.all.return_value = []
+    session.execute = AsyncMock(return_value=result)
+    cursor = (datetime(2025, 3, 5, 12), uuid4())
+    service = MessageService(session, cache=MemoryCacheBackend())
+    await service.get_messages_page(uuid4(), after=cursor, version='"v1"')
+    sql = str(session.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert "messages.sent_at <= %(sent_at_1)s" in sql
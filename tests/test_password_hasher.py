@@ -0,0 +1,25 @@
+import asyncio
+import pytest
+from passlib.context import CryptContext
+from src.app.services.password_hasher import HasherOverloaded, PasswordHasher
+
+
+@pytest.mark.asyncio
+async def test_verify_and_rehash_when_cost_changes():
+    old = PasswordHasher(CryptContext(schemes=["bcrypt"], bcrypt__rounds=4))
+    new = PasswordHasher(CryptContext(schemes=["bcrypt"], bcrypt__rounds=5))
+    hashed = await old.hash("secret")
+
+    assert await old.verify_and_update("secret", hashed) == (True, None)
+    assert await new.verify_and_update("wrong", hashed) == (False, None)
+    valid, new_hash = await new.verify_and_update("secret", hashed)
+    assert valid and new_hash.startswith("$2b$05$")
+    assert await new.verify_and_update("secret", new_hash) == (True, None)
+
+
+@pytest.mark.asyncio
+async def test_fails_fast_when_queue_is_full():
+    hasher = PasswordHasher(CryptContext(schemes=["bcrypt"], bcrypt__rounds=4), max_workers=1, max_pending=2)
+    results = await asyncio.gather(*(hasher.hash("secret") for _ in range(3)), return_exceptions=True)
+    assert sum(isinstance(r, HasherOverloaded) for r in results) == 1
+    assert hasher.pending == 0
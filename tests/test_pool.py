@@ -0,0 +1,39 @@
+import asyncio
+import pytest
+from sqlalchemy import text
+from src.app.db.pool import InstrumentedAsyncPool, build_engine, pool_stats, warm_pool
+
+
+@pytest.mark.asyncio
+async def test_pool_stats_track_checkouts_and_wait(tmp_path):
+    engine = build_engine(f"sqlite+aiosqlite:///{tmp_path}/pool.db", name="test-pool")
+    try:
+        assert isinstance(engine.sync_engine.pool, InstrumentedAsyncPool)
+
+        async def query():
+            async with engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(query() for _ in range(3)))
+        stats = pool_stats(engine)
+        assert stats["checkouts"] == stats["checkins"] == 3
+        assert stats["checkout_wait_seconds"]["count"] == 3
+        assert stats["peak_in_use"] == 3
+        assert stats["in_use"] == 0
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_warm_pool_leaves_connections_idle_in_the_pool(tmp_path):
+    engine = build_engine(f"sqlite+aiosqlite:///{tmp_path}/warm.db", name="test-warm")
+    try:
+        assert await warm_pool(engine, 3) == 3
+        stats = pool_stats(engine)
+        assert stats["connects"] == 3
+        assert (stats["idle"], stats["in_use"]) == (3, 0)
+        # Never more than the pool keeps.
+        assert await warm_pool(engine, 100) == stats["size"]
+    finally:
+        await engine.dispose()
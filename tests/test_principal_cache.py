@@ -0,0 +1,58 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+from uuid import uuid4
+from fastapi import HTTPException
+from src.app.api.dependencies import get_current_user
+from src.app.core.principal_cache import invalidate_principal, principal_cache
+from src.app.db.user import User
+from src.app.services.auth_service import AuthService
+
+
+@pytest.fixture
+def user():
+    principal_cache.clear()
+    return User(id=uuid4(), username="ana", email="ana@example.com", hashed_password="x")
+
+
+@pytest.fixture
+def db_session(user):
+    mock_session = MagicMock()
+    mock_result = MagicMock()
+    mock_result.scalars.return_value.first.return_value = user
+    mock_session.execute = AsyncMock(return_value=mock_result)
+    return mock_session
+
+
+def make_request(token):
+    request = MagicMock()
+    request.headers = {"authorization": f"Bearer {token}"}
+    request.state = SimpleNamespace()
+    return request
+
+
+@pytest.mark.asyncio
+async def test_repeat_token_skips_user_lookup(user, db_session):
+    token = AuthService.create_access_token({"sub": str(user.id)})
+    first = await get_current_user(make_request(token), db_session)
+    second = await get_current_user(make_request(token), db_session)
+    assert first.id == second.id == user.id
+    assert db_session.execute.await_count == 1
+    assert principal_cache.stats()["hits"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_invalidated_user_is_looked_up_again(user, db_session):
+    token = AuthService.create_access_token({"sub": str(user.id)})
+    await get_current_user(make_request(token), db_session)
+    invalidate_principal(user.id)
+    await get_current_user(make_request(token), db_session)
+    assert db_session.execute.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_invalid_token_is_rejected_without_db(db_session):
+    with pytest.raises(HTTPException) as exc:
+        await get_current_user(make_request("not-a-jwt"), db_session)
+    assert exc.value.status_code == 401
+    db_session.execute.assert_not_awaited()
@@ -0,0 +1,79 @@
+import os
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.app.core.cache import MemoryCacheBackend
+from src.app.core.config import make_async_url
+from src.app.db.base import Base
+from src.app.db.user import User
+from src.app.schemas.messages import MessageCreate, MessageUpdate
+from src.app.services.message_service import MessageService
+
+# A throwaway Postgres database; its tables are dropped and recreated.
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+# Statements per call. Postgres folds each write into one statement;
+# SQLite has no data-modifying CTEs and pays one per table.
+BUDGETS = {
+    "send_message": {"postgresql": 1, "sqlite": 3},
+    "send_messages": {"postgresql": 1, "sqlite": 3},
+    "update_message": {"postgresql": 1, "sqlite": 3},
+    # As GET /messages/ reads it: the ETag, then the page cached under it.
+    "get_messages_page": {"postgresql": 2, "sqlite": 2},
+    "list_chats": {"postgresql": 1, "sqlite": 1},
+}
+
+
+@pytest_asyncio.fixture(params=["sqlite", "postgresql"])
+async def engine(request, tmp_path):
+    if request.param == "sqlite":
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/budgets.db")
+    elif TEST_DATABASE_URL:
+        engine = create_async_engine(make_async_url(TEST_DATABASE_URL))
+    else:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.drop_all)
+        await connection.run_sync(Base.metadata.create_all)
+    yield engine
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.drop_all)
+    await engine.dispose()
+
+
+def message(chat_id, content, rating=1):
+    return MessageCreate(chat_id=chat_id, content=content, rating=rating, sent_at=datetime(2025, 1, 1), role="user")
+
+
+@pytest.mark.asyncio
+async def test_hot_paths_stay_within_their_statement_budgets(engine, query_budget):
+    budgets = {name: limits[engine.dialect.name] for name, limits in BUDGETS.items()}
+    async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+        user = User(username="bo", email="bo@example.com", hashed_password="x")
+        session.add(user)
+        await session.commit()
+        # Open the session's transaction so BEGIN-time work doesn't count.
+        await session.connection()
+        service = MessageService(session, cache=MemoryCacheBackend())
+        chat = uuid4()
+
+        with query_budget(engine, budgets["send_message"]):
+            message_id = await service.send_message(message(chat, "hello", rating=4), user.id)
+        with query_budget(engine, budgets["send_messages"]):
+            await service.send_messages([message(chat, "one"), message(uuid4(), "two")], user.id)
+        with query_budget(engine, budgets["update_message"]):
+            edited = await service.update_message(message_id, MessageUpdate(rating=2), user.id)
+        with query_budget(engine, budgets["get_messages_page"]):
+            etag = await service.messages_etag(user.id, chat, "messages")
+            page = await service.get_messages_page(user.id, chat_id=chat, version=etag)
+        with query_budget(engine, budgets["list_chats"]):
+            chats = await service.list_chats(user.id)
+
+    assert (edited.message_id, edited.content, edited.rating) == (message_id, "hello", 2)
+    assert page.count == 2
+    [summary] = [summary for summary in chats if summary.chat_id == chat]
+    assert (summary.message_count, summary.average_rating, summary.last_message_preview) == (2, 1.5, "hello")
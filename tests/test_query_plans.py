@@ -0,0 +1,274 @@
+"""EXPLAIN (ANALYZE, BUFFERS) every statement MessageService and AuthService issue.
+
+Needs PLAN_DATABASE_URL: a Postgres database migrated to head (alembic
+upgrade head), so the real indexes and partitions are in place. If it has
+no messages yet, a small skewed dataset is seeded into it first; seed a
+production-sized one with ``python -m benchmarks.seed`` to check plans at
+scale. Each scenario runs the service call inside a transaction that is
+rolled back, records the statements it executed, then replays each under
+EXPLAIN and checks the plan:
+
+* no sequential scan may read more than a few blocks: the planner rightly
+  prefers one for an empty or nearly empty partition, such as the month
+  that just started, and those are not counted against the budget;
+* rows examined and shared buffers touched must stay within the
+  scenario's budget, which for keyset reads is a small multiple of the page
+  size, not of the table size.
+"""
+import os
+from contextlib import contextmanager
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from benchmarks.seed import SEED_PASSWORD, Dataset, seed
+from src.app.core.cache import MemoryCacheBackend
+from src.app.core.config import make_async_url
+from src.app.schemas.messages import MessageCreate, MessageUpdate
+from src.app.schemas.user import LoginSchema, UserCreate
+from src.app.services.auth_service import AuthService
+from src.app.services.message_service import MessageService
+from src.app.services.pagination import decode_cursor, encode_cursor
+from src.app.services.rating_stats import DEFAULT_RANGES, ceil_to
+
+PLAN_DATABASE_URL = os.getenv("PLAN_DATABASE_URL")
+pytestmark = pytest.mark.skipif(not PLAN_DATABASE_URL, reason="PLAN_DATABASE_URL is not set")
+
+PAGE = 50
+# Scan nodes whose rows count as "examined"; everything else consumes their output.
+SCANS = {"Seq Scan", "Index Scan", "Index Only Scan", "Bitmap Heap Scan"}
+SMALL_SCAN_BLOCKS = 8
+STATEMENT_KINDS = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+
+class Subject:
+    """The heaviest user of the dataset: skew makes them the worst case for every per-user query."""
+
+    def __init__(self, user_id, email, chats, chat_id, message_id, cursor, term, history, chat_history, matches,
+                 partitions, stats_rows):
+        self.user_id = user_id
+        self.email = email
+        self.chats = chats
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.cursor = cursor
+        self.term = term
+        self.history = history
+        self.chat_history = chat_history
+        self.matches = matches
+        self.partitions = partitions
+        self.stats_rows = stats_rows
+
+
+async def pick_subject(connection) -> Subject:
+    user_id, email, chats, history = (await connection.execute(text(
+        "SELECT users.id, users.email, count(*), sum(message_count) FROM chat_summaries"
+        " JOIN users ON users.id = chat_summaries.user_id"
+        " GROUP BY users.id, users.email ORDER BY 4 DESC LIMIT 1"
+    ))).one()
+    chat_id, chat_history = (await connection.execute(text(
+        "SELECT chat_id, message_count FROM chat_summaries WHERE user_id = :user_id"
+        " ORDER BY message_count DESC LIMIT 1"
+    ), {"user_id": user_id})).one()
+    message_id, content = (await connection.execute(text(
+        "SELECT message_id, content FROM messages WHERE user_id = :user_id"
+        " ORDER BY sent_at DESC, message_id DESC LIMIT 1"
+    ), {"user_id": user_id})).one()
+    middle = (await connection.execute(text(
+        "SELECT sent_at, message_id FROM messages WHERE user_id = :user_id"
+        " ORDER BY sent_at DESC, message_id DESC OFFSET :offset LIMIT 1"
+    ), {"user_id": user_id, "offset": history // 2})).one()
+    # The longest word of the newest message: present, but not in everything.
+    term = max(content.split(), key=len)
+    matches = await connection.scalar(text(
+        "SELECT count(*) FROM messages WHERE user_id = :user_id"
+        " AND search_vector @@ to_tsquery('simple', :term)"
+    ), {"user_id": user_id, "term": term})
+    partitions = await connection.scalar(text(
+        "SELECT count(*) FROM pg_inherits WHERE inhparent = CAST('messages' AS regclass)"
+    ))
+    stats_rows = await connection.scalar(text(
+        "SELECT count(*) FROM rating_rollups WHERE user_id = :user_id AND granularity = 'day'"
+        " AND bucket_start >= :start AND bucket_start < :end AND message_count > 0"
+    ), {"user_id": user_id, **stats_range()})
+    return Subject(user_id, email, chats, chat_id, message_id, encode_cursor(*middle), term, history, chat_history,
+                   matches, max(partitions, 1), stats_rows)
+
+
+def stats_range():
+    end = ceil_to(datetime.now(), "day")
+    return {"start": end - DEFAULT_RANGES["day"], "end": end}
+
+
+def message(chat_id, content="plan check"):
+    return MessageCreate(chat_id=chat_id, content=content, rating=3, sent_at=datetime.now(), role="user")
+
+
+# name -> (call, budget). A budget maps "rows" (examined) and "buffers"
+# (shared hit + read) to a limit, or to a function of the Subject. A keyset
+# page reads its rows plus about one per partition the merge looks into.
+KEYSET_PAGE = {"rows": lambda s: PAGE + 2 * s.partitions, "buffers": lambda s: 4 * PAGE + 10 * s.partitions}
+SCENARIOS = {
+    "get_messages_page": (
+        lambda service, db, s: service.get_messages_page(s.user_id, limit=PAGE),
+        KEYSET_PAGE,
+    ),
+    "get_messages_page_after_cursor": (
+        lambda service, db, s: service.get_messages_page(s.user_id, limit=PAGE, after=decode_cursor(s.cursor)),
+        KEYSET_PAGE,
+    ),
+    "get_chat_messages_page": (
+        lambda service, db, s: service.get_messages_page(s.user_id, limit=PAGE, chat_id=s.chat_id),
+        # For a busy chat the planner walks the user's index and filters by
+        # chat, skipping the user's other chats on the way.
+        {"rows": lambda s: (PAGE + 2 * s.partitions) * s.history // s.chat_history,
+         "buffers": lambda s: 4 * PAGE + 10 * s.partitions},
+    ),
+    "list_chats": (
+        lambda service, db, s: service.list_chats(s.user_id, limit=PAGE),
+        {"rows": PAGE, "buffers": PAGE + 10},
+    ),
+    "messages_etag": (
+        lambda service, db, s: service.messages_etag(s.user_id, None, "messages", PAGE, None),
+        {"rows": lambda s: s.chats, "buffers": lambda s: s.chats + 10},
+    ),
+    "chat_etag": (
+        lambda service, db, s: service.messages_etag(s.user_id, s.chat_id, "chats", PAGE, None),
+        {"rows": 1, "buffers": 10},
+    ),
+    "rating_stats": (
+        lambda service, db, s: service.rating_stats(s.user_id, bucket="day", **stats_range()),
+        # Reads exactly the rollup rows it returns; the index carries their counts.
+        {"rows": lambda s: s.stats_rows, "buffers": lambda s: s.stats_rows + 20},
+    ),
+    "search_messages": (
+        lambda service, db, s: service.search_messages(s.user_id, s.term, limit=PAGE),
+        # Ranking has to see every match, so the budget follows the match count.
+        {"rows": lambda s: 2 * s.matches + PAGE, "buffers": lambda s: 3 * s.matches + 40 * s.partitions},
+    ),
+    "export_history": (
+        lambda service, db, s: drain(service.iter_message_batches(s.user_id, chat_id=s.chat_id)),
+        {"rows": lambda s: s.chat_history, "buffers": lambda s: s.chat_history + 20 * s.partitions},
+    ),
+    "send_message": (
+        lambda service, db, s: service.send_message(message(s.chat_id), s.user_id),
+        {"rows": 0, "buffers": 100},
+    ),
+    "send_messages": (
+        lambda service, db, s: service.send_messages([message(s.chat_id), message(uuid4())], s.user_id),
+        {"rows": 0, "buffers": 150},
+    ),
+    "update_message": (
+        lambda service, db, s: service.update_message(s.message_id, MessageUpdate(content="edited", rating=1),
+                                                      s.user_id),
+        # The edit's, the summary's and each rollup granularity's lookups of the old row, each one index probe.
+        {"rows": 8, "buffers": lambda s: 10 * s.partitions + 50},
+    ),
+    "login": (
+        lambda service, db, s: AuthService.login(LoginSchema(email=s.email, password=SEED_PASSWORD), db),
+        {"rows": 1, "buffers": 10},
+    ),
+    "register_existing_email": (
+        lambda service, db, s: AuthService.register(
+            UserCreate(username=f"plan-{uuid4().hex[:8]}", email=s.email, password="x"), db),
+        {"rows": 1, "buffers": 10},
+    ),
+}
+
+
+async def drain(batches):
+    async for _ in batches:
+        pass
+
+
+def walk(node):
+    yield node
+    for child in node.get("Plans", ()):
+        yield from walk(child)
+
+
+def examined(node) -> int:
+    read = node["Actual Rows"] + node.get("Rows Removed by Filter", 0) + node.get("Rows Removed by Index Recheck", 0)
+    return int(read * node["Actual Loops"])
+
+
+def plan_problems(plan: dict, budget: dict, subject: Subject) -> list:
+    limit = {key: value(subject) if callable(value) else value for key, value in budget.items()}
+    root, problems, rows = plan["Plan"], [], 0
+    for node in walk(root):
+        if node["Node Type"] == "Seq Scan":
+            blocks = node.get("Shared Hit Blocks", 0) + node.get("Shared Read Blocks", 0)
+            if blocks > SMALL_SCAN_BLOCKS:
+                problems.append(f"sequential scan of {node['Relation Name']} read {blocks} blocks"
+                                f" and {examined(node)} rows")
+        elif node["Node Type"] in SCANS:
+            rows += examined(node)
+    buffers = root.get("Shared Hit Blocks", 0) + root.get("Shared Read Blocks", 0)
+    if rows > limit["rows"]:
+        problems.append(f"examined {rows} rows, budget {limit['rows']}")
+    if buffers > limit["buffers"]:
+        problems.append(f"touched {buffers} buffers, budget {limit['buffers']}")
+    return problems
+
+
+@contextmanager
+def recorded_statements(connection):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(STATEMENT_KINDS):
+            statements.append((statement, parameters))
+
+    event.listen(connection.sync_connection, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(connection.sync_connection, "before_cursor_execute", record)
+
+
+@pytest_asyncio.fixture
+async def plan_connection():
+    engine = create_async_engine(make_async_url(PLAN_DATABASE_URL))
+    async with engine.connect() as connection:
+        empty = not await connection.scalar(text("SELECT EXISTS (SELECT 1 FROM messages)"))
+    if empty:
+        await seed(engine, Dataset(users=300, messages=200_000, chats_per_user=8, months=12, skew=1.2, seed=1),
+                   log=lambda line: None)
+    async with engine.connect() as connection:
+        transaction = await connection.begin()
+        yield connection
+        await transaction.rollback()
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("name", list(SCENARIOS))
+async def test_service_queries_use_indexes_within_budget(plan_connection, name):
+    call, budget = SCENARIOS[name]
+    subject = await pick_subject(plan_connection)
+
+    # Run the call for real (commits become savepoints) to learn its statements, then undo it.
+    savepoint = await plan_connection.begin_nested()
+    session = AsyncSession(bind=plan_connection, join_transaction_mode="create_savepoint", expire_on_commit=False)
+    with recorded_statements(plan_connection) as statements:
+        await call(MessageService(session, cache=MemoryCacheBackend()), session, subject)
+    await session.close()
+    await savepoint.rollback()
+    assert statements, f"{name} executed no statements"
+
+    # Replay them in order under EXPLAIN ANALYZE, which executes writes too, then undo again.
+    problems = []
+    savepoint = await plan_connection.begin_nested()
+    for statement, parameters in statements:
+        result = await plan_connection.exec_driver_sql(
+            "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement, parameters)
+        # asyncpg decodes the json column itself.
+        [plan] = result.scalar()
+        problems += [f"{problem}\n  in: {' '.join(statement.split())[:300]}"
+                     for problem in plan_problems(plan, budget, subject)]
+    await savepoint.rollback()
+    assert not problems, f"{name}:\n" + "\n".join(problems)
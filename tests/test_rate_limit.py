@@ -0,0 +1,110 @@
+import multiprocessing
+
+import httpx
+import pytest
+from fastapi import Depends, FastAPI
+
+from src.app.core.exception_handlers import rate_limit_handler
+from src.app.core.rate_limit import (
+    RateLimiter,
+    RateLimitExceeded,
+    RedisStorage,
+    SharedMemoryStorage,
+    parse_limit,
+    sliding_window_retry_after,
+)
+from src.app.core.resp import RespClient
+from src.app.services.auth_service import AuthService
+
+
+def test_parse_limit():
+    assert parse_limit("10/minute") == (10, 60)
+    assert parse_limit("100 / 5 minutes") == (100, 300)
+    with pytest.raises(ValueError):
+        parse_limit("ten per minute")
+
+
+def test_sliding_window_weights_previous_window():
+    # 10 hits last window, 30s into this one: ~5 still count.
+    assert sliding_window_retry_after(4, 10, 30, 10, 60) == 0
+    assert sliding_window_retry_after(5, 10, 30, 10, 60) == pytest.approx(6)
+    # Current window full: wait for it to become the previous one and decay.
+    assert sliding_window_retry_after(10, 0, 30, 10, 60) == pytest.approx(36)
+
+
+def _hit_from_other_process(path, results):
+    storage = SharedMemoryStorage(path, slots=64)
+    results.put(storage._acquire("ip:1.2.3.4", 2, 60, now=10))
+
+
+@pytest.mark.asyncio
+async def test_shared_memory_storage_is_shared_between_processes(tmp_path):
+    path = str(tmp_path / "ratelimit")
+    storage = SharedMemoryStorage(path, slots=64)
+    assert await storage.acquire("ip:1.2.3.4", 2, 60, now=5) == 0
+
+    results = multiprocessing.get_context("spawn").Queue()
+    process = multiprocessing.get_context("spawn").Process(target=_hit_from_other_process, args=(path, results))
+    process.start()
+    process.join(30)
+    assert results.get(timeout=5) == 0
+
+    assert await storage.acquire("ip:1.2.3.4", 2, 60, now=15) == pytest.approx(75)
+    assert await storage.acquire("ip:5.6.7.8", 2, 60, now=15) == 0
+
+
+@pytest.mark.asyncio
+async def test_shared_memory_storage_survives_full_probe_range(tmp_path):
+    storage = SharedMemoryStorage(str(tmp_path / "ratelimit"), slots=4)
+    for index in range(20):
+        assert await storage.acquire(f"ip:{index}", 1, 60, now=0) == 0
+    assert await storage.acquire("ip:19", 1, 60, now=1) > 0
+
+
+@pytest.mark.asyncio
+async def test_redis_storage_counts_only_allowed_hits(resp_server):
+    client = RespClient(port=resp_server.port)
+    storage = RedisStorage(client)
+    try:
+        assert await storage.acquire("user:a", 1, 60, now=0) == 0
+        assert await storage.acquire("user:a", 1, 60, now=1) > 0
+        assert await storage.acquire("user:a", 1, 60, now=2) > 0
+        assert resp_server.data[b"ratelimit:user:a:0"][0] == b"1"
+    finally:
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_redis_storage_fails_open():
+    client = RespClient(port=1, timeout=0.1)
+    assert await RedisStorage(client).acquire("user:a", 1, 60) == 0
+
+
+@pytest.mark.asyncio
+async def test_limiter_rejects_before_database_dependency(tmp_path):
+    limiter = RateLimiter(storage=SharedMemoryStorage(str(tmp_path / "ratelimit"), slots=64), enabled=True)
+    sessions_opened = 0
+
+    async def get_db():
+        nonlocal sessions_opened
+        sessions_opened += 1
+        yield None
+
+    app = FastAPI()
+    app.add_exception_handler(RateLimitExceeded, rate_limit_handler)
+
+    @app.get("/", dependencies=[Depends(limiter.limit("1/minute", "test"))])
+    async def endpoint(db=Depends(get_db)):
+        return {}
+
+    token = AuthService.create_access_token({"sub": "user-1"})
+    headers = {"Authorization": f"Bearer {token}"}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        assert (await client.get("/", headers=headers)).status_code == 200
+        limited = await client.get("/", headers=headers)
+        assert limited.status_code == 429
+        assert int(limited.headers["Retry-After"]) >= 1
+        # Another subject from the same address has its own budget.
+        other = AuthService.create_access_token({"sub": "user-2"})
+        assert (await client.get("/", headers={"Authorization": f"Bearer {other}"})).status_code == 200
+    assert sessions_opened == 2
@@ -0,0 +1,121 @@
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.app.core.cache import MemoryCacheBackend
+from src.app.core.config import make_async_url
+from src.app.db.base import Base
+from src.app.db.rating_rollup import RatingRollup
+from src.app.db.user import User
+from src.app.schemas.messages import MessageCreate, MessageUpdate, RatingStats
+from src.app.services.message_service import MessageService
+from src.app.services.rating_stats import backfill, ceil_to, encode_stats, floor_to, fold_buckets, naive_utc
+
+# A throwaway Postgres database; its tables are dropped and recreated.
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+START = datetime(2025, 3, 1)
+
+
+@pytest_asyncio.fixture(params=["sqlite", "postgresql"])
+async def engine(request, tmp_path):
+    if request.param == "sqlite":
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/stats.db")
+    elif TEST_DATABASE_URL:
+        engine = create_async_engine(make_async_url(TEST_DATABASE_URL))
+    else:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.drop_all)
+        await connection.run_sync(Base.metadata.create_all)
+    yield engine
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.drop_all)
+    await engine.dispose()
+
+
+def message(chat_id, rating, sent_at, role="user"):
+    return MessageCreate(chat_id=chat_id, content="hi", rating=rating, sent_at=sent_at, role=role)
+
+
+async def rollup_rows(session):
+    result = await session.execute(select(RatingRollup).filter(RatingRollup.message_count != 0))
+    return sorted((row.user_id, row.granularity, row.bucket_start, row.chat_id, row.role, row.rating,
+                   row.message_count) for row in result.scalars())
+
+
+def test_bucket_bounds():
+    value = datetime(2025, 3, 1, 13, 30, 5)
+    assert floor_to(value, "hour") == datetime(2025, 3, 1, 13)
+    assert floor_to(value, "day") == datetime(2025, 3, 1)
+    assert ceil_to(value, "hour") == datetime(2025, 3, 1, 14)
+    assert ceil_to(datetime(2025, 3, 2), "day") == datetime(2025, 3, 2)
+    assert naive_utc(datetime(2025, 3, 1, 14, tzinfo=timezone(timedelta(hours=1)))) == datetime(2025, 3, 1, 13)
+
+
+
+def test_encoded_stats_match_the_response_model():
+    chat = uuid4()
+    buckets = fold_buckets([(chat, "user", START, 2, 1), (chat, "user", START, 5, 3), (chat, "ai", START, 1, 2)])
+    assert [(entry["role"], entry["message_count"], entry["average_rating"]) for entry in buckets] == [
+        ("user", 4, 4.25), ("ai", 2, 1.0)]
+    body = encode_stats("day", START, START + timedelta(days=1), buckets)
+    model = RatingStats(bucket="day", start=START, end=START + timedelta(days=1), buckets=buckets)
+    assert json.loads(body) == json.loads(model.model_dump_json())
+
+
+@pytest.mark.asyncio
+async def test_rollups_follow_writes_and_match_a_backfill(engine):
+    async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+        user = User(username="cy", email="cy@example.com", hashed_password="x")
+        session.add(user)
+        await session.commit()
+        service = MessageService(session, cache=MemoryCacheBackend())
+        chat, other = uuid4(), uuid4()
+
+        first = await service.send_message(message(chat, 5, START + timedelta(minutes=10)), user.id)
+        await service.send_messages([
+            message(chat, 3, START + timedelta(minutes=20)),
+            message(chat, 5, START + timedelta(hours=1, minutes=5)),
+            message(chat, 4, START + timedelta(hours=2), role="ai"),
+            message(other, 1, START + timedelta(days=1)),
+        ], user.id)
+
+        hourly = await service.rating_stats(user.id, START, START + timedelta(days=2), bucket="hour")
+        assert [(entry["bucket_start"], entry["role"], entry["message_count"], entry["average_rating"],
+                 entry["ratings"]) for entry in hourly[:3]] == [
+            (START, "user", 2, 4.0, {3: 1, 5: 1}),
+            (START + timedelta(hours=1), "user", 1, 5.0, {5: 1}),
+            (START + timedelta(hours=2), "ai", 1, 4.0, {4: 1}),
+        ]
+        daily = await service.rating_stats(user.id, START, START + timedelta(days=2), bucket="day", chat_id=chat)
+        assert [(entry["bucket_start"], entry["role"], entry["message_count"], entry["ratings"])
+                for entry in daily] == [
+            (START, "ai", 1, {4: 1}),
+            (START, "user", 3, {3: 1, 5: 2}),
+        ]
+        assert await service.rating_stats(user.id, START, START + timedelta(days=2), role="nobody") == []
+
+        # Re-rating moves the message out of its hour and into the edit's.
+        await service.update_message(first, MessageUpdate(rating=1), user.id)
+        [entry] = await service.rating_stats(user.id, START, START + timedelta(hours=1), bucket="hour")
+        assert entry["ratings"] == {3: 1}
+        now = datetime.now()
+        [edited] = await service.rating_stats(user.id, floor_to(now, "hour"), now + timedelta(hours=1), bucket="hour")
+        assert (edited["chat_id"], edited["ratings"]) == (chat, {1: 1})
+        # Editing it again within the hour, keeping role and rating, nets out to no change.
+        await service.update_message(first, MessageUpdate(content="again"), user.id)
+        incremental = await rollup_rows(session)
+        # Each of the five messages is counted once per granularity.
+        assert sum(row[-1] for row in incremental) == 10
+
+        await session.execute(delete(RatingRollup))
+        await session.commit()
+    assert await backfill(engine) == len(incremental)
+    async with async_sessionmaker(engine)() as session:
+        assert await rollup_rows(session) == incremental
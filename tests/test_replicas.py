@@ -0,0 +1,153 @@
+import asyncio
+import os
+import pytest
+from uuid import uuid4
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.app.api import dependencies
+from src.app.core.cache import MemoryCacheBackend
+from src.app.core.config import make_async_url
+from src.app.db.base import Base
+from src.app.db.replicas import ReplicaSet, primary_pin_key
+from src.app.db.user import User
+from src.app.services import message_service
+from src.app.services.message_service import MessageService
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+class FakeReplicaSet(ReplicaSet):
+    def __init__(self, engines, lags):
+        super().__init__(create_async_engine("sqlite+aiosqlite://"), engines, max_lag=2)
+        self.lags = lags
+
+    async def primary_position(self):
+        return 0
+
+    async def measure(self, replica):
+        lag = self.lags[replica.engine]
+        if isinstance(lag, Exception):
+            raise lag
+        return lag
+
+
+@pytest.mark.asyncio
+async def test_lagging_and_failing_replicas_leave_rotation_until_they_recover():
+    fast, slow = create_async_engine("sqlite+aiosqlite://"), create_async_engine("sqlite+aiosqlite://")
+    replicas = FakeReplicaSet([fast, slow], {fast: 0.5, slow: 30})
+    assert replicas.choose() is None  # nothing is trusted before the first check
+
+    await replicas.check()
+    assert {replicas.choose() for _ in range(4)} == {fast}
+
+    replicas.lags = {fast: ConnectionRefusedError(), slow: 1.0}
+    await replicas.check()
+    assert {replicas.choose() for _ in range(4)} == {slow}
+
+    replicas.lags = {fast: 0.0, slow: 0.0}
+    await replicas.check()
+    assert {replicas.choose() for _ in range(4)} == {fast, slow}
+    assert 'db_replica_healthy{replica="None"} 1' in replicas.metric_lines()
+
+
+class WalReplicaSet(ReplicaSet):
+    """Primary and replica WAL positions set by the test."""
+
+    def __init__(self, engines, max_lag):
+        super().__init__(create_async_engine("sqlite+aiosqlite://"), engines, max_lag=max_lag, interval=0)
+        self.primary_at = 0
+        self.replayed = {}
+
+    async def primary_position(self):
+        return self.primary_at
+
+    async def replayed_position(self, replica):
+        return self.replayed[replica.engine]
+
+
+@pytest.mark.asyncio
+async def test_replica_that_stops_receiving_wal_ages_out_while_the_primary_writes():
+    live, stuck = create_async_engine("sqlite+aiosqlite://"), create_async_engine("sqlite+aiosqlite://")
+    replicas = WalReplicaSet([live, stuck], max_lag=0.1)
+    replicas.primary_at, replicas.replayed = 100, {live: 100, stuck: 100}
+    await replicas.check()
+    assert {replicas.choose() for _ in range(4)} == {live, stuck}
+
+    # The stuck replica has replayed all it received, but the primary has moved on.
+    for position in (200, 300):
+        await asyncio.sleep(0.06)
+        replicas.primary_at, replicas.replayed[live] = position, position
+        await replicas.check()
+    assert {replicas.choose() for _ in range(4)} == {live}
+    assert replicas.replicas[1].lag > 0.1
+
+    # An idle primary does not make a caught-up replica stale.
+    replicas.replayed[stuck] = 300
+    await asyncio.sleep(0.2)
+    await replicas.check()
+    assert {replicas.choose() for _ in range(4)} == {live, stuck}
+    # Only the newest sample past the limit is kept.
+    assert [position for _, position in replicas.positions] == [300, 300]
+
+
+@pytest.mark.asyncio
+async def test_replica_behind_every_primary_sample_stays_out():
+    replica = create_async_engine("sqlite+aiosqlite://")
+    replicas = WalReplicaSet([replica], max_lag=2)
+    replicas.primary_at, replicas.replayed = 100, {replica: 50}
+    await replicas.check()
+    assert replicas.choose() is None and replicas.replicas[0].lag is None
+
+
+@pytest.mark.asyncio
+async def test_lag_queries_run_on_postgres():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    engine = create_async_engine(make_async_url(TEST_DATABASE_URL))
+    # The primary listed as its own replica is always caught up.
+    replicas = ReplicaSet(engine, [engine], max_lag=2)
+    await replicas.check()
+    assert replicas.choose() is engine and 0 <= replicas.replicas[0].lag < 2
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_writers_read_from_the_primary_for_a_while(monkeypatch):
+    replica = create_async_engine("sqlite+aiosqlite://")
+    replicas = FakeReplicaSet([replica], {replica: 0.0})
+    await replicas.check()
+    cache = MemoryCacheBackend()
+    monkeypatch.setattr(dependencies, "replicas", replicas)
+    monkeypatch.setattr(dependencies, "cache", cache)
+    monkeypatch.setattr(message_service, "DATABASE_REPLICA_URLS", ["postgresql+asyncpg://replica/db"])
+    writer, reader = uuid4(), uuid4()
+
+    await MessageService(db_session=None, cache=cache).after_write(writer)
+
+    assert await cache.exists(primary_pin_key(writer))
+    assert await dependencies.read_engine(writer) is dependencies.engine
+    assert await dependencies.read_engine(reader) is replica
+    assert await dependencies.read_engine() is replica
+    assert cache.stats()["misses"] == 0
+
+
+@pytest.mark.asyncio
+async def test_principal_missing_on_replica_is_loaded_from_primary(monkeypatch, tmp_path):
+    primary = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/primary.db")
+    replica = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/replica.db")
+    for engine in (primary, replica):
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+    sessions = async_sessionmaker(primary, expire_on_commit=False)
+    monkeypatch.setattr(dependencies, "engine", primary)
+    monkeypatch.setattr(dependencies, "SessionLocal", sessions)
+    async with sessions() as session:
+        user = User(username="ed", email="ed@example.com", hashed_password="x")
+        session.add(user)
+        await session.commit()
+
+    async with async_sessionmaker(replica)() as replica_session:
+        principal = await dependencies.load_principal({"sub": str(user.id)}, replica_session)
+    assert principal.email == "ed@example.com"
+    await primary.dispose()
+    await replica.dispose()
@@ -0,0 +1,16 @@
+from src.app.core.responses import etag_matches, not_modified
+
+
+def test_etag_matches_lists_wildcards_and_weak_tags():
+    assert etag_matches('"a", "b"', '"b"')
+    assert etag_matches('W/"a"', '"a"')
+    assert etag_matches("*", '"a"')
+    assert not etag_matches('"ab"', '"a"')
+    assert not etag_matches(None, '"a"')
+
+
+def test_not_modified_has_no_body():
+    response = not_modified('"a"')
+    assert response.status_code == 304
+    assert response.headers["etag"] == '"a"'
+    assert response.body == b""
@@ -0,0 +1,114 @@
+import os
+import pytest
+import pytest_asyncio
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock
+from uuid import uuid4
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from src.app.core.cache import MemoryCacheBackend
+from src.app.core.config import make_async_url
+from src.app.db.base import Base
+from src.app.db.user import User
+from src.app.schemas.messages import MessageCreate
+from src.app.services.message_service import MessageService
+from src.app.services.search import SearchUnavailable, parse_search_query
+
+# A throwaway Postgres database; its tables are dropped and recreated.
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+# The column the message_search migration adds; its GIN index changes plans, not results.
+SEARCH_COLUMN = """
+    ALTER TABLE messages ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (to_tsvector('simple', content)) STORED
+"""
+
+
+@pytest.mark.parametrize("q, expected", [
+    ("Hello world", "hello & world"),
+    ('"hello there" -spam', "(hello <-> there) & !spam"),
+    ("cat OR dog fish", "(cat | dog) & fish"),
+    ("pyth*", "pyth:*"),
+    ("don't", "(don <-> t)"),
+    ("a:b & c|d !e", "(a <-> b) & (c <-> d) & e"),
+    ("OR x", "x"),
+])
+def test_parse_search_query(q, expected):
+    assert parse_search_query(q) == expected
+
+
+@pytest.mark.parametrize("q", ["", "   ", "-only -negations", "&|!():*"])
+def test_parse_search_query_rejects_unsearchable_input(q):
+    assert parse_search_query(q) is None
+
+
+def test_search_query_ranks_within_user_and_filters():
+    user_id, chat_id = uuid4(), uuid4()
+    query = MessageService.search_query(user_id, "hello & world", limit=10, offset=20, chat_id=chat_id,
+                                         role="user", start=datetime(2025, 1, 1))
+    sql = str(query.compile(dialect=postgresql.dialect()))
+    assert "(messages.search_vector @@ to_tsquery(" in sql
+    assert "ts_rank_cd(messages.search_vector, to_tsquery(" in sql
+    assert "ORDER BY rank DESC, messages.sent_at DESC, messages.message_id DESC" in sql
+    for condition in ("messages.user_id =", "messages.chat_id =", "messages.role =", "messages.sent_at >="):
+        assert condition in sql
+    assert "LIMIT %(param_1)s OFFSET %(param_2)s" in sql
+
+
+@pytest.mark.asyncio
+async def test_search_requires_postgres():
+    session = MagicMock()
+    connection = MagicMock()
+    connection.dialect.name = "sqlite"
+    session.connection = AsyncMock(return_value=connection)
+    with pytest.raises(SearchUnavailable):
+        await MessageService(session, cache=MemoryCacheBackend()).search_messages(uuid4(), "hello")
+
+
+@pytest_asyncio.fixture
+async def postgres():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    engine = create_async_engine(make_async_url(TEST_DATABASE_URL))
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.drop_all)
+        await connection.run_sync(Base.metadata.create_all)
+        await connection.execute(text(SEARCH_COLUMN))
+    yield engine
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.drop_all)
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_search_ranks_denser_matches_first_then_newest(postgres):
+    async with async_sessionmaker(postgres, expire_on_commit=False)() as session:
+        user, other = (User(username=name, email=f"{name}@example.com", hashed_password="x") for name in "ab")
+        session.add_all([user, other])
+        await session.commit()
+        service = MessageService(session, cache=MemoryCacheBackend())
+        start, chat = datetime(2025, 1, 1), uuid4()
+
+        def message(content, minutes):
+            return MessageCreate(chat_id=chat, content=content, rating=1, sent_at=start + timedelta(minutes=minutes),
+                                 role="user")
+
+        await service.send_messages([
+            message("refund please, refund now, refund", 0),
+            message("older refund request", 1),
+            message("newer refund request", 2),
+            message("order status", 3),
+            message("refund spam", 4),
+        ], user.id)
+        await service.send_message(message("refund refund refund refund", 5), other.id)
+
+        results = await service.search_messages(user.id, parse_search_query("refund -spam"))
+        assert [result.content for result in results] == [
+            "refund please, refund now, refund", "newer refund request", "older refund request"]
+        # ts_rank_cd: one 0.1 cover per occurrence; equal ranks fall back to newest first.
+        assert [round(result.rank, 6) for result in results] == [0.3, 0.1, 0.1]
+
+        [phrase] = await service.search_messages(user.id, parse_search_query('"refund request" newer'))
+        assert phrase.content == "newer refund request"
+        [second] = await service.search_messages(user.id, parse_search_query("refund -spam"), limit=1, offset=1)
+        assert second.content == "newer refund request"
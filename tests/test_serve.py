@@ -0,0 +1,75 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import pytest
+
+from src.app import serve
+
+
+def test_worker_count_follows_the_cgroup_cpu_quota(tmp_path, monkeypatch):
+    cpu_max = tmp_path / "cpu.max"
+    monkeypatch.setattr(serve, "CGROUP_CPU_MAX", str(cpu_max))
+    monkeypatch.setattr(os, "sched_getaffinity", lambda pid: set(range(8)))
+    assert serve.worker_count(0) == 8
+    cpu_max.write_text("150000 100000\n")
+    assert serve.worker_count(0) == 2
+    cpu_max.write_text("max 100000\n")
+    assert serve.worker_count(0) == 8
+    assert serve.worker_count(3) == 3
+
+
+def test_config_uses_uvloop_httptools_and_the_tuning_flags():
+    config = serve.build_config(serve.parse_args(["--keepalive", "90", "--backlog", "4096", "--graceful-timeout", "7"]))
+    assert (config.loop, config.http) == ("uvloop", "httptools")
+    assert (config.timeout_keep_alive, config.backlog, config.timeout_graceful_shutdown) == (90, 4096, 7)
+    assert config.access_log is False
+
+
+def test_preloaded_workers_serve_and_exit_cleanly_on_sigterm(tmp_path):
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    env = {**os.environ, "DATABASE_URL": f"sqlite+aiosqlite:///{tmp_path}/serve.db", "LOG_FILE": "",
+           "DIAGNOSTICS_TOKEN": "secret", "METRICS_SNAPSHOT_SECONDS": "0.1"}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "src.app.serve", "--host", "127.0.0.1", "--port", str(port), "--workers", "2",
+         "--preload"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/openapi.json", timeout=1) as response:
+                    assert response.status == 200
+                    break
+            except OSError:
+                assert time.monotonic() < deadline, "server did not come up"
+                time.sleep(0.1)
+        for _ in range(9):
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/openapi.json", timeout=5).close()
+        time.sleep(0.5)
+        # Whichever worker answers reports both: requests summed, gauges per worker.
+        request = urllib.request.Request(f"http://127.0.0.1:{port}/metrics",
+                                         headers={"X-Diagnostics-Token": "secret"})
+        with urllib.request.urlopen(request, timeout=5) as response:
+            lines = response.read().decode().splitlines()
+        assert 'http_requests_total{method="GET",route="/openapi.json",status="200"} 10' in lines
+        assert len([line for line in lines if line.startswith("app_startup_seconds{")]) == 2
+        server.send_signal(signal.SIGTERM)
+        assert server.wait(timeout=30) == 0
+    finally:
+        if server.poll() is None:
+            server.kill()
+
+
+def test_refuses_several_workers_with_replicas_and_a_per_process_cache(monkeypatch):
+    monkeypatch.setattr(serve, "DATABASE_REPLICA_URLS", ["postgresql+asyncpg://replica/db"])
+    monkeypatch.setattr(serve, "CACHE_URL", "memory://")
+    monkeypatch.setattr(serve.Supervisor, "run", lambda self: pytest.fail("workers were started"))
+    assert serve.main(["--workers", "2"]) == 2
@@ -0,0 +1,129 @@
+import asyncio
+import pytest
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock
+from uuid import UUID, uuid4
+from datetime import datetime
+from src.app.schemas.messages import MessageCreate
+from src.app.services.message_service import MessageService
+from src.app.services.write_pipeline import MessageWritePipeline, WritePipelineOverloaded
+
+
+def make_session_factory(commit_gate=None):
+    sessions = []
+
+    @asynccontextmanager
+    async def factory():
+        session = MagicMock()
+        connection = MagicMock()
+        connection.dialect.name = "postgresql"
+        connection.dialect.driver = "asyncpg"
+        connection.execute = AsyncMock()
+        session.connection = AsyncMock(return_value=connection)
+        session.execute = AsyncMock()
+
+        async def commit():
+            if commit_gate is not None:
+                await commit_gate.wait()
+        session.commit = AsyncMock(side_effect=commit)
+        sessions.append(session)
+        yield session
+
+    return factory, sessions
+
+
+def make_message():
+    return MessageCreate(content="hi", sent_at=datetime.now(), chat_id=uuid4(), rating=1, role="user")
+
+
+@pytest.mark.asyncio
+async def test_concurrent_sends_share_commits():
+    factory, sessions = make_session_factory()
+    pipeline = MessageWritePipeline(factory, max_batch=4, max_delay=0.05)
+    pipeline.start()
+    message_ids = await asyncio.gather(*(pipeline.submit(make_message(), uuid4()) for _ in range(10)))
+    await pipeline.stop()
+
+    assert len(set(message_ids)) == 10
+    assert len(sessions) == 3
+    assert pipeline.group_size.count == 3 and pipeline.group_size.sum == 10
+    assert all(session.commit.await_count == 1 for session in sessions)
+
+
+@pytest.mark.asyncio
+async def test_stop_drains_queued_messages():
+    gate = asyncio.Event()
+    factory, sessions = make_session_factory(commit_gate=gate)
+    pipeline = MessageWritePipeline(factory, max_batch=1, max_delay=0)
+    pipeline.start()
+    pending = [asyncio.create_task(pipeline.submit(make_message(), uuid4())) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    stopping = asyncio.create_task(pipeline.stop())
+    gate.set()
+    await stopping
+    assert all(task.done() and task.result() for task in pending)
+    assert len(sessions) == 3
+
+
+@pytest.mark.asyncio
+async def test_full_queue_applies_backpressure():
+    gate = asyncio.Event()
+    factory, _ = make_session_factory(commit_gate=gate)
+    pipeline = MessageWritePipeline(factory, max_batch=1, max_delay=0, max_queue=1, enqueue_timeout=0.01)
+    pipeline.start()
+    first = asyncio.create_task(pipeline.submit(make_message(), uuid4()))
+    await asyncio.sleep(0.01)
+    second = asyncio.create_task(pipeline.submit(make_message(), uuid4()))
+    await asyncio.sleep(0.01)
+    with pytest.raises(WritePipelineOverloaded):
+        await pipeline.submit(make_message(), uuid4())
+    gate.set()
+    await asyncio.gather(first, second)
+    await pipeline.stop()
+    assert pipeline.rejected == 1
+
+
+@pytest.mark.asyncio
+async def test_poisoned_row_fails_only_its_own_send(monkeypatch):
+    attempts = []
+
+    async def insert_message_rows(self, rows):
+        attempts.append(len(rows))
+        if any(row["content"] == "poison" for row in rows):
+            raise ValueError("invalid byte sequence")
+
+    monkeypatch.setattr(MessageService, "insert_message_rows", insert_message_rows)
+    factory, _ = make_session_factory()
+    pipeline = MessageWritePipeline(factory, max_batch=8, max_delay=0.05)
+    pipeline.start()
+    messages = [make_message() for _ in range(8)]
+    messages[5] = messages[5].model_copy(update={"content": "poison"})
+    results = await asyncio.gather(*(pipeline.submit(message, uuid4()) for message in messages),
+                                   return_exceptions=True)
+    await pipeline.stop()
+
+    assert isinstance(results[5], ValueError)
+    assert all(isinstance(result, UUID) for index, result in enumerate(results) if index != 5)
+    # Rows 0-3 pass as a half, then 4-5 splits into single rows and 6-7 passes.
+    assert attempts == [8, 4, 4, 2, 1, 1, 2]
+    assert pipeline.group_size.count == 1
+
+
+@pytest.mark.asyncio
+async def test_connection_failure_fails_the_group_without_retrying(monkeypatch):
+    attempts = []
+
+    async def insert_message_rows(self, rows):
+        attempts.append(len(rows))
+        raise ConnectionRefusedError("connection refused")
+
+    monkeypatch.setattr(MessageService, "insert_message_rows", insert_message_rows)
+    factory, _ = make_session_factory()
+    pipeline = MessageWritePipeline(factory, max_batch=4, max_delay=0.05)
+    pipeline.start()
+    results = await asyncio.gather(*(pipeline.submit(make_message(), uuid4()) for _ in range(4)),
+                                   return_exceptions=True)
+    await pipeline.stop()
+
+    assert all(isinstance(result, ConnectionRefusedError) for result in results)
+    assert attempts == [4]